@@ -12,14 +12,15 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 from collections import namedtuple
+from functools import partial
 from glob import glob
 from os.path import join
 
 import numpy as np
 
 from precise.params import pr
-from precise.util import load_audio
-from precise.vectorization import vectorize_raw
+from precise.util import load_audio, predict_in_batches
+from precise.vectorization import vectorize_raw, sliding_windows
 
 AnnoyanceEstimate = namedtuple(
     'AnnoyanceEstimate',
@@ -65,7 +66,9 @@ class AnnoyanceEstimator:
             print('Evaluating ambient activations on {}...'.format(i))
             inputs, audio_len = self._load_inputs(i)
             nww_seconds += audio_len / pr.sample_rate
-            ambient_predictions = model.predict(inputs, batch_size=batch_size)
+            ambient_predictions = predict_in_batches(
+                partial(model.predict, batch_size=batch_size), inputs, batch_size
+            )
             del inputs
             nww_buckets += (ambient_predictions.reshape((-1, 1))
                             > self.thresholds.reshape((1, -1))).sum(axis=0)
@@ -116,6 +119,7 @@ class AnnoyanceEstimator:
         """
         Loads network inputs from an audio file without caching
         Handles data conservatively in case the audio file is large
+        by returning overlapping windows as a view of the MFCCs
         Args:
             audio_file: Filename to load
             chunk_size: Samples to skip forward when loading network inpus
@@ -124,7 +128,4 @@ class AnnoyanceEstimator:
         audio_len = len(audio)
         mfccs = vectorize_raw(audio)
         del audio
-        mfcc_hops = chunk_size // pr.hop_samples
-        return np.array([
-            mfccs[i - pr.n_features:i] for i in range(pr.n_features, len(mfccs), mfcc_hops)
-        ]), audio_len
+        return sliding_windows(mfccs, pr.n_features, chunk_size // pr.hop_samples), audio_len
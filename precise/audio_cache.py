@@ -0,0 +1,105 @@
+# Copyright 2019 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Process wide cache of decoded audio files for scripts
+that read the same wavs over and over while training
+"""
+import os
+import numpy as np
+from collections import OrderedDict
+from typing import *
+
+from precise.util import load_audio, load_audio_int16, int16_to_audio
+
+
+class AudioCache:
+    """
+    Least recently used cache of decoded wavs, limited to a number of bytes.
+    Samples are kept as int16, half the size of the float32 audio, and
+    converted to floats on every load so callers are free to modify them.
+    A file is read again if its size or modification time changed
+
+    Args:
+        max_bytes: Total size of the cached samples. 0 disables the cache
+    """
+
+    def __init__(self, max_bytes: int = 0):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # type: Dict[str, Tuple[tuple, np.ndarray]]
+        self.num_bytes = 0
+        self.hits = self.misses = self.evictions = 0
+
+    def load(self, filename: str) -> np.ndarray:
+        """Same as util.load_audio, only reading the file if it isn't cached"""
+        if self.max_bytes <= 0:
+            return load_audio(filename)
+        stat = os.stat(filename)
+        key = (stat.st_size, stat.st_mtime_ns)
+        entry = self.entries.get(filename)
+        if entry and entry[0] == key:
+            self.hits += 1
+            self.entries.move_to_end(filename)
+            return int16_to_audio(entry[1])
+
+        self.misses += 1
+        self._remove(filename)
+        samples = load_audio_int16(filename)
+        if samples.nbytes <= self.max_bytes:
+            self.entries[filename] = (key, samples)
+            self.num_bytes += samples.nbytes
+            self._evict(self.max_bytes)
+        return int16_to_audio(samples)
+
+    def resize(self, max_bytes: int):
+        """Changes the size limit, evicting the least recently used files if needed"""
+        self.max_bytes = max_bytes
+        self._evict(max(max_bytes, 0))
+
+    def clear(self):
+        self.entries.clear()
+        self.num_bytes = 0
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {
+            'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+            'files': len(self.entries), 'bytes': self.num_bytes
+        }
+
+    def __repr__(self) -> str:
+        return '<AudioCache files={files} bytes={bytes} hits={hits} misses={misses} ' \
+               'evictions={evictions}>'.format(**self.stats)
+
+    def _remove(self, filename: str):
+        entry = self.entries.pop(filename, None)
+        if entry:
+            self.num_bytes -= entry[1].nbytes
+
+    def _evict(self, max_bytes: int):
+        while self.num_bytes > max_bytes:
+            _, (_, samples) = self.entries.popitem(last=False)
+            self.num_bytes -= samples.nbytes
+            self.evictions += 1
+
+
+audio_cache = AudioCache()
+
+
+def load_cached_audio(filename: str) -> np.ndarray:
+    """Loads a wav through the process wide cache, which is disabled until set_audio_cache_size is called"""
+    return audio_cache.load(filename)
+
+
+def set_audio_cache_size(megabytes: float):
+    audio_cache.resize(int(megabytes * 1024 * 1024))
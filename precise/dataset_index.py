@@ -0,0 +1,150 @@
+# Copyright 2019 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Persistent index of the wav files in a dataset so large or network
+mounted datasets don't need to be listed file by file every run
+"""
+import json
+import os
+import time
+from fnmatch import fnmatch
+from os.path import join, split, isfile
+from typing import *
+
+LABELS = ('wake-word', 'not-wake-word')
+
+
+class DatasetIndex:
+    """
+    Remembers the contents of every folder along with the size, mtime,
+    label and split of each wav. A folder is only listed again when its
+    mtime changes, which happens whenever files are added, removed or renamed.
+    Folders changed within racy_ns of being listed are always listed again
+    since a second change in the same timestamp tick wouldn't change the mtime
+
+    Args:
+        index_file: Json file to keep the index in
+    """
+    version = 1
+    racy_ns = 2 * 10 ** 9
+
+    def __init__(self, index_file: str):
+        self.index_file = index_file
+        self.dirs = {}  # type: Dict[str, dict]
+        self.files = {}  # type: Dict[str, list]
+        self.changed = False
+        self._name_sets = {}  # type: Dict[str, set]
+
+        if isfile(index_file):
+            try:
+                with open(index_file) as f:
+                    data = json.load(f)
+                if data.get('version') == self.version:
+                    self.dirs, self.files = data['dirs'], data['files']
+            except (OSError, ValueError, KeyError):
+                pass
+
+    def list_dir(self, folder: str) -> Tuple[List[str], List[str]]:
+        """
+        Lists a folder, reusing the previous listing if it didn't change
+        Returns:
+            Names of the wavs and of the subfolders in the folder
+        """
+        try:
+            mtime = os.stat(folder).st_mtime_ns
+        except OSError:
+            self._forget(folder)
+            return [], []
+        entry = self.dirs.get(folder)
+        if entry and entry['mtime'] == mtime and entry['scanned'] - mtime > self.racy_ns:
+            return entry['files'], entry['dirs']
+
+        scanned = int(time.time() * 1e9)
+        files, dirs = [], []
+        with os.scandir(folder) as it:
+            for i in it:
+                if i.is_dir():
+                    dirs.append(i.name)
+                elif fnmatch(i.name, '*.wav'):
+                    files.append(i.name)
+                    stat = i.stat()
+                    info = self.files.get(i.path, [0, 0, None, None])
+                    self.files[i.path] = [stat.st_size, stat.st_mtime_ns] + info[2:]
+        for name in set(entry['files'] if entry else []) - set(files):
+            self.files.pop(join(folder, name), None)
+        self.dirs[folder] = {'mtime': mtime, 'scanned': scanned, 'files': files, 'dirs': dirs}
+        self._name_sets.pop(folder, None)
+        self.changed = True
+        return files, dirs
+
+    def _forget(self, folder: str):
+        entry = self.dirs.pop(folder, None)
+        if entry:
+            for name in entry['files']:
+                self.files.pop(join(folder, name), None)
+            self._name_sets.pop(folder, None)
+            self.changed = True
+
+    def find_files(self, folder: str) -> List[str]:
+        """Recursively finds the wavs in a folder in the same order as util.glob_all"""
+        files, dirs = self.list_dir(folder)
+        found = [join(folder, i) for i in files]
+        for name in dirs:
+            found.extend(self.find_files(join(folder, name)))
+        return found
+
+    def find_wavs(self, folder: str, split_name: str = 'train') -> Tuple[List[str], List[str]]:
+        """Same as util.find_wavs, recording the label and split of each file"""
+        wavs = tuple(self.find_files(join(folder, label)) for label in LABELS)
+        for label, filenames in zip(LABELS, wavs):
+            for filename in filenames:
+                self.set_label(filename, label, split_name)
+        return wavs
+
+    def exists(self, filename: str) -> bool:
+        """Whether a wav exists, only listing its folder if the folder changed"""
+        folder, name = split(filename)
+        files = self.list_dir(folder)[0]
+        names = self._name_sets.get(folder)
+        if names is None:
+            names = self._name_sets[folder] = set(files)
+        return name in names
+
+    def info(self, filename: str) -> Optional[dict]:
+        """Size, mtime, label and split of an indexed file"""
+        info = self.files.get(filename)
+        return info and dict(zip(('size', 'mtime', 'label', 'split'), info))
+
+    def get_split(self, filename: str) -> Optional[str]:
+        info = self.files.get(filename)
+        return info and info[3]
+
+    def set_label(self, filename: str, label: str, split_name: str):
+        info = self.files.get(filename)
+        if info and info[2:] != [label, split_name]:
+            info[2:] = [label, split_name]
+            self.changed = True
+
+    def save(self):
+        """Writes the index if anything changed, replacing the old file at once"""
+        if not self.changed:
+            return
+        temp_file = self.index_file + '.tmp'
+        try:
+            with open(temp_file, 'w') as f:
+                json.dump({'version': self.version, 'dirs': self.dirs, 'files': self.files}, f)
+            os.replace(temp_file, self.index_file)
+            self.changed = False
+        except OSError as e:
+            print('Warning: Failed to save dataset index:', e)
@@ -50,7 +50,6 @@ def load_precise_model(model_name: str) -> Any:
     if not model_name.endswith('.net'):
         print('Warning: Unknown model type, ', model_name)
 
-    inject_params(model_name)
     return load_keras().models.load_model(model_name)
 
 
@@ -67,6 +66,7 @@ def create_model(model_name: Optional[str], params: ModelParams) -> 'Sequential'
     """
     if model_name and isfile(model_name):
         print('Loading from ' + model_name + '...')
+        inject_params(model_name)
         model = load_precise_model(model_name)
     else:
         from keras.layers.core import Dense
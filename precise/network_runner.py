@@ -17,15 +17,16 @@ Pieces that convert audio to predictions
 import numpy as np
 from abc import abstractmethod, ABCMeta
 from importlib import import_module
+from collections import OrderedDict
 from os.path import splitext
 from typing import *
 from typing import BinaryIO
 
 from precise.threshold_decoder import ThresholdDecoder
 from precise.model import load_precise_model
-from precise.params import inject_params, pr
+from precise.params import load_params
 from precise.util import buffer_to_audio
-from precise.vectorization import vectorize_raw, add_deltas
+from precise.vectorization import StreamingVectorizer, add_deltas
 
 
 class Runner(metaclass=ABCMeta):
@@ -95,23 +96,120 @@ class KerasRunner(Runner):
         return self.predict(inp[np.newaxis])[0][0]
 
 
+class NumpyRunner(Runner):
+    """
+    Executes the GRU network with NumPy using weights extracted from a
+    Keras (.net) or TensorFlow (.pb) model, or exported to an .npz file
+    or weights bundle (.pwb), without using TensorFlow
+
+    Args:
+        model_name: Model to read weights from
+        streaming: If True, run() carries the hidden state across calls and only
+                   processes the frames that are new since the last window instead
+                   of recomputing the whole window. This is an approximation since
+                   the network was trained on windows starting from a zero state
+        num_base_features: Number of leading input columns that hold features rather than
+                           deltas, which are the only ones compared to find how far the window
+                           shifted since deltas of the first row are zeroed. Set by Listener
+    """
+    def __init__(self, model_name: str, streaming: bool = False, num_base_features: int = None):
+        from precise.numpy_model import NumpyModel
+        self.model = NumpyModel.from_file(model_name) if model_name is not None else None
+        self.streaming = streaming
+        self.num_base_features = num_base_features
+        self.state = None
+        self.prev_inp = None
+        self.prev_output = 0.0
+
+    @classmethod
+    def from_model(cls, model: 'NumpyModel', streaming: bool = False) -> 'NumpyRunner':
+        """Creates a runner from weights that are already loaded"""
+        runner = cls(None, streaming)
+        runner.model = model
+        return runner
+
+    def reset(self):
+        """Forget the hidden state carried between streaming calls"""
+        self.state = self.prev_inp = None
+
+    def predict(self, inputs: np.ndarray) -> np.ndarray:
+        return self.model.predict(inputs)
+
+    def run(self, inp: np.ndarray) -> float:
+        if not self.streaming:
+            return self.predict(inp[np.newaxis])[0][0]
+
+        num_new = self._count_new_frames(inp)
+        if num_new == 0:
+            return self.prev_output
+        if num_new == len(inp):
+            self.state = None
+        self.state = self.model.run_gru(inp[np.newaxis, -num_new:], self.state)
+        self.prev_inp = inp.copy()
+        self.prev_output = self.model.output(self.state)[0][0]
+        return self.prev_output
+
+    def _count_new_frames(self, inp: np.ndarray) -> int:
+        """Finds how far the window shifted since the previous call"""
+        if self.state is None or self.prev_inp is None or self.prev_inp.shape != inp.shape:
+            return len(inp)
+        inp, prev_inp = inp[:, :self.num_base_features], self.prev_inp[:, :self.num_base_features]
+        # The previous last row must now be at len(inp) - 1 - shift, so only check those shifts
+        last_rows = np.flatnonzero((inp == prev_inp[-1]).all(axis=1))
+        for shift in len(inp) - 1 - last_rows[::-1]:
+            if np.array_equal(inp[:len(inp) - shift], prev_inp[shift:]):
+                return int(shift)
+        return len(inp)
+
+
+class NullTimer:
+    """Stands in for a precise_runner.latency.StageTimer when no latency is recorded"""
+
+    def lap(self, stage: str):
+        pass
+
+
+null_timer = NullTimer()
+
+
 class Listener:
-    """Listener that preprocesses audio into MFCC vectors and executes neural networks"""
+    """
+    Listener that preprocesses audio into MFCC vectors and executes neural networks
 
-    def __init__(self, model_name: str, chunk_size: int = -1, runner_cls: type = None):
-        self.window_audio = np.array([])
-        self.pr = inject_params(model_name)
-        self.mfccs = np.zeros((self.pr.n_features, self.pr.n_mfcc))
+    Args:
+        model_name: Model to load
+        chunk_size: Number of bytes to read from streams on each update
+        runner_cls: Runner class to use, found from the extension if not given
+        latency_stats: If given, records the time each stage of update() takes,
+                       ie. a precise_runner.latency.LatencyStats
+    """
+
+    def __init__(self, model_name: str, chunk_size: int = -1, runner_cls: type = None,
+                 latency_stats=None):
+        self.pr = load_params(model_name)
+        self.latency_stats = latency_stats
+        self.vectorizer = StreamingVectorizer(self.pr)
         self.chunk_size = chunk_size
         runner_cls = runner_cls or self.find_runner(model_name)
         self.runner = runner_cls(model_name)
-        self.threshold_decoder = ThresholdDecoder(self.pr.threshold_config, pr.threshold_center)
+        if self.pr.use_delta and isinstance(self.runner, NumpyRunner):
+            self.runner.num_base_features = self.vectorizer.num_coeffs
+        self.threshold_decoder = ThresholdDecoder.from_params(self.pr)
+        self.audio_scratch = np.empty(max(chunk_size, 0) // 2, dtype=np.float32)
+        self.delta_input = np.empty((self.pr.n_features, 2 * self.vectorizer.num_coeffs))
+
+    @property
+    def mfccs(self) -> np.ndarray:
+        """Current window of feature vectors"""
+        return self.vectorizer.features
 
     @staticmethod
     def find_runner(model_name: str) -> Type[Runner]:
         runners = {
             '.net': KerasRunner,
-            '.pb': TensorFlowRunner
+            '.pb': TensorFlowRunner,
+            '.npz': NumpyRunner,
+            '.pwb': NumpyRunner
         }
         ext = splitext(model_name)[-1]
         if ext not in runners:
@@ -119,35 +217,123 @@ class Listener:
         return runners[ext]
 
     def clear(self):
-        self.window_audio = np.array([])
-        self.mfccs = np.zeros((self.pr.n_features, self.pr.n_mfcc))
+        self.vectorizer.clear()
 
-    def update_vectors(self, stream: Union[BinaryIO, np.ndarray, bytes]) -> np.ndarray:
-        if isinstance(stream, np.ndarray):
-            buffer_audio = stream
+    def read_audio(self, stream: Union[BinaryIO, np.ndarray, bytes]) -> np.ndarray:
+        """
+        Reads the next chunk of audio from a stream, raw bytes or an array
+        Raw audio is converted into a reused buffer, so the result is only
+        valid until the next read
+        """
+        return self._to_audio(self._read_chunk(stream))
+
+    def _read_chunk(self, stream: Union[BinaryIO, np.ndarray, bytes]) -> Union[np.ndarray, bytes]:
+        if isinstance(stream, (np.ndarray, bytes, bytearray)):
+            chunk = stream
         else:
-            if isinstance(stream, (bytes, bytearray)):
-                chunk = stream
-            else:
-                chunk = stream.read(self.chunk_size)
-            if len(chunk) == 0:
-                raise EOFError
-            buffer_audio = buffer_to_audio(chunk)
+            chunk = stream.read(self.chunk_size)
+        if len(chunk) == 0 and not isinstance(chunk, np.ndarray):
+            raise EOFError
+        return chunk
 
-        self.window_audio = np.concatenate((self.window_audio, buffer_audio))
+    def _to_audio(self, chunk: Union[np.ndarray, bytes]) -> np.ndarray:
+        if isinstance(chunk, np.ndarray):
+            return chunk
+        return buffer_to_audio(chunk, self.audio_scratch)
 
-        if len(self.window_audio) >= self.pr.window_samples:
-            new_features = vectorize_raw(self.window_audio)
-            self.window_audio = self.window_audio[len(new_features) * self.pr.hop_samples:]
-            if len(new_features) > len(self.mfccs):
-                new_features = new_features[-len(self.mfccs):]
-            self.mfccs = np.concatenate((self.mfccs[len(new_features):], new_features))
+    def _update_features(self, stream: Union[BinaryIO, np.ndarray, bytes]) -> np.ndarray:
+        return self.vectorizer.update(self.read_audio(stream))
 
-        return self.mfccs
+    def update_vectors(self, stream: Union[BinaryIO, np.ndarray, bytes]) -> np.ndarray:
+        """Adds audio to the stream, returning a copy of the current feature window"""
+        return self._update_features(stream).copy()
 
-    def update(self, stream: Union[BinaryIO, np.ndarray, bytes]) -> float:
-        mfccs = self.update_vectors(stream)
+    def update_input(self, stream: Union[BinaryIO, np.ndarray, bytes]) -> np.ndarray:
+        """
+        Adds audio to the stream, returning the network input for the current window
+        The input is a view of reused buffers, only valid until the next update
+        """
+        mfccs = self._update_features(stream)
         if self.pr.use_delta:
-            mfccs = add_deltas(mfccs)
-        raw_output = self.runner.run(mfccs)
-        return self.threshold_decoder.decode(raw_output)
+            mfccs = add_deltas(mfccs, self.delta_input)
+        return mfccs
+
+    def update(self, stream: Union[BinaryIO, np.ndarray, bytes]) -> float:
+        timer = self.latency_stats.timer() if self.latency_stats else null_timer
+        chunk = self._read_chunk(stream)
+        timer.lap('read')
+        audio = self._to_audio(chunk)
+        timer.lap('convert')
+        inp = self.update_input(audio)
+        timer.lap('features')
+        raw_output = self.runner.run(inp)
+        timer.lap('inference')
+        conf = self.threshold_decoder.decode(raw_output)
+        timer.lap('decode')
+        return conf
+
+
+class MultiListener:
+    """
+    Listens for several wake words in the same audio stream
+
+    Models with the same vectorization params share one feature frontend
+    so the features of each chunk are only computed once per group. Groups
+    of non-streaming NumpyRunners are stacked into a single network so all
+    of their models run as one batch
+
+    Args:
+        model_names: Models to listen with
+        chunk_size: Number of bytes to read from streams on each update
+        runner_cls: Runner class to use for every model, found from the extension if not given
+    """
+
+    def __init__(self, model_names: List[str], chunk_size: int = -1, runner_cls: type = None):
+        self.chunk_size = chunk_size
+        self.listeners = OrderedDict(
+            (name, Listener(name, chunk_size, runner_cls)) for name in model_names
+        )
+        self.groups = OrderedDict()  # type: Dict[str, List[str]]
+        for name, listener in self.listeners.items():
+            self.groups.setdefault(listener.pr.vectorization_md5_hash(), []).append(name)
+
+        self.stacked_models = {}
+        for key, names in self.groups.items():
+            frontend = self.listeners[names[0]].vectorizer
+            for name in names[1:]:
+                self.listeners[name].vectorizer = frontend
+            self.stacked_models[key] = self._stack_models([self.listeners[i] for i in names])
+
+    @staticmethod
+    def _stack_models(listeners: List[Listener]) -> Optional['NumpyModel']:
+        runners = [i.runner for i in listeners]
+        if len(runners) < 2 or not all(isinstance(i, NumpyRunner) and not i.streaming for i in runners):
+            return None
+        from precise.numpy_model import NumpyModel
+        try:
+            return NumpyModel.stack([i.model for i in runners])
+        except ValueError:
+            return None
+
+    def clear(self):
+        for names in self.groups.values():
+            self.listeners[names[0]].clear()
+
+    def update(self, stream: Union[BinaryIO, np.ndarray, bytes]) -> Dict[str, float]:
+        """
+        Adds a chunk of audio to the stream
+        Returns:
+            Decoded confidence of every model, by model name
+        """
+        audio = self.listeners[next(iter(self.listeners))].read_audio(stream)
+        confidences = {}
+        for key, names in self.groups.items():
+            inp = self.listeners[names[0]].update_input(audio)
+            stacked = self.stacked_models[key]
+            if stacked:
+                raw_outputs = stacked.predict(inp[np.newaxis])[0]
+            else:
+                raw_outputs = [self.listeners[name].runner.run(inp) for name in names]
+            for name, raw_output in zip(names, raw_outputs):
+                confidences[name] = self.listeners[name].threshold_decoder.decode(raw_output)
+        return confidences
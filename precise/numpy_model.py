@@ -0,0 +1,261 @@
+# Copyright 2019 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+NumPy implementation of the GRU + Dense network created in model.py
+Allows running trained models without TensorFlow
+"""
+import json
+import numpy as np
+from os.path import splitext
+from typing import *
+
+activations = {
+    'linear': lambda x: x,
+    'tanh': np.tanh,
+    'relu': lambda x: np.maximum(x, 0),
+    'sigmoid': lambda x: 1 / (1 + np.exp(-x)),
+    'hard_sigmoid': lambda x: np.clip(0.2 * x + 0.5, 0, 1)
+}
+
+WEIGHT_NAMES = ('kernel', 'recurrent_kernel', 'bias', 'dense_kernel', 'dense_bias')
+NPZ_FORMAT_VERSION = 1
+
+
+class NumpyModel:
+    """
+    Weights and configuration of a precise network
+
+    Args:
+        kernel: GRU input weights of shape (feature_size, 3 * units) in z, r, h order
+        recurrent_kernel: GRU recurrent weights of shape (units, 3 * units)
+        bias: GRU bias of shape (3 * units,) or (2, 3 * units) when reset_after is used
+        dense_kernel: Output weights of shape (units, 1)
+        dense_bias: Output bias of shape (1,)
+        activation: GRU activation function name
+        recurrent_activation: GRU gate activation function name
+    """
+
+    def __init__(self, kernel, recurrent_kernel, bias, dense_kernel, dense_bias,
+                 activation='linear', recurrent_activation='hard_sigmoid'):
+        self.kernel = np.asarray(kernel, dtype=np.float32)
+        self.recurrent_kernel = np.asarray(recurrent_kernel, dtype=np.float32)
+        self.bias = np.asarray(bias, dtype=np.float32)
+        self.dense_kernel = np.asarray(dense_kernel, dtype=np.float32)
+        self.dense_bias = np.asarray(dense_bias, dtype=np.float32)
+        self.activation = activation
+        self.recurrent_activation = recurrent_activation
+        self.units = self.recurrent_kernel.shape[0]
+        self.reset_after = self.bias.ndim == 2
+        self.act = activations[activation]
+        self.recurrent_act = activations[recurrent_activation]
+
+    @classmethod
+    def from_file(cls, model_name: str) -> 'NumpyModel':
+        loaders = {
+            '.net': cls.from_keras,
+            '.pb': cls.from_tensorflow,
+            '.npz': cls.from_npz,
+            '.pwb': cls.from_bundle
+        }
+        ext = splitext(model_name)[-1]
+        if ext not in loaders:
+            raise ValueError('File extension of ' + model_name + ' must be: ' + str(list(loaders)))
+        return loaders[ext](model_name)
+
+    @classmethod
+    def from_keras(cls, model_name: str) -> 'NumpyModel':
+        """Reads weights from a Keras HDF5 model without loading Keras"""
+        import h5py
+
+        def decode(x):
+            return x.decode() if isinstance(x, bytes) else x
+
+        with h5py.File(model_name, 'r') as f:
+            config = json.loads(decode(f.attrs['model_config']))['config']
+            layer_configs = config['layers'] if isinstance(config, dict) else config
+            gru_config = next(i['config'] for i in layer_configs if i['class_name'] == 'GRU')
+
+            weights_group = f['model_weights']
+            weights = []
+            for layer_name in weights_group.attrs['layer_names']:
+                group = weights_group[decode(layer_name)]
+                weights.extend(np.array(group[decode(i)]) for i in group.attrs['weight_names'])
+
+        if len(weights) != 5:
+            raise ValueError('Expected a single GRU and Dense layer in ' + model_name)
+        return cls(*weights, activation=gru_config.get('activation', 'linear'),
+                   recurrent_activation=gru_config.get('recurrent_activation', 'hard_sigmoid'))
+
+    @classmethod
+    def from_tensorflow(cls, model_name: str) -> 'NumpyModel':
+        """Reads weights from the constants of a frozen graph created by precise-convert"""
+        import tensorflow as tf
+
+        graph_def = tf.GraphDef()
+        with open(model_name, 'rb') as f:
+            graph_def.ParseFromString(f.read())
+        consts = {
+            node.name: tf.make_ndarray(node.attr['value'].tensor)
+            for node in graph_def.node if node.op == 'Const'
+        }
+        dense_kernel, dense_bias = [
+            next(value for name, value in consts.items()
+                 if name.endswith('/' + weight) and not name.startswith('net/'))
+            for weight in ('kernel', 'bias')
+        ]
+        return cls(consts['net/kernel'], consts['net/recurrent_kernel'], consts['net/bias'],
+                   dense_kernel, dense_bias)
+
+    @classmethod
+    def stack(cls, models: List['NumpyModel']) -> 'NumpyModel':
+        """
+        Combines models with the same input and activations into a single
+        model with one output per model. Each gate of the combined GRU is
+        the concatenation of the gates of the individual models and the
+        recurrent and output weights are block diagonal so the models
+        never see each others' hidden units
+        """
+        first = models[0]
+        for model in models[1:]:
+            if (model.feature_size, model.reset_after, model.activation, model.recurrent_activation) != \
+                    (first.feature_size, first.reset_after, first.activation, first.recurrent_activation):
+                raise ValueError('Models must have the same input size and GRU configuration to stack')
+
+        def gates(weights, units):
+            return [weights[..., i * units:(i + 1) * units] for i in range(3)]
+
+        def block_diagonal(blocks):
+            rows = sum(i.shape[0] for i in blocks)
+            cols = sum(i.shape[1] for i in blocks)
+            combined = np.zeros((rows, cols), dtype=np.float32)
+            row = col = 0
+            for block in blocks:
+                combined[row:row + block.shape[0], col:col + block.shape[1]] = block
+                row += block.shape[0]
+                col += block.shape[1]
+            return combined
+
+        def concat_gates(weights):
+            return np.concatenate([
+                np.concatenate([gates(w, m.units)[gate] for w, m in zip(weights, models)], axis=-1)
+                for gate in range(3)
+            ], axis=-1)
+
+        recurrent_gates = [gates(m.recurrent_kernel, m.units) for m in models]
+        return cls(
+            concat_gates([m.kernel for m in models]),
+            np.concatenate([block_diagonal([i[gate] for i in recurrent_gates]) for gate in range(3)], axis=-1),
+            concat_gates([m.bias for m in models]),
+            block_diagonal([m.dense_kernel for m in models]),
+            np.concatenate([m.dense_bias for m in models]),
+            first.activation, first.recurrent_activation
+        )
+
+    @classmethod
+    def from_npz(cls, model_name: str) -> 'NumpyModel':
+        """Reads weights exported with save(), which loads in milliseconds"""
+        with np.load(model_name) as data:
+            if int(data['format_version']) != NPZ_FORMAT_VERSION:
+                raise ValueError('Unsupported weights format version in ' + model_name)
+            return cls(*(data[i] for i in WEIGHT_NAMES), activation=str(data['activation']),
+                       recurrent_activation=str(data['recurrent_activation']))
+
+    @classmethod
+    def from_bundle(cls, model_name: str, mmap: bool = True) -> 'NumpyModel':
+        """
+        Reads weights from a bundle created by save_bundle(), memory mapping float32 weights
+        Returns a QuantizedModel if the bundle was calibrated for int8 inference
+        """
+        from precise.weights_bundle import load_tensors, dequantize
+
+        header, tensors = load_tensors(model_name, mmap)
+        if 'calibration' in header:
+            from precise.quantization import QuantizedModel
+            return QuantizedModel(tensors, activation=header['activation'],
+                                  recurrent_activation=header['recurrent_activation'], **header['calibration'])
+        return cls(*(dequantize(tensors, i) for i in WEIGHT_NAMES), activation=header['activation'],
+                   recurrent_activation=header['recurrent_activation'])
+
+    def save(self, filename: str):
+        """Exports the weights to an .npz file that can be run without TensorFlow"""
+        with open(filename, 'wb') as f:
+            np.savez(
+                f, format_version=NPZ_FORMAT_VERSION, activation=self.activation,
+                recurrent_activation=self.recurrent_activation,
+                **{name: getattr(self, name) for name in WEIGHT_NAMES}
+            )
+
+    @property
+    def feature_size(self) -> int:
+        return self.kernel.shape[0]
+
+    def initial_state(self, batch_size: int) -> np.ndarray:
+        return np.zeros((batch_size, self.units), dtype=np.float32)
+
+    def run_gru(self, inputs: np.ndarray, state: np.ndarray = None) -> np.ndarray:
+        """
+        Runs the GRU over a batch of sequences
+        Args:
+            inputs: Array of shape (batch, timesteps, feature_size)
+            state: Hidden state to continue from, zeros if not given
+        Returns:
+            Hidden state after the last timestep
+        """
+        u = self.units
+        input_bias, recurrent_bias = self.bias if self.reset_after else (self.bias, None)
+        projected = self.input_dot(inputs.astype(np.float32)) + input_bias
+        h = self.initial_state(len(inputs)) if state is None else state
+
+        for x in projected.transpose(1, 0, 2):
+            if self.reset_after:
+                inner = self.state_dot(h, slice(None)) + recurrent_bias
+                z = self.recurrent_act(x[:, :u] + inner[:, :u])
+                r = self.recurrent_act(x[:, u:2 * u] + inner[:, u:2 * u])
+                hh = self.act(x[:, 2 * u:] + r * inner[:, 2 * u:])
+            else:
+                inner = self.state_dot(h, slice(None, 2 * u))
+                z = self.recurrent_act(x[:, :u] + inner[:, :u])
+                r = self.recurrent_act(x[:, u:2 * u] + inner[:, u:])
+                hh = self.act(x[:, 2 * u:] + self.state_dot(r * h, slice(2 * u, None)))
+            h = z * h + (1 - z) * hh
+        return h
+
+    def input_dot(self, inputs: np.ndarray) -> np.ndarray:
+        """Multiplies inputs of shape (batch, timesteps, feature_size) by the GRU kernel"""
+        return inputs.dot(self.kernel)
+
+    def state_dot(self, state: np.ndarray, columns: slice) -> np.ndarray:
+        """Multiplies hidden states by the given columns of the recurrent kernel"""
+        return state.dot(self.recurrent_kernel[:, columns])
+
+    def dense_dot(self, state: np.ndarray) -> np.ndarray:
+        return state.dot(self.dense_kernel)
+
+    def output(self, state: np.ndarray) -> np.ndarray:
+        """Converts GRU hidden states to network outputs of shape (batch, outputs)"""
+        return activations['sigmoid'](self.dense_dot(state) + self.dense_bias)
+
+    def predict(self, inputs: np.ndarray) -> np.ndarray:
+        return self.output(self.run_gru(inputs))
+
+
+def random_model(feature_size: int, units: int = 20, seed: int = None, reset_after: bool = True,
+                 activation: str = 'tanh', recurrent_activation: str = 'sigmoid') -> NumpyModel:
+    """Network with random weights for tests and benchmarks, with as many units as a default precise model"""
+    rand = np.random.RandomState(seed)
+    return NumpyModel(
+        rand.randn(feature_size, 3 * units) * 0.3, rand.randn(units, 3 * units) * 0.3,
+        rand.randn(*((2,) if reset_after else ()), 3 * units) * 0.1, rand.randn(units, 1), rand.randn(1),
+        activation=activation, recurrent_activation=recurrent_activation
+    )
@@ -110,11 +110,11 @@ class ListenerParams:
 
     def vectorization_md5_hash(self):
         """Hash all the fields related to audio vectorization"""
-        keys = sorted(pr.__dict__)
+        keys = sorted(self.__dict__)
         keys.remove('threshold_config')
         keys.remove('threshold_center')
         return hashlib.md5(
-            str([pr.__dict__[i] for i in keys]).encode()
+            str([self.__dict__[i] for i in keys]).encode()
         ).hexdigest()
 
 
@@ -147,19 +147,28 @@ pr = ListenerParams(
 compatibility_params = dict(vectorizer=Vectorizer.speechpy_mfccs)
 
 
-def inject_params(model_name: str) -> ListenerParams:
-    """Set the global listener params to a saved model"""
+def load_params(model_name: str, defaults: ListenerParams = pr) -> ListenerParams:
+    """Load the listener params of a saved model without changing the global params"""
+    if model_name.endswith('.pwb') and isfile(model_name):
+        from precise.weights_bundle import read_header
+        return attr.evolve(defaults, **dict(compatibility_params, **read_header(model_name)[0]['params']))
     params_file = model_name + '.params'
     try:
         with open(params_file) as f:
-            pr.__dict__.update(compatibility_params, **json.load(f))
+            return attr.evolve(defaults, **dict(compatibility_params, **json.load(f)))
     except (OSError, ValueError, TypeError):
         if isfile(model_name):
             print('Warning: Failed to load parameters from ' + params_file)
+    return attr.evolve(defaults)
+
+
+def inject_params(model_name: str) -> ListenerParams:
+    """Set the global listener params to a saved model"""
+    pr.__dict__.update(load_params(model_name).__dict__)
     return pr
 
 
-def save_params(model_name: str):
-    """Save current global listener params to a file"""
+def save_params(model_name: str, params: ListenerParams = pr):
+    """Save listener params to a file, defaulting to the global params"""
     with open(model_name + '.params', 'w') as f:
-        json.dump(pr.__dict__, f)
+        json.dump(params.__dict__, f)
@@ -63,7 +63,7 @@ class PocketsphinxTestScript(BaseScript):
 
     def run(self):
         args = self.args
-        data = TrainData.from_both(args.tags_file, args.tags_folder, args.folder)
+        data = TrainData.from_both(args.tags_file, args.tags_folder, args.folder, args.index_file)
         print('Data:', data)
 
         ww_files, nww_files = data.train_files if args.use_train else data.test_files
@@ -0,0 +1,150 @@
+# Copyright 2019 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Post training int8 quantization of the GRU and Dense layers, with
+the ranges of the network inputs and hidden states calibrated on data
+"""
+import numpy as np
+from typing import *
+
+from precise.numpy_model import NumpyModel, WEIGHT_NAMES, activations
+from precise.weights_bundle import quantize, dequantize, QUANTIZED_WEIGHTS
+
+QMAX = 127
+
+
+def quantize_values(values: np.ndarray, scale: float) -> np.ndarray:
+    """Rounds values to int8 steps of scale, as int32 so their products with int8 weights can't overflow"""
+    steps = np.multiply(values, np.float32(1 / scale), dtype=np.float32)
+    np.rint(steps, out=steps)
+    np.clip(steps, -QMAX, QMAX, out=steps)
+    return steps.astype(np.int32)
+
+
+def calc_scale(values: List[np.ndarray], percentile: float) -> float:
+    """Scale that maps the given percentile of the absolute values to QMAX"""
+    limit = float(np.percentile(np.abs(np.concatenate([i.ravel() for i in values])), percentile))
+    return (limit or 1.0) / QMAX
+
+
+class RangeRecorder(NumpyModel):
+    """Float model that keeps every input and hidden state it multiplies"""
+
+    def __init__(self, model: NumpyModel):
+        super().__init__(*(getattr(model, i) for i in WEIGHT_NAMES), activation=model.activation,
+                         recurrent_activation=model.recurrent_activation)
+        self.inputs = []
+        self.states = []
+
+    def input_dot(self, inputs: np.ndarray) -> np.ndarray:
+        self.inputs.append(inputs)
+        return super().input_dot(inputs)
+
+    def state_dot(self, state: np.ndarray, columns: slice) -> np.ndarray:
+        self.states.append(state)
+        return super().state_dot(state, columns)
+
+    def dense_dot(self, state: np.ndarray) -> np.ndarray:
+        self.states.append(state)
+        return super().dense_dot(state)
+
+
+class QuantizedModel(NumpyModel):
+    """
+    GRU network with int8 weights that also rounds its inputs and hidden
+    states to int8 before every matrix multiply. The products are summed
+    as int32 and then rescaled to float by the input scale and the scale
+    of each weight column. Only the int8 weights and float biases are
+    kept, a quarter of the memory of the float kernels, which are
+    dequantized when accessed. NumPy has no int8 BLAS, so this doesn't
+    run faster than the float network
+
+    Args:
+        tensors: Weights quantized by weights_bundle.quantize, by name
+        input_scale: Size of one int8 step of the network inputs
+        state_scale: Size of one int8 step of the hidden state
+        activation: GRU activation function name
+        recurrent_activation: GRU gate activation function name
+    """
+
+    def __init__(self, tensors: Dict[str, np.ndarray], input_scale: float, state_scale: float,
+                 activation='linear', recurrent_activation='hard_sigmoid'):
+        self.tensors = tensors
+        self.bias = dequantize(tensors, 'bias')
+        self.dense_bias = dequantize(tensors, 'dense_bias')
+        self.activation = activation
+        self.recurrent_activation = recurrent_activation
+        self.units = tensors['recurrent_kernel'].shape[0]
+        self.reset_after = self.bias.ndim == 2
+        self.act = activations[activation]
+        self.recurrent_act = activations[recurrent_activation]
+        self.input_scale = input_scale
+        self.state_scale = state_scale
+        self.out_scales = {
+            name: tensors[name + '.scale'] * np.float32(scale) for name, scale in [
+                ('kernel', input_scale), ('recurrent_kernel', state_scale), ('dense_kernel', state_scale)
+            ]
+        }
+
+    @property
+    def kernel(self) -> np.ndarray:
+        return dequantize(self.tensors, 'kernel')
+
+    @property
+    def recurrent_kernel(self) -> np.ndarray:
+        return dequantize(self.tensors, 'recurrent_kernel')
+
+    @property
+    def dense_kernel(self) -> np.ndarray:
+        return dequantize(self.tensors, 'dense_kernel')
+
+    @property
+    def feature_size(self) -> int:
+        return self.tensors['kernel'].shape[0]
+
+    @classmethod
+    def calibrate(cls, model: NumpyModel, inputs: np.ndarray, percentile: float = 99.99,
+                  max_inputs: int = 4096) -> 'QuantizedModel':
+        """
+        Quantizes a float model, choosing the int8 ranges from the
+        values seen while running it on the given inputs
+        Args:
+            model: Float model to quantize
+            inputs: Calibration inputs of shape (batch, timesteps, feature_size)
+            percentile: Percentile of the absolute values to represent, clipping outliers above it
+            max_inputs: Number of evenly spaced inputs to calibrate with at most
+        """
+        if len(inputs) == 0:
+            raise ValueError('No calibration data')
+        if len(inputs) > max_inputs:
+            inputs = inputs[np.linspace(0, len(inputs) - 1, max_inputs).astype(int)]
+        recorder = RangeRecorder(model)
+        recorder.predict(np.asarray(inputs))
+        tensors = {}
+        for name in WEIGHT_NAMES:
+            tensors.update(quantize(name, getattr(model, name), 'int8'))
+        return cls(tensors, calc_scale(recorder.inputs, percentile), calc_scale(recorder.states, percentile),
+                   model.activation, model.recurrent_activation)
+
+    def input_dot(self, inputs: np.ndarray) -> np.ndarray:
+        products = np.matmul(quantize_values(inputs, self.input_scale), self.tensors['kernel'])
+        return np.multiply(products, self.out_scales['kernel'], dtype=np.float32)
+
+    def state_dot(self, state: np.ndarray, columns: slice) -> np.ndarray:
+        products = np.matmul(quantize_values(state, self.state_scale), self.tensors['recurrent_kernel'][:, columns])
+        return np.multiply(products, self.out_scales['recurrent_kernel'][columns], dtype=np.float32)
+
+    def dense_dot(self, state: np.ndarray) -> np.ndarray:
+        products = np.matmul(quantize_values(state, self.state_scale), self.tensors['dense_kernel'])
+        return np.multiply(products, self.out_scales['dense_kernel'], dtype=np.float32)
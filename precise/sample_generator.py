@@ -0,0 +1,353 @@
+# Copyright 2019 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Generates training samples by overlaying wake words on background
+audio, optionally in several worker processes at once
+"""
+import numpy as np
+import traceback
+from contextlib import suppress
+from itertools import count, cycle, islice
+from math import sqrt
+from multiprocessing import get_context
+from os.path import splitext, join, basename
+from typing import *
+
+from precise.audio_cache import audio_cache, load_cached_audio
+from precise.params import ListenerParams, pr
+from precise.util import load_audio, save_audio, chunk_audio
+from precise.vectorization import StreamingVectorizer, stream_windows
+
+
+def shift_in(buffer: np.ndarray, values: np.ndarray):
+    """Shifts values into the end of a buffer in place"""
+    if len(values) >= len(buffer):
+        buffer[:] = values[len(values) - len(buffer):]
+    else:
+        buffer[:-len(values)] = buffer[len(values):]
+        buffer[-len(values):] = values
+
+
+class SampleGenerator:
+    """
+    Runs through background audio overlaid with wake words and not wake
+    words, creating a sample for every chunk. Randomness comes from a
+    RandomState seeded with the seed, epoch and worker, so the batches
+    of an epoch only depend on those and the number of workers
+
+    Args:
+        background_files: Wavs of random audio that should not cause an activation
+        pos_files: Wake word wavs to overlay
+        neg_files: Not wake word wavs to overlay
+        chunk_size: Number of audio samples between generating a training sample
+        batch_size: Number of samples in each batch
+        params: Listener params to vectorize with
+        seed: Random seed of the generated batches
+        save_prob: Probability of saving the audio of a sample into debug/ww and debug/nww
+    """
+
+    def __init__(self, background_files: List[str], pos_files: List[str], neg_files: List[str],
+                 chunk_size: int = 2048, batch_size: int = 200, params: ListenerParams = pr,
+                 seed: int = 0, save_prob: float = 0.0):
+        if not background_files:
+            raise ValueError('No background audio files to generate samples with')
+        self.background_files = background_files
+        self.pos_files = pos_files
+        self.neg_files = neg_files
+        self.chunk_size = chunk_size
+        self.batch_size = batch_size
+        self.params = params
+        self.seed = seed
+        self.save_prob = save_prob
+        self.rand = np.random.RandomState(seed)
+        self.save_rand = np.random.RandomState(seed)  # Separate so saving doesn't change the samples
+        self._vectorizer = None
+        self.audio_buffer = np.zeros(params.buffer_samples, dtype=float)
+        self.vals_buffer = np.zeros(params.buffer_samples, dtype=float)
+
+    def __getstate__(self):
+        """Leaves out the vectorizer when sent to a worker"""
+        return dict(self.__dict__, _vectorizer=None)
+
+    @property
+    def vectorizer(self) -> StreamingVectorizer:
+        if self._vectorizer is None:
+            self._vectorizer = StreamingVectorizer(self.params)
+        return self._vectorizer
+
+    @property
+    def sample_shape(self) -> tuple:
+        """Shape of a single network input"""
+        return self.params.n_features, self.vectorizer.num_coeffs
+
+    @staticmethod
+    def layer_with(sample: np.ndarray, value: int) -> np.ndarray:
+        """Create an identical 2d array where the second row is filled with value"""
+        b = np.full((2, len(sample)), value, dtype=float)
+        b[0] = sample
+        return b
+
+    def generate_wakeword_pieces(self, volume):
+        """Generates chunks of audio that represent the wakeword stream"""
+        while True:
+            target = 1 if self.rand.random_sample() > 0.5 else 0
+            files = self.pos_files if target else self.neg_files
+            if files:
+                sample = load_cached_audio(files[self.rand.randint(len(files))])
+                yield self.layer_with(self.normalize_volume_to(sample, volume), target)
+            silence_t = 0.5 + 2.0 * self.rand.random_sample()
+            yield self.layer_with(np.zeros(int(self.params.sample_rate * silence_t)), 0)
+
+    @staticmethod
+    def chunk_audio_pieces(pieces, chunk_size):
+        """Convert chunks of audio into a series of equally sized pieces"""
+        left_over = np.array([])
+        for piece in pieces:
+            if left_over.size == 0:
+                combined = piece
+            else:
+                combined = np.concatenate([left_over, piece], axis=-1)
+            for chunk in chunk_audio(combined.T, chunk_size):
+                yield chunk.T
+            left_over = piece[-(len(piece) % chunk_size):]
+
+    @staticmethod
+    def calc_volume(sample: np.ndarray):
+        """Find the RMS of the audio"""
+        return sqrt(np.mean(np.square(sample)))
+
+    def normalize_volume_to(self, sample, volume):
+        """Normalize the volume to a certain RMS"""
+        return volume * sample / self.calc_volume(sample)
+
+    @staticmethod
+    def merge(a, b, ratio):
+        """Perform a weighted sum of a and b. ratio=1.0 means 100% of b and 0% of a"""
+        return (1.0 - ratio) * a + ratio * b
+
+    @staticmethod
+    def max_run_length(x: np.ndarray, val: int):
+        """Finds the maximum continuous length of the given value in the sequence"""
+        if x.size == 0:
+            return 0
+        else:
+            y = np.array(x[1:] != x[:-1])
+            i = np.append(np.where(y), len(x) - 1)
+            run_lengths = np.diff(np.append(-1, i))
+            run_length_values = x[i]
+            return max([rl for rl, v in zip(run_lengths, run_length_values) if v == val], default=0)
+
+    def vectors_from_fn(self, fn: str):
+        """
+        Run through a single background audio file, overlaying with wake words.
+        Generates (mfccs, target) where mfccs is a series of mfcc values and
+        target is a single integer classification of the target network output for that chunk
+        """
+        if self.vectorizer.streaming:
+            return self.batch_vectors_from_fn(fn)
+        return self.stream_vectors_from_fn(fn)
+
+    def load_background(self, fn: str) -> Tuple[np.ndarray, float]:
+        """Loads background audio at a random fraction of its volume"""
+        audio = load_audio(fn)
+        audio_volume = self.calc_volume(audio)
+        audio_volume *= 0.4 + 0.5 * self.rand.random_sample()
+        return self.normalize_volume_to(audio, audio_volume), audio_volume
+
+    def stream_vectors_from_fn(self, fn: str):
+        """Same as vectors_from_fn, streaming the audio through the vectorizer chunk by chunk"""
+        audio, audio_volume = self.load_background(fn)
+        self.vectorizer.clear()
+        chunked_bg = chunk_audio(audio, self.chunk_size)
+        chunked_ww = self.chunk_audio_pieces(self.generate_wakeword_pieces(audio_volume), self.chunk_size)
+
+        for i, (chunk_bg, (chunk_ww, targets)) in enumerate(zip(chunked_bg, chunked_ww)):
+            chunk = self.merge(chunk_bg, chunk_ww, 0.6)
+            shift_in(self.vals_buffer, targets)
+            shift_in(self.audio_buffer, chunk)
+            mfccs = self.vectorizer.update(chunk)
+            percent_overlapping = self.max_run_length(self.vals_buffer, 1) / len(self.vals_buffer)
+
+            if self.vals_buffer[-1] == 0 and percent_overlapping > 0.8:
+                target = 1
+            elif percent_overlapping < 0.5:
+                target = 0
+            else:
+                continue
+
+            if self.save_rand.random_sample() > 1.0 - self.save_prob:
+                self.save_sample(fn, i, target, self.audio_buffer)
+            yield mfccs.copy(), target
+
+    def batch_vectors_from_fn(self, fn: str):
+        """
+        Same as vectors_from_fn, but builds the whole mixed signal and target
+        track at once, vectorizes it in one pass and finds the window and
+        target of every chunk with array operations instead of streaming
+        """
+        audio, audio_volume = self.load_background(fn)
+        num_chunks = len(range(self.chunk_size, len(audio), self.chunk_size))
+        if num_chunks == 0:
+            return
+        track = np.concatenate(list(islice(self.chunk_audio_pieces(
+            self.generate_wakeword_pieces(audio_volume), self.chunk_size
+        ), num_chunks)), axis=-1)
+        mixed = self.merge(audio[:track.shape[-1]], track[0], 0.6)
+
+        self.vectorizer.clear()
+        features = self.vectorizer.vectorize_new(mixed)
+        ends = self.chunk_size * np.arange(1, num_chunks + 1)
+        windows, window_ids = stream_windows(features, ends, self.params)
+
+        buffer_len = len(self.vals_buffer)
+        vals = np.concatenate([self.vals_buffer, track[1]])
+        last_vals = vals[ends + buffer_len - 1]
+        percent_overlapping = self.max_run_lengths(vals, ends, ends + buffer_len) / buffer_len
+        targets = np.full(num_chunks, -1)
+        targets[(last_vals == 0) & (percent_overlapping > 0.8)] = 1
+        targets[(targets == -1) & (percent_overlapping < 0.5)] = 0
+
+        full_audio = np.concatenate([self.audio_buffer, mixed])
+        self.vals_buffer[:] = vals[-buffer_len:]
+        self.audio_buffer[:] = full_audio[-buffer_len:]
+
+        for i in np.flatnonzero(targets >= 0):
+            if self.save_rand.random_sample() > 1.0 - self.save_prob:
+                self.save_sample(fn, i, targets[i], full_audio[ends[i]:ends[i] + buffer_len])
+            yield windows[window_ids[i]].copy(), int(targets[i])
+
+    @staticmethod
+    def max_run_lengths(x: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        """Finds the longest run of ones in each window x[starts[i]:ends[i]]"""
+        edges = np.diff(np.concatenate([[0], (x == 1).astype(np.int8), [0]]))
+        run_starts, run_ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+        overlaps = np.minimum(run_ends, ends[:, np.newaxis]) - np.maximum(run_starts, starts[:, np.newaxis])
+        return np.clip(overlaps, 0, None).max(axis=1, initial=0)
+
+    @staticmethod
+    def save_sample(fn: str, chunk_id: int, target: int, audio: np.ndarray):
+        name = splitext(basename(fn))[0]
+        wav_file = join('debug', 'ww' if target == 1 else 'nww', '{} - {}.wav'.format(name, chunk_id))
+        save_audio(wav_file, audio)
+
+    @staticmethod
+    def samples_to_batches(samples: Iterable, batch_size: int):
+        """Chunk a series of network inputs and outputs into larger batches"""
+        it = iter(samples)
+        while True:
+            with suppress(StopIteration):
+                batch_in, batch_out = [], []
+                for i in range(batch_size):
+                    sample_in, sample_out = next(it)
+                    batch_in.append(sample_in)
+                    batch_out.append(sample_out)
+            if not batch_in:
+                return
+            yield np.array(batch_in), np.array(batch_out)
+
+    def epoch_batches(self, epoch: int, num_batches: int, worker: int = 0, num_workers: int = 1):
+        """Generates the batches of one epoch from the worker's slice of the background files"""
+        self.rand = np.random.RandomState([self.seed, epoch, worker])
+        self.save_rand = np.random.RandomState([self.seed, epoch, worker, 1])
+        self.audio_buffer[:] = self.vals_buffer[:] = 0
+        files = self.background_files[worker::num_workers]
+        samples = (
+            sample for i in cycle(self.rand.permutation(len(files)))
+            for sample in self.vectors_from_fn(files[i])
+        )
+        return islice(self.samples_to_batches(samples, self.batch_size), num_batches)
+
+    def generate(self, first_epoch: int, steps_per_epoch: int):
+        """Generates batches forever, starting from the given epoch"""
+        for epoch in count(first_epoch):
+            yield from self.epoch_batches(epoch, steps_per_epoch)
+
+
+def run_worker(generator: SampleGenerator, worker: int, num_workers: int, first_epoch: int,
+               steps_per_epoch: int, audio_cache_bytes: int, slots: list, free_slots, ready_slots):
+    """Fills free shared memory slots with batches until terminated"""
+    try:
+        audio_cache.resize(audio_cache_bytes)
+        for epoch in count(first_epoch):
+            num_batches = len(range(worker, steps_per_epoch, num_workers))
+            for inputs, outputs in generator.epoch_batches(epoch, num_batches, worker, num_workers):
+                slot = free_slots.get()
+                slot_inputs, slot_outputs = slots[slot]
+                np.frombuffer(slot_inputs, np.float32).reshape(inputs.shape)[:] = inputs
+                np.frombuffer(slot_outputs, np.float32)[:] = outputs
+                ready_slots.put(slot)
+    except BaseException:
+        ready_slots.put(traceback.format_exc())
+
+
+class ParallelSampleGenerator:
+    """
+    Runs a SampleGenerator in worker processes that each own a slice of
+    the background files. Batches are passed back through a fixed number
+    of shared memory slots per worker, so at most that many finished
+    batches wait in memory. Steps are taken from the workers in turn, which
+    keeps the batches of an epoch deterministic for a given seed and number of workers.
+    Each worker gets its own audio cache with the size of the current process's
+
+    Args:
+        generator: Generator to run in each worker
+        num_workers: Number of worker processes
+        slots_per_worker: Number of finished batches each worker can have waiting
+    """
+
+    def __init__(self, generator: SampleGenerator, num_workers: int, slots_per_worker: int = 4):
+        self.generator = generator
+        self.num_workers = max(1, min(num_workers, len(generator.background_files)))
+        self.slots_per_worker = slots_per_worker
+
+    def generate(self, first_epoch: int, steps_per_epoch: int):
+        """Generates batches forever, starting from the given epoch"""
+        context = get_context('spawn')
+        num_workers = min(self.num_workers, steps_per_epoch)
+        batch_size = self.generator.batch_size
+        input_size = batch_size * int(np.prod(self.generator.sample_shape))
+        workers = []
+        for worker in range(num_workers):
+            slots = [
+                (context.RawArray('f', input_size), context.RawArray('f', batch_size))
+                for _ in range(self.slots_per_worker)
+            ]
+            free_slots, ready_slots = context.Queue(), context.Queue()
+            for slot in range(len(slots)):
+                free_slots.put(slot)
+            process = context.Process(target=run_worker, daemon=True, args=(
+                self.generator, worker, num_workers, first_epoch, steps_per_epoch,
+                audio_cache.max_bytes, slots, free_slots, ready_slots
+            ))
+            process.start()
+            workers.append((process, slots, free_slots, ready_slots))
+
+        try:
+            for _ in count(first_epoch):
+                for step in range(steps_per_epoch):
+                    process, slots, free_slots, ready_slots = workers[step % num_workers]
+                    slot = ready_slots.get()
+                    if isinstance(slot, str):
+                        raise RuntimeError('Sample generator worker failed:\n' + slot)
+                    slot_inputs, slot_outputs = slots[slot]
+                    inputs = np.frombuffer(slot_inputs, np.float32).reshape(
+                        (batch_size,) + self.generator.sample_shape
+                    ).copy()
+                    outputs = np.frombuffer(slot_outputs, np.float32).copy()
+                    free_slots.put(slot)
+                    yield inputs, outputs
+        finally:
+            for process, *_ in workers:
+                process.terminate()
+                process.join()
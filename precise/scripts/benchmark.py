@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+# Copyright 2019 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Benchmark each stage of the audio to confidence pipeline on
+synthetic audio, reporting latency percentiles, real time
+factor (processing time / audio time) and peak memory usage
+
+:-m --model str -
+    Keras (.net) or TensorFlow (.pb) model to benchmark the
+    runners of. A NumPy network with random weights is
+    always benchmarked
+
+:-c --chunk-size int 2048
+    Number of bytes per chunk given to the listener
+
+:-n --num-chunks int 500
+    Number of chunks to time each stage with
+
+:-f --num-files int 200
+    Number of synthetic files to load with TrainData
+
+:-o --output-file str -
+    Json file to write the results to
+
+:-s --seed int 0
+    Random seed for the synthetic audio
+"""
+import json
+import numpy as np
+import os
+import platform
+import resource
+import time
+from functools import partial
+from glob import glob
+from os.path import join
+from precise_runner.runner import TriggerDetector
+from prettyparse import Usage
+from tempfile import TemporaryDirectory
+from typing import *
+
+from precise import __version__
+from precise.network_runner import Listener, NumpyRunner
+from precise.numpy_model import random_model
+from precise.params import load_params
+from precise.scripts.base_script import BaseScript
+from precise.threshold_decoder import ThresholdDecoder
+from precise.train_data import TrainData
+from precise.util import audio_to_buffer, save_audio, load_audio, read_wavio_int16, int16_to_audio
+from precise.vectorization import vectorize_raw, vectorize, vectorize_delta
+
+
+def synthetic_audio(num_samples: int, seed: int = 0) -> np.ndarray:
+    """Noise with a varying envelope so the features aren't constant"""
+    rand = np.random.RandomState(seed)
+    envelope = 0.1 + 0.4 * np.abs(np.sin(np.linspace(0, 20 * np.pi, num_samples)))
+    return (rand.uniform(-1, 1, num_samples) * envelope).astype(np.float32)
+
+
+def peak_rss_mb() -> float:
+    """Peak resident memory of the process so far"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def time_calls(func: Callable, inputs: Iterable) -> np.ndarray:
+    """Seconds taken by each call of func on the inputs"""
+    times = []
+    for inp in inputs:
+        start = time.perf_counter()
+        func(inp)
+        times.append(time.perf_counter() - start)
+    return np.array(times)
+
+
+def summarize(times: np.ndarray, audio_seconds: float = None) -> dict:
+    """Latency statistics of a benchmark in milliseconds"""
+    ms = times * 1000
+    result = {
+        'calls': len(times),
+        'mean_ms': float(ms.mean()),
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p90_ms': float(np.percentile(ms, 90)),
+        'p99_ms': float(np.percentile(ms, 99)),
+        'max_ms': float(ms.max()),
+        'peak_rss_mb': peak_rss_mb()
+    }
+    if audio_seconds:
+        result['real_time_factor'] = float(times.mean() / audio_seconds)
+    return result
+
+
+class BenchmarkScript(BaseScript):
+    usage = Usage(__doc__)
+
+    def __init__(self, args):
+        super().__init__(args)
+        if args.chunk_size <= 0 or args.chunk_size % 2:
+            raise ValueError('chunk size must be a positive number of int16 samples')
+        self.pr = load_params(args.model)
+        self.chunk_seconds = args.chunk_size / 2 / self.pr.sample_rate
+        audio = synthetic_audio(args.num_chunks * args.chunk_size // 2, args.seed)
+        buffer = audio_to_buffer(audio)
+        self.chunks = [buffer[i:i + args.chunk_size] for i in range(0, len(buffer), args.chunk_size)]
+        self.windows = [
+            audio[i:i + self.pr.buffer_samples]
+            for i in range(0, len(audio) - self.pr.buffer_samples, args.chunk_size // 2)
+        ] or [audio]
+
+    def create_runners(self) -> Dict[str, Callable]:
+        model = random_model(self.pr.feature_size, seed=self.args.seed)
+        runners = {'NumpyRunner[random]': lambda _: NumpyRunner.from_model(model)}
+        if self.args.model:
+            runner_cls = Listener.find_runner(self.args.model)
+            runners[runner_cls.__name__] = runner_cls
+            runners['NumpyRunner'] = NumpyRunner
+        return runners
+
+    def benchmark_vectorizers(self) -> Dict[str, dict]:
+        window_seconds = self.pr.buffer_samples / self.pr.sample_rate
+        return {
+            name + '[window]': summarize(time_calls(partial(func, params=self.pr), self.windows), window_seconds)
+            for name, func in [
+                ('vectorize_raw', vectorize_raw),
+                ('vectorize', vectorize),
+                ('vectorize_delta', vectorize_delta)
+            ]
+        }
+
+    def benchmark_listeners(self) -> Dict[str, dict]:
+        results = {}
+        listener = Listener(self.args.model, self.args.chunk_size, runner_cls=lambda _: None)
+        results['Listener.update_vectors'] = summarize(
+            time_calls(listener.update_vectors, self.chunks), self.chunk_seconds
+        )
+        for name, runner_cls in self.create_runners().items():
+            listener = Listener(self.args.model, self.args.chunk_size, runner_cls=runner_cls)
+            results['Listener.update[{}]'.format(name)] = summarize(
+                time_calls(listener.update, self.chunks), self.chunk_seconds
+            )
+        return results
+
+    def benchmark_decoding(self) -> Dict[str, dict]:
+        raw_outputs = np.random.RandomState(self.args.seed).uniform(0, 1, len(self.chunks))
+        decoder = ThresholdDecoder.from_params(self.pr)
+        detector = TriggerDetector(self.args.chunk_size)
+        return {
+            'ThresholdDecoder.decode': summarize(time_calls(decoder.decode, raw_outputs)),
+            'TriggerDetector.update': summarize(time_calls(detector.update, raw_outputs))
+        }
+
+    def benchmark_train_data(self) -> Dict[str, dict]:
+        results = {}
+        num_samples = int(self.pr.buffer_t * self.pr.sample_rate)
+        with TemporaryDirectory() as folder:
+            for i in range(self.args.num_files):
+                label = 'wake-word' if i % 2 == 0 else 'not-wake-word'
+                os.makedirs(join(folder, label), exist_ok=True)
+                save_audio(join(folder, label, '{}.wav'.format(i)), synthetic_audio(num_samples, i))
+            files = glob(join(folder, '*', '*.wav'))
+            num_files = len(files)
+            results['load_audio'] = summarize(time_calls(load_audio, files))
+            results['load_audio[wavio]'] = summarize(time_calls(
+                lambda filename: int16_to_audio(read_wavio_int16(filename)), files
+            ))
+
+            cwd = os.getcwd()
+            os.chdir(folder)  # TrainData caches vectors in the working directory
+            try:
+                for name in ('TrainData.load[uncached]', 'TrainData.load[cached]'):
+                    start = time.perf_counter()
+                    TrainData.from_folder(folder).load(True, False, params=self.pr)
+                    seconds = time.perf_counter() - start
+                    results[name] = {
+                        'files': num_files,
+                        'seconds': seconds,
+                        'files_per_second': num_files / seconds,
+                        'peak_rss_mb': peak_rss_mb()
+                    }
+            finally:
+                os.chdir(cwd)
+        return results
+
+    def run(self):
+        results = {}
+        for benchmark in (self.benchmark_vectorizers, self.benchmark_listeners,
+                          self.benchmark_decoding, self.benchmark_train_data):
+            results.update(benchmark())
+
+        print()
+        for name, result in results.items():
+            print('=== {} ===\n{}\n'.format(name, '\n'.join(
+                '{}: {:.4g}'.format(key, value) for key, value in result.items()
+            )))
+
+        if self.args.output_file:
+            with open(self.args.output_file, 'w') as f:
+                json.dump({
+                    'meta': {
+                        'precise_version': __version__,
+                        'numpy_version': np.__version__,
+                        'python_version': platform.python_version(),
+                        'platform': platform.platform(),
+                        'model': self.args.model,
+                        'chunk_size': self.args.chunk_size,
+                        'time': time.time()
+                    },
+                    'results': results
+                }, f, indent=4)
+            print('Wrote results to', self.args.output_file)
+
+
+main = BenchmarkScript.run_main
+
+if __name__ == '__main__':
+    main()
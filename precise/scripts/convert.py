@@ -14,16 +14,28 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 """
-Convert wake word model from Keras to TensorFlow
+Convert wake word model from Keras to TensorFlow, or export
+its weights to an .npz file or a single file weights bundle
+(.pwb) that runs without TensorFlow
 
 :model str
-    Input Keras model (.net)
+    Input Keras model (.net) or TensorFlow model (.pb) when
+    exporting to .npz or .pwb
 
 :-o --out str {model}.pb
-    Custom output TensorFlow protobuf filename
+    Custom output filename. Ending it with .npz or .pwb
+    exports the weights for the NumPy runner instead
+
+:-d --dtype str float32
+    Weight type of .pwb bundles. Either float32, float16 or int8
+
+:-c --calibration-folder str -
+    Data folder whose test set calibrates the activation
+    ranges of int8 bundles, so they run with int8 inputs
+    and hidden states as well
 """
 import os
-from os.path import split, isfile
+from os.path import split, isfile, splitext
 from prettyparse import Usage
 from shutil import copyfile
 
@@ -35,8 +47,51 @@ class ConvertScript(BaseScript):
 
     def run(self):
         args = self.args
-        model_name = args.model.replace('.net', '')
-        self.convert(args.model, args.out.format(model=model_name))
+        model_name = splitext(args.model)[0]
+        out_file = args.out.format(model=model_name)
+        if out_file.endswith('.npz'):
+            self.export_npz(args.model, out_file)
+        elif out_file.endswith('.pwb'):
+            self.export_bundle(args.model, out_file, args.dtype, args.calibration_folder)
+        else:
+            self.convert(args.model, out_file)
+
+    def export_npz(self, model_path: str, out_file: str):
+        """Writes the weights of a Keras or TensorFlow model to an .npz file"""
+        from precise.numpy_model import NumpyModel
+
+        print('Exporting', model_path, 'to', out_file, '...')
+        out_dir = split(out_file)[0]
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+        NumpyModel.from_file(model_path).save(out_file)
+        if isfile(model_path + '.params'):
+            copyfile(model_path + '.params', out_file + '.params')
+        print('Saved weights to:', out_file)
+
+    def export_bundle(self, model_path: str, out_file: str, dtype: str, calibration_folder: str = ''):
+        """Writes the weights and params of a Keras or TensorFlow model to a .pwb bundle"""
+        from precise.numpy_model import NumpyModel
+        from precise.params import load_params
+        from precise.weights_bundle import save_bundle
+
+        print('Exporting', model_path, 'to', out_file, 'with', dtype, 'weights...')
+        out_dir = split(out_file)[0]
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+        model = NumpyModel.from_file(model_path)
+        params = load_params(model_path)
+        if calibration_folder:
+            if dtype != 'int8':
+                raise ValueError('Only int8 bundles can be calibrated')
+            from precise.quantization import QuantizedModel
+            from precise.train_data import TrainData
+
+            inputs = TrainData.from_folder(calibration_folder).load(False, True, params=params)[1][0]
+            print('Calibrating with', len(inputs), 'samples...')
+            model = QuantizedModel.calibrate(model, inputs)
+        save_bundle(out_file, model, params, dtype)
+        print('Saved bundle to:', out_file)
 
     def convert(self, model_path: str, out_file: str):
         """
@@ -21,17 +21,49 @@ will be given via stdout as a float string, one per line
 :model_name str
     Keras or TensorFlow model to read from
 
+:-b --binary
+    Write fixed size binary responses with sequence numbers
+    instead of text lines. See precise_runner.runner
+
+:-t --timing
+    Include the seconds spent processing each chunk in
+    binary responses
+
+:-m --max-batch int 16
+    Maximum number of chunks already waiting on stdin to
+    run through the network at once in binary mode
+
+:-si --stats-interval float 0.0
+    Seconds between writing the latency of each stage as
+    json lines to stderr. Disabled if 0
+
+:-ss --stats-socket str -
+    Unix datagram socket to send the latency stats to
+    instead of stderr
+
 ...
 """
+import time
+
+start_time = time.perf_counter()
+
 import sys
 
+import json
+import numpy as np
 import os
+import socket
+from precise_runner.runner import BINARY_MAGIC, BINARY_VERSION, HANDSHAKE, FIELD_TIMING, response_struct
 from prettyparse import Usage
+from select import select
+from typing import BinaryIO
 
 from precise import __version__
-from precise.network_runner import Listener
+from precise.network_runner import Listener, null_timer
 from precise.scripts.base_script import BaseScript
 
+import_seconds = time.perf_counter() - start_time
+
 
 def add_audio_pipe_to_parser(parser):
     parser.usage = parser.format_usage().strip().replace('usage: ', '') + ' < audio.wav'
@@ -54,17 +86,95 @@ class EngineScript(BaseScript):
         os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
         stdout = sys.stdout
         sys.stdout = sys.stderr
+        load_start = time.perf_counter()
         listener = Listener(self.args.model_name, self.args.chunk_size)
+        print('Imported engine in {:.0f} ms, loaded {} with {} in {:.0f} ms'.format(
+            1000 * import_seconds, self.args.model_name, type(listener.runner).__name__,
+            1000 * (time.perf_counter() - load_start)
+        ), file=sys.stderr)
+        stop_stats = None
+        if self.args.stats_interval > 0:
+            from precise_runner.latency import LatencyStats
+
+            listener.latency_stats = LatencyStats(window=self.args.stats_interval)
+            stop_stats = listener.latency_stats.report_every(self.args.stats_interval, self.write_stats)
 
         try:
-            while True:
-                conf = listener.update(sys.stdin.buffer)
-                stdout.buffer.write((str(conf) + '\n').encode('ascii'))
-                stdout.buffer.flush()
+            if self.args.binary:
+                self.run_binary(listener, stdout.buffer)
+            else:
+                while True:
+                    conf = listener.update(sys.stdin.buffer)
+                    stdout.buffer.write((str(conf) + '\n').encode('ascii'))
+                    stdout.buffer.flush()
         except (EOFError, KeyboardInterrupt):
             pass
         finally:
             sys.stdout = stdout
+            if stop_stats:
+                stop_stats.set()
+                self.write_stats(listener.latency_stats.snapshot())
+
+    def write_stats(self, snapshot: dict):
+        """Writes latency stats away from stdout so the output protocol is undisturbed"""
+        line = json.dumps({'time': time.time(), 'latency': snapshot})
+        if self.args.stats_socket:
+            try:
+                with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+                    sock.sendto(line.encode(), self.args.stats_socket)
+            except OSError:
+                pass
+        else:
+            print(line, file=sys.stderr, flush=True)
+
+    def run_binary(self, listener: Listener, out: BinaryIO):
+        """
+        Answers using the binary protocol, running all chunks that are
+        already waiting on stdin as one batch and writing their responses at once
+        """
+        fields = FIELD_TIMING if self.args.timing else 0
+        response = response_struct(fields)
+        out.write(BINARY_MAGIC + HANDSHAKE.pack(BINARY_VERSION, fields, response.size))
+        out.flush()
+
+        seq = 0
+        end_of_input = False
+        while not end_of_input:
+            timer = listener.latency_stats.timer() if listener.latency_stats else null_timer
+            audio = listener.read_audio(sys.stdin.buffer)
+            timer.lap('read')
+            start = time.monotonic()
+            inputs = [listener.update_input(audio).copy()]
+            while len(inputs) < self.args.max_batch and input_pending(sys.stdin.buffer):
+                try:
+                    audio = listener.read_audio(sys.stdin.buffer)
+                except EOFError:
+                    end_of_input = True
+                    break
+                inputs.append(listener.update_input(audio).copy())
+            timer.lap('features')
+
+            if len(inputs) == 1:
+                raw_outputs = [listener.runner.run(inputs[0])]
+            else:
+                raw_outputs = listener.runner.predict(np.stack(inputs))[:, 0]
+            timer.lap('inference')
+            confs = listener.threshold_decoder.decode_batch(raw_outputs)
+            timer.lap('decode')
+            extra = (time.monotonic() - start,) if fields & FIELD_TIMING else ()
+            for conf in confs:
+                out.write(response.pack(seq, conf, *extra))
+                seq = (seq + 1) & 0xFFFFFFFF
+            out.flush()
+            timer.lap('write')
+
+
+def input_pending(stream: BinaryIO) -> bool:
+    """Whether reading from the stream would return without blocking"""
+    try:
+        return bool(select([stream], [], [], 0)[0])
+    except (TypeError, ValueError, OSError):
+        return False
 
 
 main = EngineScript.run_main
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# Copyright 2019 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Serve many audio streams over a Unix socket, running the network on
+windows from all streams in batches. Each connection is one stream of
+raw int16 audio written in groups of CHUNK_SIZE bytes. For every chunk,
+an inference is written back as a float string, one per line, like
+precise-engine
+
+:model_name str
+    Keras or TensorFlow model to read from
+
+:socket_file str
+    Unix socket to listen on
+
+:-c --chunk-size int 2048
+    Number of bytes to read from a stream before making a prediction
+
+:-b --batch-size int 64
+    Maximum number of windows run through the network at once
+
+:-w --max-wait float 0.01
+    Maximum seconds a window waits for the batch to fill up
+
+:-m --max-streams int 1024
+    Maximum number of connected streams
+
+:-k --keep-state
+    Keep the audio and feature state of a stream when it reconnects
+    with the same id. Clients send the id as the first line
+
+:-s --max-saved int 1024
+    Maximum number of disconnected streams to keep the state
+    of with --keep-state, forgetting the oldest first
+
+:-o --max-output int 65536
+    Maximum bytes of replies to hold for a stream that isn't
+    reading them before disconnecting it
+
+...
+"""
+import os
+import selectors
+import socket
+import sys
+import time
+from collections import OrderedDict
+from os.path import exists
+from prettyparse import Usage
+from typing import *
+
+import numpy as np
+
+from precise.network_runner import Listener
+from precise.scripts.base_script import BaseScript
+
+
+class AudioStream:
+    """State of a single connected stream"""
+
+    def __init__(self, conn: socket.socket, listener: Listener, chunk_size: int):
+        self.conn = conn
+        self.listener = listener
+        self.chunk_size = chunk_size
+        self.data = bytearray()
+        self.output = bytearray()  # Replies the client hasn't accepted yet
+        self.stream_id = None  # type: Optional[str]
+
+    def pop_chunks(self) -> Iterator[bytes]:
+        while len(self.data) >= self.chunk_size:
+            chunk = bytes(self.data[:self.chunk_size])
+            del self.data[:self.chunk_size]
+            yield chunk
+
+
+class EngineServerScript(BaseScript):
+    usage = Usage(__doc__)
+
+    def __init__(self, args):
+        super().__init__(args)
+        if args.chunk_size <= 0 or args.chunk_size % 2:
+            raise ValueError('chunk size must be a positive number of int16 samples')
+        self.selector = selectors.DefaultSelector()
+        self.runner = None
+        self.streams = {}  # type: Dict[socket.socket, AudioStream]
+        self.saved_listeners = OrderedDict()  # type: Dict[str, Listener]
+        self.pending = []  # type: List[Tuple[AudioStream, np.ndarray]]
+        self.pending_since = 0.0
+        self.running = False
+
+    def create_listener(self) -> Listener:
+        return Listener(self.args.model_name, self.args.chunk_size, runner_cls=lambda _: self.runner)
+
+    def accept(self, server: socket.socket):
+        conn, _ = server.accept()
+        if len(self.streams) >= self.args.max_streams:
+            conn.close()
+            return
+        conn.setblocking(False)
+        self.streams[conn] = AudioStream(conn, self.create_listener(), self.args.chunk_size)
+        self.selector.register(conn, selectors.EVENT_READ)
+
+    def disconnect(self, conn: socket.socket):
+        stream = self.streams.pop(conn)
+        if self.args.keep_state and stream.stream_id:
+            self.saved_listeners.pop(stream.stream_id, None)
+            self.saved_listeners[stream.stream_id] = stream.listener
+            while len(self.saved_listeners) > self.args.max_saved:
+                self.saved_listeners.popitem(last=False)
+        self.pending = [(s, inp) for s, inp in self.pending if s is not stream]
+        self.selector.unregister(conn)
+        conn.close()
+
+    def receive(self, conn: socket.socket):
+        stream = self.streams[conn]
+        try:
+            data = conn.recv(max(4096, stream.chunk_size * 4))
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b''
+        if not data:
+            self.disconnect(conn)
+            return
+        stream.data += data
+
+        if self.args.keep_state and stream.stream_id is None:
+            if b'\n' not in stream.data:
+                return
+            line, _, rest = bytes(stream.data).partition(b'\n')
+            stream.stream_id = line.decode('utf8', 'replace').strip()
+            stream.data = bytearray(rest)
+            if stream.stream_id in self.saved_listeners:
+                stream.listener = self.saved_listeners.pop(stream.stream_id)
+
+        for chunk in stream.pop_chunks():
+            if not self.pending:
+                self.pending_since = time.monotonic()
+            self.pending.append((stream, stream.listener.update_input(chunk).copy()))
+
+    def flush(self):
+        """Runs the network on all pending windows and replies to their streams"""
+        while self.pending:
+            batch = self.pending[:self.args.batch_size]
+            self.pending = self.pending[self.args.batch_size:]
+            outputs = self.runner.predict(np.stack([inp for _, inp in batch]))
+            confs = batch[0][0].listener.threshold_decoder.decode_batch(outputs[:, 0])
+            for (stream, _), conf in zip(batch, confs):
+                stream.output += (str(conf) + '\n').encode('ascii')
+            for stream in {stream.conn: stream for stream, _ in batch}.values():
+                if stream.conn in self.streams:
+                    self.send(stream)
+        self.pending_since = time.monotonic()
+
+    def send(self, stream: AudioStream):
+        """
+        Writes as much pending output as the socket accepts without blocking,
+        waiting for the socket to be writable for the rest. Streams that
+        fall behind by more than max_output bytes are disconnected
+        """
+        try:
+            del stream.output[:stream.conn.send(stream.output)]
+        except BlockingIOError:
+            pass
+        except OSError:
+            self.disconnect(stream.conn)
+            return
+        if len(stream.output) > self.args.max_output:
+            print('Disconnecting stream that stopped reading', file=sys.stderr)
+            self.disconnect(stream.conn)
+            return
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if stream.output else 0)
+        if self.selector.get_key(stream.conn).events != events:
+            self.selector.modify(stream.conn, events)
+
+    def run(self):
+        os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+        if exists(self.args.socket_file):
+            os.remove(self.args.socket_file)
+
+        self.runner = Listener.find_runner(self.args.model_name)(self.args.model_name)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.args.socket_file)
+        server.listen(128)
+        self.selector.register(server, selectors.EVENT_READ)
+        print('Listening on', self.args.socket_file, file=sys.stderr)
+
+        self.running = True
+        try:
+            while self.running:
+                timeout = 1.0  # So stop() is noticed
+                if self.pending:
+                    timeout = max(0.0, self.pending_since + self.args.max_wait - time.monotonic())
+                for key, events in self.selector.select(timeout):
+                    if key.fileobj is server:
+                        self.accept(server)
+                        continue
+                    if events & selectors.EVENT_WRITE and key.fileobj in self.streams:
+                        self.send(self.streams[key.fileobj])
+                    if events & selectors.EVENT_READ and key.fileobj in self.streams:
+                        self.receive(key.fileobj)
+                    if len(self.pending) >= self.args.batch_size:
+                        self.flush()
+                if self.pending and time.monotonic() >= self.pending_since + self.args.max_wait:
+                    self.flush()
+        finally:
+            for conn in list(self.streams):
+                self.disconnect(conn)
+            self.selector.unregister(server)
+            server.close()
+            os.remove(self.args.socket_file)
+
+    def stop(self):
+        """Makes run() return within a second, from another thread"""
+        self.running = False
+
+
+main = EngineServerScript.run_main
+
+if __name__ == '__main__':
+    main()
@@ -53,6 +53,7 @@ from precise.pocketsphinx.scripts.test import PocketsphinxTestScript
 from precise.scripts.base_script import BaseScript
 from precise.stats import Stats
 from precise.train_data import TrainData
+from precise.util import predict_in_batches
 
 
 class EvalScript(BaseScript):
@@ -79,7 +80,7 @@ class EvalScript(BaseScript):
 
     def run(self):
         args = self.args
-        data = TrainData.from_both(args.tags_file, args.tags_folder, args.folder)
+        data = TrainData.from_both(args.tags_file, args.tags_folder, args.folder, args.index_file)
         data_files = data.train_files if args.use_train else data.test_files
         print('Data:', data)
 
@@ -100,9 +101,9 @@ class EvalScript(BaseScript):
             print('Calculating', model_name + '...')
             inject_params(model_name)
 
-            train, test = data.load(args.use_train, not args.use_train)
+            train, test = data.load(args.use_train, not args.use_train, jobs=args.jobs)
             inputs, targets = train if args.use_train else test
-            predictions = Listener.find_runner(model_name)(model_name).predict(inputs)
+            predictions = predict_in_batches(Listener.find_runner(model_name)(model_name).predict, inputs)
 
             stats = Stats(predictions, targets, sum(data_files, []))
 
@@ -52,6 +52,7 @@ from precise.scripts.base_script import BaseScript
 from precise.stats import Stats
 from precise.threshold_decoder import ThresholdDecoder
 from precise.train_data import TrainData
+from precise.util import predict_in_batches
 
 
 def get_thresholds(points=100, power=3) -> list:
@@ -96,7 +97,7 @@ def calc_stats(model_files, loader, use_train, filenames):
         train, test = loader.load_for(model)
         inputs, targets = train if use_train else test
         print('Running network...')
-        predictions = Listener.find_runner(model)(model).predict(inputs)
+        predictions = predict_in_batches(Listener.find_runner(model)(model).predict, inputs)
         print(inputs.shape, targets.shape)
 
         print('Generating statistics...')
@@ -126,11 +127,11 @@ class GraphScript(BaseScript):
     def run(self):
         args = self.args
         if args.models:
-            data = TrainData.from_both(args.tags_file, args.tags_folder, args.folder)
+            data = TrainData.from_both(args.tags_file, args.tags_folder, args.folder, args.index_file)
             print('Data:', data)
             filenames = sum(data.train_files if args.use_train else data.test_files, [])
             loader = CachedDataLoader(partial(
-                data.load, args.use_train, not args.use_train, shuffle=False
+                data.load, args.use_train, not args.use_train, shuffle=False, jobs=args.jobs
             ))
             model_data = calc_stats(args.models, loader, args.use_train, filenames)
         else:
@@ -144,8 +145,8 @@ class GraphScript(BaseScript):
             np.savez(args.output_file, data={name: stats.to_np_dict() for name, stats in model_data.items()})
         else:
             plt = load_plt()
-            decoder = ThresholdDecoder(pr.threshold_config, pr.threshold_center)
-            thresholds = [decoder.encode(i) for i in np.linspace(0.0, 1.0, args.resolution)[1:-1]]
+            decoder = ThresholdDecoder.from_params(pr)
+            thresholds = decoder.encode_batch(np.linspace(0.0, 1.0, args.resolution)[1:-1])
             for model_name, stats in model_data.items():
                 x = [stats.false_positives(i) for i in thresholds]
                 y = [stats.false_negatives(i) for i in thresholds]
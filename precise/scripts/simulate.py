@@ -27,19 +27,34 @@ unbiased false positive metrics
 
 :-t --threshold float 0.5
     Network output required to be considered an activation
+
+:-b --batch-size int 2048
+    Number of windows to run through the network at once
+
+:-s --streaming
+    Read, vectorize and evaluate each file in blocks so
+    memory usage doesn't depend on the length of the files
+
+:-bs --block-size int 4194304
+    Number of samples to read at a time with --streaming
+
+:-j --jobs int 1
+    Number of files to simulate in parallel processes
 """
 import attr
 import numpy as np
 from glob import glob
+from multiprocessing import get_context
 from os.path import join, basename
 from precise_runner.runner import TriggerDetector
 from prettyparse import Usage
+from typing import *
 
-from precise.network_runner import Listener
+from precise.network_runner import Listener, Runner
 from precise.params import pr, inject_params
 from precise.scripts.base_script import BaseScript
-from precise.util import load_audio
-from precise.vectorization import vectorize_raw
+from precise.util import load_audio, predict_in_batches, read_audio_blocks
+from precise.vectorization import vectorize_raw, sliding_windows, StreamingVectorizer
 
 
 @attr.s()
@@ -86,49 +101,104 @@ class SimulateScript(BaseScript):
     def __init__(self, args):
         super().__init__(args)
         inject_params(self.args.model)
-        self.runner = Listener.find_runner(self.args.model)(self.args.model)
+        self._runner = None
         self.audio_buffer = np.zeros(pr.buffer_samples, dtype=float)
 
+    @property
+    def runner(self) -> Runner:
+        """Created on first use so worker processes don't inherit a TensorFlow session"""
+        if self._runner is None:
+            self._runner = Listener.find_runner(self.args.model)(self.args.model)
+        return self._runner
+
     def evaluate(self, audio: np.ndarray) -> np.ndarray:
         print('MFCCs...')
         mfccs = vectorize_raw(audio)
-        print('Splitting...')
-        mfcc_hops = self.args.chunk_size // pr.hop_samples
-        inputs = np.array([
-            mfccs[i - pr.n_features:i] for i in range(pr.n_features, len(mfccs), mfcc_hops)
-        ])
-        del mfccs
         print('Predicting...')
-        predictions = self.runner.predict(inputs)
-        del inputs
-        return predictions
+        inputs = sliding_windows(mfccs, pr.n_features, self.args.chunk_size // pr.hop_samples)
+        return predict_in_batches(self.runner.predict, inputs, self.args.batch_size)
+
+    def evaluate_stream(self, filename: str) -> Iterator[Tuple[np.ndarray, int]]:
+        """
+        Evaluates a wav file one block at a time, producing the same
+        predictions as evaluate() with constant memory
+        Returns:
+            Iterator of (predictions, number of audio samples) for each block
+        """
+        vectorizer = StreamingVectorizer(pr)
+        mfcc_hops = self.args.chunk_size // pr.hop_samples
+        features = np.empty((0, vectorizer.num_coeffs))
+        features_start = 0  # Frame index of features[0]
+        next_window = pr.n_features  # Frame index that the next window ends at
+
+        for audio in read_audio_blocks(filename, self.args.block_size):
+            new_features = vectorizer.vectorize_new(audio)
+            features = np.concatenate([features, new_features])
+            inputs = sliding_windows(features[next_window - pr.n_features - features_start:],
+                                     pr.n_features, mfcc_hops)
+            predictions = predict_in_batches(self.runner.predict, inputs, self.args.batch_size)
+            next_window += len(inputs) * mfcc_hops
+            keep_from = next_window - pr.n_features - features_start
+            features_start += keep_from
+            features = features[keep_from:].copy()
+            yield predictions, len(audio)
+
+    def simulate_file(self, filename: str) -> Optional[Metric]:
+        if self.args.streaming:
+            blocks = self.evaluate_stream(filename)
+        else:
+            audio = load_audio(filename)
+            blocks = [(self.evaluate(audio), len(audio))] if audio.size else []
+
+        detector = TriggerDetector(self.args.chunk_size, trigger_level=0, sensitivity=self.args.threshold)
+        metric = Metric(chunk_size=self.args.chunk_size)
+        num_samples = 0
+        for predictions, block_samples in blocks:
+            num_samples += block_samples
+            metric.activated_chunks += int((predictions > detector.sensitivity).sum())
+            metric.activations += sum(detector.update(i) for i in predictions)
+            metric.activation_sum += float(predictions.sum())
+        metric.seconds = num_samples / pr.sample_rate
+        return metric if num_samples else None
 
     def run(self):
+        filenames = glob(join(self.args.folder, '*.wav'))
+        if self.args.jobs > 1:
+            pool = get_context('spawn').Pool(self.args.jobs, init_worker, (self.args,))
+            metrics = pool.imap(simulate_file, filenames)
+        else:
+            pool = None
+            metrics = map(self.simulate_file, filenames)
+
         total = Metric(chunk_size=self.args.chunk_size)
-        for i in glob(join(self.args.folder, '*.wav')):
-            audio = load_audio(i)
-            if audio.size == 0:
-                continue
-
-            predictions = self.evaluate(audio)
-            detector = TriggerDetector(self.args.chunk_size, trigger_level=0, sensitivity=self.args.threshold)
-
-            metric = Metric(
-                chunk_size=self.args.chunk_size,
-                seconds=len(audio) / pr.sample_rate,
-                activated_chunks=(predictions > detector.sensitivity).sum(),
-                activations=sum(detector.update(i) for i in predictions),
-                activation_sum=predictions.sum()
-            )
-            total.add(metric)
-            print()
-            print(metric.info_string(basename(i)))
-            del audio
+        try:
+            for filename, metric in zip(filenames, metrics):
+                if metric is None:
+                    continue
+                total.add(metric)
+                print()
+                print(metric.info_string(basename(filename)))
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
         print()
         print()
         print(total.info_string('Total'))
 
 
+worker_script = None  # type: SimulateScript
+
+
+def init_worker(args):
+    global worker_script
+    worker_script = SimulateScript(args)
+
+
+def simulate_file(filename: str) -> Optional[Metric]:
+    return worker_script.simulate_file(filename)
+
+
 main = SimulateScript.run_main
 
 if __name__ == '__main__':
@@ -27,8 +27,18 @@ Test a model against a dataset
 :-t --threshold float 0.5
     Network output required to be considered an activation
 
+:-q --quantized
+    Also test the network with int8 weights and activations,
+    calibrated on the split that isn't tested, and show the
+    difference in accuracy from the float network
+
+:-c --calibration-folder str -
+    Data folder whose test set calibrates the int8 network
+    instead of the split that isn't tested
+
 ...
 """
+import numpy as np
 from prettyparse import Usage
 
 from precise.network_runner import Listener
@@ -36,6 +46,7 @@ from precise.params import inject_params
 from precise.scripts.base_script import BaseScript
 from precise.stats import Stats
 from precise.train_data import TrainData
+from precise.util import predict_in_batches
 
 
 class TestScript(BaseScript):
@@ -44,12 +55,12 @@ class TestScript(BaseScript):
     def run(self):
         args = self.args
         inject_params(args.model)
-        data = TrainData.from_both(args.tags_file, args.tags_folder, args.folder)
-        train, test = data.load(args.use_train, not args.use_train, shuffle=False)
+        data = TrainData.from_both(args.tags_file, args.tags_folder, args.folder, args.index_file)
+        train, test = data.load(args.use_train, not args.use_train, shuffle=False, jobs=args.jobs)
         inputs, targets = train if args.use_train else test
 
         filenames = sum(data.train_files if args.use_train else data.test_files, [])
-        predictions = Listener.find_runner(args.model)(args.model).predict(inputs)
+        predictions = predict_in_batches(Listener.find_runner(args.model)(args.model).predict, inputs)
         stats = Stats(predictions, targets, filenames)
 
         print('Data:', data)
@@ -67,6 +78,36 @@ class TestScript(BaseScript):
         print()
         print(stats.summary_str(args.threshold))
 
+        if args.quantized:
+            self.test_quantized(self.calibration_inputs(data), inputs, stats)
+
+    def calibration_inputs(self, data: TrainData) -> np.ndarray:
+        """Inputs of the split that isn't tested, or of the test set of the calibration folder"""
+        args = self.args
+        if args.calibration_folder:
+            data = TrainData.from_folder(args.calibration_folder)
+            return data.load(False, True, shuffle=False, jobs=args.jobs)[1][0]
+        train, test = data.load(not args.use_train, args.use_train, shuffle=False, jobs=args.jobs)
+        return (test if args.use_train else train)[0]
+
+    def test_quantized(self, calibration_inputs: np.ndarray, inputs: np.ndarray, stats: Stats):
+        """Compares the float network to an int8 version calibrated on separate inputs"""
+        from precise.numpy_model import NumpyModel
+        from precise.quantization import QuantizedModel
+
+        print('Calibrating with', len(calibration_inputs), 'samples...')
+        model = QuantizedModel.calibrate(NumpyModel.from_file(self.args.model), calibration_inputs)
+        q_stats = Stats(predict_in_batches(model.predict, inputs), stats.targets, stats.filenames)
+        threshold = self.args.threshold
+        print('=== Int8 Quantized ===')
+        print(q_stats.summary_str(threshold))
+        print('{:+.2%} accuracy'.format(q_stats.accuracy(threshold) - stats.accuracy(threshold)))
+        print('{:+.2%} false positives'.format(q_stats.false_positives(threshold) - stats.false_positives(threshold)))
+        print('{:+.2%} false negatives'.format(q_stats.false_negatives(threshold) - stats.false_negatives(threshold)))
+        print('{:.4f} mean absolute output difference'.format(
+            float(np.abs(q_stats.outputs - stats.outputs).mean()) if len(stats) else 0.0
+        ))
+
 
 main = TestScript.run_main
 
@@ -126,9 +126,9 @@ class TrainScript(BaseScript):
 
     @staticmethod
     def load_data(args: Any) -> Tuple[tuple, tuple]:
-        data = TrainData.from_both(args.tags_file, args.tags_folder, args.folder)
+        data = TrainData.from_both(args.tags_file, args.tags_folder, args.folder, args.index_file)
         print('Data:', data)
-        train, test = data.load(True, not args.no_validation)
+        train, test = data.load(True, not args.no_validation, jobs=args.jobs)
 
         print('Inputs shape:', train[0].shape)
         print('Outputs shape:', train[1].shape)
@@ -32,6 +32,14 @@ marking false activations and retraining
 :-th --threshold float 0.5
     Network output to be considered activated
 
+:-bp --batch-predict
+    Vectorize and predict blocks of chunks at once instead
+    of one chunk at a time, predicting the rest of a block
+    again whenever the model is retrained
+
+:-pb --predict-batch-size int 2048
+    Number of chunks in each block with --batch-predict
+
 ...
 """
 import numpy as np
@@ -41,12 +49,14 @@ from prettyparse import Usage
 from random import random
 from typing import *
 
+from precise.dataset_index import DatasetIndex
 from precise.model import create_model, ModelParams
 from precise.network_runner import Listener, KerasRunner
 from precise.params import pr
 from precise.scripts.train import TrainScript
 from precise.train_data import TrainData
 from precise.util import load_audio, save_audio, glob_all, chunk_audio
+from precise.vectorization import add_deltas, stream_windows
 
 
 def load_trained_fns(model_name: str) -> list:
@@ -90,13 +100,15 @@ class TrainIncrementalScript(TrainScript):
 
     @staticmethod
     def load_data(args: Any):
-        data = TrainData.from_tags(args.tags_file, args.tags_folder)
-        return data.load(True, not args.no_validation)
+        index = DatasetIndex(args.index_file) if args.index_file else None
+        data = TrainData.from_tags(args.tags_file, args.tags_folder, index)
+        return data.load(True, not args.no_validation, jobs=args.jobs)
 
     def retrain(self):
         """Train for a session, pulling in any new data from the filesystem"""
-        folder = TrainData.from_folder(self.args.folder)
-        train_data, test_data = folder.load(True, not self.args.no_validation)
+        index = DatasetIndex(self.args.index_file) if self.args.index_file else None
+        folder = TrainData.from_folder(self.args.folder, index)
+        train_data, test_data = folder.load(True, not self.args.no_validation, jobs=self.args.jobs)
 
         train_data = TrainData.merge(train_data, self.sampled_data)
         test_data = TrainData.merge(test_data, self.test)
@@ -110,9 +122,24 @@ class TrainIncrementalScript(TrainScript):
         finally:
             self.listener.runner.model.save(self.args.model)
 
+    def save_activation(self, fn: str, chunk_id: int, save_test: bool):
+        self.samples_since_train += 1
+        name = splitext(basename(fn))[0] + '-' + str(chunk_id) + '.wav'
+        name = join(self.args.folder, 'test' if save_test else '', 'not-wake-word',
+                    'generated', name)
+        save_audio(name, self.audio_buffer)
+        print()
+        print('Saved to:', name)
+
+    def should_retrain(self, save_test: bool) -> bool:
+        return not save_test and self.samples_since_train >= self.args.delay_samples and \
+            self.args.epochs > 0
+
     def train_on_audio(self, fn: str):
         """Run through a single audio file"""
         save_test = random() > 0.8
+        if self.args.batch_predict:
+            return self.batch_train_on_audio(fn, save_test)
         audio = load_audio(fn)
         num_chunks = len(audio) // self.args.chunk_size
 
@@ -123,19 +150,59 @@ class TrainIncrementalScript(TrainScript):
             self.audio_buffer = np.concatenate((self.audio_buffer[len(chunk):], chunk))
             conf = self.listener.update(chunk)
             if conf > self.args.threshold:
-                self.samples_since_train += 1
-                name = splitext(basename(fn))[0] + '-' + str(i) + '.wav'
-                name = join(self.args.folder, 'test' if save_test else '', 'not-wake-word',
-                            'generated', name)
-                save_audio(name, self.audio_buffer)
-                print()
-                print('Saved to:', name)
-
-            if not save_test and self.samples_since_train >= self.args.delay_samples and \
-                    self.args.epochs > 0:
+                self.save_activation(fn, i, save_test)
+
+            if self.should_retrain(save_test):
                 self.samples_since_train = 0
                 self.retrain()
 
+    def batch_train_on_audio(self, fn: str, save_test: bool):
+        """
+        Same as train_on_audio, but vectorizes blocks of --predict-batch-size
+        chunks at once and predicts the windows of a block in one call to the
+        network. After retraining, the rest of the block is predicted again
+        """
+        audio = load_audio(fn)
+        chunk_size, batch_size = self.args.chunk_size, self.args.predict_batch_size
+        ends = np.arange(chunk_size, len(audio), chunk_size)
+        if len(ends) == 0:
+            return
+        listener = self.listener
+        listener.clear()
+        start_buffer = self.audio_buffer
+
+        def buffer_at(end: int) -> np.ndarray:
+            """Audio buffer after the chunk ending at the given sample of the file"""
+            return np.concatenate([start_buffer[end:], audio[max(0, end - len(start_buffer)):end]])
+
+        previous, first_frame = None, 0
+        for block_start in range(0, len(ends), batch_size):
+            block_ends = ends[block_start:block_start + batch_size]
+            features = listener.vectorizer.vectorize_new(audio[block_ends[0] - chunk_size:block_ends[-1]])
+            windows, window_ids = stream_windows(features, block_ends, listener.pr, previous, first_frame)
+            previous, first_frame = windows[len(features)], first_frame + len(features)
+
+            start = 0
+            while start < len(block_ends):
+                print('\r' + str((block_start + start) * 100. / len(ends)) + '%', end='', flush=True)
+                inputs = windows[window_ids[start:]]
+                if listener.pr.use_delta:
+                    inputs = add_deltas(inputs)
+                confs = listener.threshold_decoder.decode_batch(listener.runner.predict(inputs).ravel())
+                next_start = len(block_ends)
+                for i in range(start, len(block_ends)):
+                    if confs[i - start] > self.args.threshold:
+                        self.audio_buffer = buffer_at(block_ends[i])
+                        self.save_activation(fn, block_start + i, save_test)
+
+                    if self.should_retrain(save_test):
+                        self.samples_since_train = 0
+                        self.retrain()
+                        next_start = i + 1
+                        break
+                start = next_start
+        self.audio_buffer = buffer_at(ends[-1])
+
     def run(self):
         """
         Begin reading through audio files, saving false
@@ -15,9 +15,11 @@
 Code for converting network output to confidence level
 """
 import numpy as np
+from functools import lru_cache
 from typing import Tuple
 
 from precise.functions import asigmoid, sigmoid, pdf
+from precise.params import ListenerParams, pr
 
 
 class ThresholdDecoder:
@@ -36,12 +38,18 @@ class ThresholdDecoder:
     of 80% means that the network output is greater than roughly 80% of the dataset
     """
     def __init__(self, mu_stds: Tuple[Tuple[float, float]], center=0.5, resolution=200, min_z=-4, max_z=4):
+        mu_stds = tuple((float(mu), float(std)) for mu, std in mu_stds)
         self.min_out = int(min(mu + min_z * std for mu, std in mu_stds))
         self.max_out = int(max(mu + max_z * std for mu, std in mu_stds))
         self.out_range = self.max_out - self.min_out
-        self.cd = np.cumsum(self._calc_pd(mu_stds, resolution))
+        self.cd = calc_cumulative_distribution(mu_stds, resolution, self.min_out, self.max_out)
         self.center = center
 
+    @classmethod
+    def from_params(cls, params: ListenerParams = pr) -> 'ThresholdDecoder':
+        """Creates the decoder described by the threshold config of the listener params"""
+        return cls(params.threshold_config, params.threshold_center)
+
     def decode(self, raw_output: float) -> float:
         if raw_output == 1.0 or raw_output == 0.0:
             return raw_output
@@ -56,6 +64,23 @@ class ThresholdDecoder:
         else:
             return 0.5 + 0.5 * (cp - self.center) / (1 - self.center)
 
+    def decode_batch(self, raw_outputs: np.ndarray) -> np.ndarray:
+        """Same as decode() for every element of an array of network outputs"""
+        raw_outputs = np.asarray(raw_outputs, dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if self.out_range == 0:
+                cp = (raw_outputs > self.min_out).astype(float)
+            else:
+                ratio = (-np.log(1 / raw_outputs - 1) - self.min_out) / self.out_range
+                ratio = np.clip(ratio, 0.0, 1.0)
+                cp = self.cd[(ratio * (len(self.cd) - 1) + 0.5).astype(int)]
+            confs = np.where(
+                cp < self.center,
+                0.5 * cp / self.center,
+                0.5 + 0.5 * (cp - self.center) / (1 - self.center)
+            )
+        return np.where((raw_outputs == 1.0) | (raw_outputs == 0.0), raw_outputs, confs)
+
     def encode(self, threshold: float) -> float:
         threshold = 0.5 * threshold / self.center
         if threshold < 0.5:
@@ -65,6 +90,27 @@ class ThresholdDecoder:
         ratio = np.searchsorted(self.cd, cp) / len(self.cd)
         return sigmoid(self.min_out + self.out_range * ratio)
 
-    def _calc_pd(self, mu_stds, resolution):
-        points = np.linspace(self.min_out, self.max_out, resolution * self.out_range)
-        return np.sum([pdf(points, mu, std) for mu, std in mu_stds], axis=0) / (resolution * len(mu_stds))
+    def encode_batch(self, thresholds: np.ndarray) -> np.ndarray:
+        """Same as encode() for every element of an array of thresholds"""
+        thresholds = 0.5 * np.asarray(thresholds, dtype=float) / self.center
+        cp = np.where(
+            thresholds < 0.5,
+            thresholds * self.center * 2,
+            (thresholds - 0.5) * 2 * (1 - self.center) + self.center
+        )
+        ratio = np.searchsorted(self.cd, cp) / len(self.cd)
+        return 1 / (1 + np.exp(-(self.min_out + self.out_range * ratio)))
+
+
+@lru_cache()
+def calc_cumulative_distribution(mu_stds: Tuple[Tuple[float, float]], resolution: int,
+                                 min_out: int, max_out: int) -> np.ndarray:
+    """
+    Cumulative distribution of the network output logits, shared
+    between all decoders with the same threshold config
+    """
+    points = np.linspace(min_out, max_out, resolution * (max_out - min_out))
+    pd = np.sum([pdf(points, mu, std) for mu, std in mu_stds], axis=0) / (resolution * len(mu_stds))
+    cd = np.cumsum(pd)
+    cd.flags.writeable = False
+    return cd
@@ -18,16 +18,24 @@ Used for training and generating statistics for a dataset
 import json
 import numpy as np
 from glob import glob
+from functools import partial
 from hashlib import md5
+from multiprocessing import Pool, cpu_count
 from os.path import join, isfile
 from prettyparse import Usage
-from pyache import Pyache
 from typing import *
 
+from precise.dataset_index import DatasetIndex, LABELS
+from precise.params import ListenerParams, pr
 from precise.util import find_wavs, load_audio
+from precise.vector_store import VectorStore, VectorRows
 from precise.vectorization import vectorize_delta, vectorize
 
 
+def vectorize_file(vectorizer: Callable, params: ListenerParams, filename: str) -> np.ndarray:
+    return vectorizer(load_audio(filename), params)
+
+
 class TrainData:
     """Class to handle loading of wave data from categorized folders and tagged text files"""
     usage = Usage('''
@@ -43,6 +51,14 @@ class TrainData:
             <file_id> TAB (wake-word|not-wake-word) and
             {folder}/<file_id>.wav exists
 
+        :-j --jobs int 1
+            Number of processes used to vectorize audio
+            files that aren't cached yet. 0 uses all cores
+
+        :-ix --index-file str -
+            Json file to keep an index of the dataset files in
+            so only folders that changed are listed again
+
     ''', tags_folder=lambda args: args.tags_folder.format(folder=args.folder))
 
     def __init__(self, train_files: Tuple[List[str], List[str]],
@@ -50,7 +66,7 @@ class TrainData:
         self.train_files, self.test_files = train_files, test_files
 
     @classmethod
-    def from_folder(cls, folder: str) -> 'TrainData':
+    def from_folder(cls, folder: str, index: DatasetIndex = None) -> 'TrainData':
         """
         Load a set of data from a structured folder in the following format:
         {prefix}/
@@ -63,11 +79,17 @@ class TrainData:
                     *.wav
                 not-wake-word/
                     *.wav
+
+        If an index is given, only folders that changed since it was saved are listed
         """
-        return cls(find_wavs(folder), find_wavs(join(folder, 'test')))
+        if not index:
+            return cls(find_wavs(folder), find_wavs(join(folder, 'test')))
+        data = cls(index.find_wavs(folder), index.find_wavs(join(folder, 'test'), 'test'))
+        index.save()
+        return data
 
     @classmethod
-    def from_tags(cls, tags_file: str, tags_folder: str) -> 'TrainData':
+    def from_tags(cls, tags_file: str, tags_folder: str, index: DatasetIndex = None) -> 'TrainData':
         """
         Load a set of data from a text file with tags in the following format:
             <file_id>  (tab)  <tag>
@@ -76,6 +98,9 @@ class TrainData:
             file_id: identifier of file such that the following
                      file exists: {tags_folder}/{data_id}.wav
             tag: "wake-word" or "not-wake-word"
+
+        If an index is given, files are found in listings of their
+        folders, which are only listed again if they changed
         """
         if not tags_file:
             num_ignored_wavs = len(glob(join(tags_folder, '*.wav')))
@@ -105,46 +130,59 @@ class TrainData:
                 file, tag = line.split('\t')
                 tags_files[tag.strip()].append(join(tags_folder, file.strip() + '.wav'))
 
+        exists = index.exists if index else isfile
+        num_groups = len(train_groups)
         train_files, test_files = ([], []), ([], [])
         for label, rows in enumerate([tags_files['wake-word'], tags_files['not-wake-word']]):
             for fn in rows:
-                if not isfile(fn):
+                if not exists(fn):
                     print('Missing file:', fn)
                     continue
                 if fn not in train_groups:
-                    train_groups[fn] = (
+                    train_groups[fn] = (index and index.get_split(fn)) or (
                         'test' if md5(fn.encode('utf8')).hexdigest() > 'c' * 32
                         else 'train'
                     )
+                if index:
+                    index.set_label(fn, LABELS[label], train_groups[fn])
                 {
                     'train': train_files,
                     'test': test_files
                 }[train_groups[fn]][label].append(fn)
 
-        with open(train_group_file, 'w') as f:
-            json.dump(train_groups, f)
+        if len(train_groups) != num_groups:
+            with open(train_group_file, 'w') as f:
+                json.dump(train_groups, f)
+        if index:
+            index.save()
 
         return cls(train_files, test_files)
 
     @classmethod
-    def from_both(cls, tags_file: str, tags_folder: str, folder: str) -> 'TrainData':
-        """Load data from both a database and a structured folder"""
-        return cls.from_tags(tags_file, tags_folder) + cls.from_folder(folder)
+    def from_both(cls, tags_file: str, tags_folder: str, folder: str, index_file: str = '') -> 'TrainData':
+        """Load data from both a database and a structured folder, using an index file if given"""
+        index = DatasetIndex(index_file) if index_file else None
+        return cls.from_tags(tags_file, tags_folder, index) + cls.from_folder(folder, index)
 
-    def load(self, train=True, test=True, shuffle=True) -> tuple:
+    def load(self, train=True, test=True, shuffle=True, jobs=1, params: ListenerParams = pr) -> tuple:
         """
         Load the vectorized representations of the stored data files
+        Inputs are views of a memory mapped cache so the dataset never
+        needs to fit in RAM. They are kept in dataset order and should
+        be shuffled by index per batch, which Keras does in fit()
         Args:
             train: Whether to load train data
             test: Whether to load test data
+            shuffle: Unused, kept for compatibility
+            jobs: Number of processes to vectorize uncached files with. 0 uses all cores
+            params: Listener params to vectorize with, defaults to the global params
         """
-        return self.__load(self.__load_files, train, test, shuffle=shuffle)
+        return self.__load(self.__load_files, train, test, shuffle=shuffle, jobs=jobs, params=params)
 
     def load_inhibit(self, train=True, test=True) -> tuple:
         """Generate data with inhibitory inputs created from wake word samples"""
 
         def loader(kws: list, nkws: list):
-            from precise.params import pr
             inputs = np.empty((0, pr.n_features, pr.feature_size))
             outputs = np.zeros((len(kws), 1))
             for f in kws:
@@ -159,8 +197,12 @@ class TrainData:
 
     @staticmethod
     def merge(data_a: tuple, data_b: tuple) -> tuple:
-        """Combine two TrainData objects"""
-        return np.concatenate((data_a[0], data_b[0])), np.concatenate((data_a[1], data_b[1]))
+        """Combine two sets of loaded data, without reading inputs that are still on disk"""
+        if any(isinstance(i, (np.memmap, VectorRows)) for i in (data_a[0], data_b[0])):
+            inputs = VectorRows.concatenate([data_a[0], data_b[0]])
+        else:
+            inputs = np.concatenate((data_a[0], data_b[0]))
+        return inputs, np.concatenate((data_a[1], data_b[1]))
 
     def __repr__(self) -> str:
         string = '<TrainData wake_words={kws} not_wake_words={nkws}' \
@@ -186,43 +228,44 @@ class TrainData:
         ])
 
     @staticmethod
-    def __load_files(kw_files: list, nkw_files: list, vectorizer: Callable = None, shuffle=True) -> tuple:
-        from precise.params import pr
-
-        input_parts = []
-        output_parts = []
-
-        vectorizer = vectorizer or (vectorize_delta if pr.use_delta else vectorize)
-        cache = Pyache('.cache', lambda x: vectorizer(load_audio(x)), pr.vectorization_md5_hash())
-
-        def add(filenames, output):
-            def on_loop():
-                on_loop.i += 1
-                print('\r{0:.2%}  '.format(on_loop.i / len(filenames)), end='', flush=True)
-
-            on_loop.i = 0
-
-            new_inputs = cache.load(filenames, on_loop=on_loop)
-            new_outputs = np.array([[output] for _ in range(len(new_inputs))])
-            if new_inputs.size == 0:
-                new_inputs = np.empty((0, pr.n_features, pr.feature_size))
-            if new_outputs.size == 0:
-                new_outputs = np.empty((0, 1))
-            input_parts.append(new_inputs)
-            output_parts.append(new_outputs)
-            print('\r       \r', end='', flush=True)
-
-        print('Loading wake-word...')
-        add(kw_files, 1.0)
-
-        print('Loading not-wake-word...')
-        add(nkw_files, 0.0)
+    def __load_files(kw_files: list, nkw_files: list, vectorizer: Callable = None,
+                     shuffle=True, jobs=1, params: ListenerParams = pr) -> tuple:
+        vectorizer = vectorizer or (vectorize_delta if params.use_delta else vectorize)
+        store = VectorStore(
+            join('.cache', '{}.{}'.format(vectorizer.__name__, params.vectorization_md5_hash())),
+            (params.n_features, params.feature_size)
+        )
 
-        from precise.params import pr
-        inputs = np.concatenate(input_parts) if input_parts else np.empty((0, pr.n_features, pr.feature_size))
-        outputs = np.concatenate(output_parts) if output_parts else np.empty((0, 1))
+        def add(filenames, write_size=1024):
+            filenames = [i for i in dict.fromkeys(filenames) if i not in store]
+            if pool:
+                chunksize = max(1, min(64, len(filenames) // (4 * jobs)))
+                results = pool.imap(partial(vectorize_file, vectorizer, params), filenames, chunksize)
+            else:
+                results = map(partial(vectorize_file, vectorizer, params), filenames)
+            for start in range(0, len(filenames), write_size):
+                chunk = filenames[start:start + write_size]
+                vectors = np.empty((len(chunk), params.n_features, params.feature_size), dtype=store.dtype)
+                for i in range(len(chunk)):
+                    vectors[i] = next(results)
+                    print('\r{0:.2%}  '.format((start + i + 1) / len(filenames)), end='', flush=True)
+                store.add(chunk, vectors)
+            print('\r       \r', end='', flush=True)
 
-        shuffle_ids = np.arange(len(inputs))
-        if shuffle:
-            np.random.shuffle(shuffle_ids)
-        return inputs[shuffle_ids], outputs[shuffle_ids]
+        num_uncached = sum(i not in store for i in kw_files + nkw_files)
+        jobs = min(jobs or cpu_count(), num_uncached)
+        pool = Pool(jobs) if jobs > 1 else None
+        try:
+            print('Loading wake-word...')
+            add(kw_files)
+
+            print('Loading not-wake-word...')
+            add(nkw_files)
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
+
+        inputs = store.load(kw_files + nkw_files)
+        outputs = np.concatenate([np.ones((len(kw_files), 1)), np.zeros((len(nkw_files), 1))])
+        return inputs, outputs
@@ -17,11 +17,19 @@ Miscellaneous utility functions for things like audio loading
 import hashlib
 import numpy as np
 from os.path import join, dirname, abspath
+from struct import Struct
 from typing import *
 
 from precise.params import pr
 
 
+RIFF_HEADER = Struct('<4sI4s')
+CHUNK_HEADER = Struct('<4sI')
+FMT_CHUNK = Struct('<HHIIHH')
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
 class InvalidAudio(ValueError):
     """Thrown the audio isn't in the expected format"""
     pass
@@ -32,24 +40,129 @@ def chunk_audio(audio: np.ndarray, chunk_size: int) -> Generator[np.ndarray, Non
         yield audio[i - chunk_size:i]
 
 
-def buffer_to_audio(buffer: bytes) -> np.ndarray:
-    """Convert a raw mono audio byte string to numpy array of floats"""
-    return np.fromstring(buffer, dtype='<i2').astype(np.float32, order='C') / 32768.0
+def predict_in_batches(predict: Callable, inputs: np.ndarray, batch_size: int = 2048) -> np.ndarray:
+    """Runs predict on one slice of inputs at a time so only one batch is ever copied"""
+    outputs = [
+        predict(np.ascontiguousarray(inputs[i:i + batch_size]))
+        for i in range(0, len(inputs), batch_size)
+    ]
+    return np.concatenate(outputs) if outputs else np.empty((0, 1))
+
+
+def buffer_to_audio(buffer: bytes, out: np.ndarray = None) -> np.ndarray:
+    """
+    Convert a raw mono audio byte string to numpy array of floats
+    Args:
+        buffer: Raw int16 audio
+        out: Preallocated float array to convert into, if it is large enough
+    Returns:
+        The converted audio, a view of out if it was used
+    """
+    samples = np.frombuffer(buffer, dtype='<i2')
+    if out is None or len(out) < len(samples):
+        out = np.empty(len(samples), dtype=np.float32)
+    audio = out[:len(samples)]
+    np.multiply(samples, 1.0 / 32768.0, out=audio)
+    return audio
 
 
 def audio_to_buffer(audio: np.ndarray) -> bytes:
     """Convert a numpy array of floats to raw mono audio"""
-    return (audio * 32768).astype('<i2').tostring()
+    return (audio * 32768).astype('<i2').tobytes()
 
 
-def load_audio(file: Any) -> np.ndarray:
+def load_audio(file: Any, start: int = None, stop: int = None) -> np.ndarray:
     """
     Loads properly formatted audio from a file to a numpy array
     Args:
         file: Audio filename or file object
+        start: First sample to load, like a slice
+        stop: Sample to stop loading at, like a slice
     Returns:
         samples: Sample rate and audio samples from 0..1
     """
+    return int16_to_audio(load_audio_int16(file, start, stop))
+
+
+def load_audio_int16(file: Any, start: int = None, stop: int = None) -> np.ndarray:
+    """Loads the raw int16 samples of properly formatted audio, optionally only a range of them"""
+    if isinstance(file, str):
+        with open(file, 'rb', buffering=0) as f:  # Lets readinto copy straight into the array
+            samples = read_wav_int16(f, start, stop)
+    else:
+        samples = read_wav_int16(file, start, stop)
+    if samples is None:
+        samples = read_wavio_int16(file)[start:stop]
+    return samples
+
+
+def find_wav_data(f: BinaryIO) -> Optional[Tuple[int, int]]:
+    """
+    Parses the RIFF header of a wav
+    Returns:
+        File offset and size in bytes of the data chunk if it
+        holds mono int16 PCM audio at the configured sample rate
+    """
+    header = f.read(RIFF_HEADER.size)
+    if len(header) < RIFF_HEADER.size:
+        return None
+    riff, _, wave = RIFF_HEADER.unpack(header)
+    if riff != b'RIFF' or wave != b'WAVE':
+        return None
+    fmt = None
+    while True:
+        header = f.read(CHUNK_HEADER.size)
+        if len(header) < CHUNK_HEADER.size:
+            return None
+        chunk_id, size = CHUNK_HEADER.unpack(header)
+        if chunk_id == b'fmt ':
+            data = f.read(size + size % 2)
+            if len(data) < FMT_CHUNK.size:
+                return None
+            fmt = FMT_CHUNK.unpack_from(data)
+            if fmt[0] == WAVE_FORMAT_EXTENSIBLE and size >= 26:
+                fmt = (int.from_bytes(data[24:26], 'little'),) + fmt[1:]  # Sub format GUID
+        elif chunk_id == b'data':
+            if fmt is None:
+                return None
+            audio_format, channels, rate, _, _, bits = fmt
+            if (audio_format, channels, rate, bits) != (WAVE_FORMAT_PCM, 1, pr.sample_rate, 16):
+                return None
+            return f.tell(), size
+        else:
+            f.seek(size + size % 2, 1)
+
+
+def read_wav_int16(f: BinaryIO, start: int = None, stop: int = None) -> Optional[np.ndarray]:
+    """
+    Reads a range of samples of a 16 kHz mono int16 wav straight into an int16 array,
+    only reading the header and the requested samples
+    Returns:
+        The samples, or None if the file has any other format and should be read with wavio
+    """
+    if not f.seekable():
+        return None
+    position = f.tell()
+    location = find_wav_data(f)
+    if location is None:
+        f.seek(position)
+        return None
+    offset, size = location
+    size = min(size, f.seek(0, 2) - offset)  # Allow truncated files and unset data sizes
+    samples = range(size // 2)[start:stop]
+    audio = np.empty(len(samples), dtype='<i2')
+    f.seek(offset + 2 * samples.start)
+    buffer, num_read = memoryview(audio).cast('B'), 0
+    while num_read < len(buffer):
+        chunk_read = f.readinto(buffer[num_read:])
+        if not chunk_read:
+            break
+        num_read += chunk_read
+    return audio[:num_read // 2].astype(np.int16, copy=False)
+
+
+def read_wavio_int16(file: Any) -> np.ndarray:
+    """Loads the int16 samples of any wav wavio can read"""
     import wavio
     import wave
     try:
@@ -60,9 +173,39 @@ def load_audio(file: Any) -> np.ndarray:
         raise InvalidAudio('Unsupported data type: ' + str(wav.data.dtype))
     if wav.rate != pr.sample_rate:
         raise InvalidAudio('Unsupported sample rate: ' + str(wav.rate))
+    return np.squeeze(wav.data)
+
+
+def int16_to_audio(samples: np.ndarray) -> np.ndarray:
+    """Converts int16 samples to floats the same way as load_audio"""
+    return np.divide(samples, np.float32(np.iinfo(np.int16).max), dtype=np.float32)
 
-    data = np.squeeze(wav.data)
-    return data.astype(np.float32) / float(np.iinfo(data.dtype).max)
+
+def read_audio_blocks(file: Any, block_size: int) -> Generator[np.ndarray, None, None]:
+    """
+    Reads properly formatted audio from a wav file in blocks
+    so that long files never need to fit in memory
+    Args:
+        file: Audio filename or file object
+        block_size: Number of samples per block
+    """
+    import wave
+    try:
+        wav = wave.open(file, 'rb')
+    except (EOFError, wave.Error):
+        return
+    with wav:
+        if wav.getsampwidth() != 2:
+            raise InvalidAudio('Unsupported sample width: ' + str(wav.getsampwidth()))
+        if wav.getnchannels() != 1:
+            raise InvalidAudio('Unsupported number of channels: ' + str(wav.getnchannels()))
+        if wav.getframerate() != pr.sample_rate:
+            raise InvalidAudio('Unsupported sample rate: ' + str(wav.getframerate()))
+        while True:
+            data = wav.readframes(block_size)
+            if not data:
+                break
+            yield np.frombuffer(data, dtype='<i2').astype(np.float32) / float(np.iinfo(np.int16).max)
 
 
 def save_audio(filename: str, audio: np.ndarray):
@@ -0,0 +1,181 @@
+# Copyright 2019 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+On disk storage of vectorized audio files
+"""
+import json
+import numpy as np
+import os
+import struct
+from os.path import join, isfile
+from typing import *
+
+HEADER_SIZE = 128
+
+
+class VectorStore:
+    """
+    Stores the vectors of many audio files in a single memory mapped
+    .npy file of shape (N, n_features, feature_size) along with an
+    index of filename -> row. Rows are only ever appended, so loading
+    the files in the order they were added returns a view of the file
+
+    Args:
+        folder: Folder to keep vectors.npy and index.json in
+        shape: Shape of the vectors of a single file
+        dtype: Data type to store vectors as (ie. float32 or float16)
+    """
+
+    def __init__(self, folder: str, shape: tuple, dtype=np.float32):
+        self.folder = folder
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.vectors_file = join(folder, 'vectors.npy')
+        self.index_file = join(folder, 'index.json')
+        self.index = {}  # type: Dict[str, int]
+        self._vectors = None
+
+        if isfile(self.index_file) and isfile(self.vectors_file):
+            try:
+                with open(self.index_file) as f:
+                    self.index = json.load(f)
+            except ValueError:
+                pass
+            if len(self.index) > (os.path.getsize(self.vectors_file) - HEADER_SIZE) // self.row_bytes:
+                self.index = {}
+
+    @property
+    def row_bytes(self) -> int:
+        return int(np.prod(self.shape)) * self.dtype.itemsize
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, filename: str) -> bool:
+        return filename in self.index
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """Read only memory map of all stored vectors"""
+        if self._vectors is None or len(self._vectors) != len(self):
+            if len(self) == 0:
+                return np.empty((0,) + self.shape, dtype=self.dtype)
+            self._vectors = np.memmap(self.vectors_file, self.dtype, 'r', HEADER_SIZE,
+                                      (len(self),) + self.shape)
+        return self._vectors
+
+    def add(self, filenames: List[str], vectors: np.ndarray):
+        """Appends the vectors of the given files to the store"""
+        if len(filenames) != len(vectors):
+            raise ValueError('Got {} filenames for {} vectors'.format(len(filenames), len(vectors)))
+        if len(filenames) == 0:
+            return
+        os.makedirs(self.folder, exist_ok=True)
+        num_rows = len(self)
+        with open(self.vectors_file, 'r+b' if isfile(self.vectors_file) else 'w+b') as f:
+            f.seek(HEADER_SIZE + num_rows * self.row_bytes)
+            f.write(np.ascontiguousarray(vectors, dtype=self.dtype).tobytes())
+            f.truncate()
+            for i, filename in enumerate(filenames):
+                self.index[filename] = num_rows + i
+            f.seek(0)
+            f.write(self._header(len(self)))
+
+        with open(self.index_file, 'w') as f:
+            json.dump(self.index, f)
+
+    def load(self, filenames: List[str]) -> Union[np.ndarray, 'VectorRows']:
+        """
+        Finds the vectors of the given files, which must all be stored
+        Returns:
+            A view of the memory map if the files are stored consecutively, otherwise
+            VectorRows that only read the rows of the memory map that are indexed
+        """
+        rows = np.fromiter((self.index[i] for i in filenames), dtype=np.int64, count=len(filenames))
+        if len(rows) == 0:
+            return np.empty((0,) + self.shape, dtype=self.dtype)
+        if np.array_equal(rows, np.arange(rows[0], rows[0] + len(rows))):
+            return self.vectors[rows[0]:rows[0] + len(rows)]
+        return VectorRows([self.vectors], np.zeros(len(rows), dtype=np.uint8), rows)
+
+    def _header(self, num_rows: int) -> bytes:
+        """Fixed size .npy header so the row count can be updated in place"""
+        header = "{'descr': %r, 'fortran_order': False, 'shape': %r, }" % (
+            np.lib.format.dtype_to_descr(self.dtype), (num_rows,) + self.shape
+        )
+        magic = b'\x93NUMPY\x01\x00'
+        header_len = HEADER_SIZE - len(magic) - 2
+        return magic + struct.pack('<H', header_len) + header.encode('latin1').ljust(header_len - 1) + b'\n'
+
+
+class VectorRows:
+    """
+    Array-like list of rows from one or more arrays, usually memory maps,
+    that only gathers the rows that are indexed. Supports len(), shape
+    and indexing by an int, slice or list of rows like Keras' HDF5Matrix,
+    so Keras can train on it batch by batch. np.asarray() reads every row
+
+    Args:
+        sources: Arrays to take rows from
+        source_ids: Index of the source of each row
+        rows: Index of each row in its source
+    """
+
+    def __init__(self, sources: List[np.ndarray], source_ids: np.ndarray, rows: np.ndarray):
+        self.sources = sources
+        self.source_ids = source_ids
+        self.rows = rows
+        self.dtype = np.result_type(*sources)
+        self.shape = (len(rows),) + sources[0].shape[1:]
+        self.ndim = len(self.shape)
+
+    @classmethod
+    def concatenate(cls, arrays: List[Union[np.ndarray, 'VectorRows']]) -> 'VectorRows':
+        """Joins the rows of several arrays without reading them"""
+        sources, source_ids, rows = [], [], []
+        for array in arrays:
+            if not isinstance(array, VectorRows):
+                array = cls([array], np.zeros(len(array), dtype=np.uint8), np.arange(len(array)))
+            source_ids.append(array.source_ids + len(sources))
+            sources.extend(array.sources)
+            rows.append(array.rows)
+        if len(sources) > np.iinfo(np.uint8).max:
+            raise ValueError('Too many arrays to concatenate')
+        return cls(sources, np.concatenate(source_ids).astype(np.uint8), np.concatenate(rows))
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            selected = self[key[0]]
+            return selected[(slice(None),) * (selected.ndim - self.ndim + 1) + key[1:]]
+        source_ids, rows = self.source_ids[key], self.rows[key]
+        if np.ndim(rows) == 0:
+            return self.sources[source_ids][rows]
+        if len(rows) and np.all(source_ids == source_ids[0]) and np.all(np.diff(rows) == 1):
+            return self.sources[source_ids[0]][rows[0]:rows[-1] + 1]  # Consecutive rows are a view
+        selected = np.empty((len(rows),) + self.shape[1:], dtype=self.dtype)
+        for i, source in enumerate(self.sources):
+            matches = source_ids == i
+            if matches.any():
+                selected[matches] = source[rows[matches]]
+        return selected
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        return np.asarray(self[:], dtype=dtype)
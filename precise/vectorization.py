@@ -17,11 +17,12 @@ Functions that convert audio to machine readable vectors
 import hashlib
 import numpy as np
 import os
+from functools import lru_cache
 from typing import *
 
-from precise.params import pr, Vectorizer
+from precise.params import pr, Vectorizer, ListenerParams
 from precise.util import load_audio, InvalidAudio
-from sonopy import mfcc_spec, mel_spec
+from sonopy import mfcc_spec, mel_spec, filterbanks
 
 inhibit_t = 0.4
 inhibit_dist_t = 1.0
@@ -29,78 +30,260 @@ inhibit_hop_t = 0.1
 
 # Functions that convert audio frames -> vectors
 vectorizers = {
-    Vectorizer.mels: lambda x: mel_spec(
-        x, pr.sample_rate, (pr.window_samples, pr.hop_samples),
-        num_filt=pr.n_filt, fft_size=pr.n_fft
+    Vectorizer.mels: lambda x, p: mel_spec(
+        x, p.sample_rate, (p.window_samples, p.hop_samples),
+        num_filt=p.n_filt, fft_size=p.n_fft
     ),
-    Vectorizer.mfccs: lambda x: mfcc_spec(
-        x, pr.sample_rate, (pr.window_samples, pr.hop_samples),
-        num_filt=pr.n_filt, fft_size=pr.n_fft, num_coeffs=pr.n_mfcc
+    Vectorizer.mfccs: lambda x, p: mfcc_spec(
+        x, p.sample_rate, (p.window_samples, p.hop_samples),
+        num_filt=p.n_filt, fft_size=p.n_fft, num_coeffs=p.n_mfcc
     ),
-    Vectorizer.speechpy_mfccs: lambda x: __import__('speechpy').feature.mfcc(
-        x, pr.sample_rate, pr.window_t, pr.hop_t, pr.n_mfcc, pr.n_filt, pr.n_fft
+    Vectorizer.speechpy_mfccs: lambda x, p: __import__('speechpy').feature.mfcc(
+        x, p.sample_rate, p.window_t, p.hop_t, p.n_mfcc, p.n_filt, p.n_fft
     )
 }
 
 
-def vectorize_raw(audio: np.ndarray) -> np.ndarray:
+def vectorize_raw(audio: np.ndarray, params: ListenerParams = pr) -> np.ndarray:
     """Turns audio into feature vectors, without clipping for length"""
     if len(audio) == 0:
         raise InvalidAudio('Cannot vectorize empty audio!')
-    return vectorizers[pr.vectorizer](audio)
+    return vectorizers[params.vectorizer](audio, params)
 
 
-def add_deltas(features: np.ndarray) -> np.ndarray:
-    """Inserts extra features that are the difference between adjacent timesteps"""
-    deltas = np.zeros_like(features)
-    for i in range(1, len(features)):
-        deltas[i] = features[i] - features[i - 1]
+def add_deltas(features: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+    """
+    Inserts extra features that are the difference between adjacent timesteps
+    Args:
+        features: Array of shape (timesteps, feature_size)
+        out: Array of shape (timesteps, 2 * feature_size) to write into
+    """
+    num_features = features.shape[-1]
+    if out is None:
+        out = np.empty(features.shape[:-1] + (2 * num_features,), dtype=features.dtype)
+    out[..., :num_features] = features
+    out[..., :1, num_features:] = 0
+    np.subtract(features[..., 1:, :], features[..., :-1, :], out=out[..., 1:, num_features:])
+    return out
+
+
+def sliding_windows(features: np.ndarray, n_features: int, step: int) -> np.ndarray:
+    """
+    Zero copy view of the windows features[i - n_features:i]
+    for i in range(n_features, len(features), step)
+    """
+    num_windows = max(0, (len(features) - n_features + step - 1) // step)
+    return np.lib.stride_tricks.as_strided(
+        features, shape=(num_windows, n_features) + features.shape[1:],
+        strides=(step * features.strides[0],) + features.strides, writeable=False
+    )
+
 
-    return np.concatenate([features, deltas], -1)
+def stream_windows(features: np.ndarray, chunk_ends: np.ndarray, params: ListenerParams = pr,
+                   previous: np.ndarray = None, first_frame: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Finds the feature windows a StreamingVectorizer would hold after each chunk
+    of a stream, given the features of the stream computed at once
+    Args:
+        features: Feature vectors of all frames of the stream, or of one block of it
+        chunk_ends: Number of audio samples in the stream at the end of each chunk
+        params: Listener params the features were computed with
+        previous: Last n_features vectors before a block, zeros at the start of the stream
+        first_frame: Number of frames in the stream before a block
+    Returns:
+        Zero copy view of the windows and the index of each chunk's window in it
+    """
+    n_features, num_coeffs = params.n_features, features.shape[1]
+    if previous is None:
+        previous = np.zeros((n_features, num_coeffs))
+    padded = np.concatenate([previous, features, np.zeros((1, num_coeffs))])
+    windows = sliding_windows(padded, n_features, 1)  # windows[n] ends after the first n frames
+    num_frames = np.where(
+        chunk_ends < params.window_samples, 0,
+        1 + (chunk_ends - params.window_samples) // params.hop_samples
+    )
+    return windows, num_frames - first_frame
 
 
-def vectorize(audio: np.ndarray) -> np.ndarray:
+def vectorize(audio: np.ndarray, params: ListenerParams = pr) -> np.ndarray:
     """
     Converts audio to machine readable vectors using
     configuration specified in ListenerParams (params.py)
 
     Args:
         audio: Audio verified to be of `sample_rate`
+        params: Listener params of the model, defaults to the global params
 
     Returns:
         array<float>: Vector representation of audio
     """
-    if len(audio) > pr.max_samples:
-        audio = audio[-pr.max_samples:]
-    features = vectorize_raw(audio)
-    if len(features) < pr.n_features:
+    if len(audio) > params.max_samples:
+        audio = audio[-params.max_samples:]
+    features = vectorize_raw(audio, params)
+    if len(features) < params.n_features:
         features = np.concatenate([
-            np.zeros((pr.n_features - len(features), features.shape[1])),
+            np.zeros((params.n_features - len(features), features.shape[1])),
             features
         ])
-    if len(features) > pr.n_features:
-        features = features[-pr.n_features:]
+    if len(features) > params.n_features:
+        features = features[-params.n_features:]
 
     return features
 
 
-def vectorize_delta(audio: np.ndarray) -> np.ndarray:
+def vectorize_delta(audio: np.ndarray, params: ListenerParams = pr) -> np.ndarray:
     """Vectorizer for when use_delta is True"""
-    return add_deltas(vectorize(audio))
+    return add_deltas(vectorize(audio, params))
 
 
-def vectorize_inhibit(audio: np.ndarray) -> np.ndarray:
+def vectorize_inhibit(audio: np.ndarray, params: ListenerParams = pr) -> np.ndarray:
     """
     Returns an array of inputs generated from the
     wake word audio that shouldn't cause an activation
     """
 
     def samp(x):
-        return int(pr.sample_rate * x)
+        return int(params.sample_rate * x)
 
     inputs = []
     for offset in range(samp(inhibit_t), samp(inhibit_dist_t), samp(inhibit_hop_t)):
-        if len(audio) - offset < samp(pr.buffer_t / 2.):
+        if len(audio) - offset < samp(params.buffer_t / 2.):
             break
-        inputs.append(vectorize(audio[:-offset]))
-    return np.array(inputs) if inputs else np.empty((0, pr.n_features, pr.feature_size))
+        inputs.append(vectorize(audio[:-offset], params))
+    return np.array(inputs) if inputs else np.empty((0, params.n_features, params.feature_size))
+
+
+@lru_cache()
+def dct_matrix(num_filt: int, num_coeffs: int) -> np.ndarray:
+    """Orthonormal DCT-II as a matrix so mel frames can be converted with a single dot product"""
+    n = np.arange(num_filt)
+    k = np.arange(num_coeffs)
+    matrix = np.cos(np.pi * k[np.newaxis] * (2 * n[:, np.newaxis] + 1) / (2 * num_filt))
+    matrix[:, 0] *= np.sqrt(1 / num_filt)
+    matrix[:, 1:] *= np.sqrt(2 / num_filt)
+    return matrix
+
+
+class StreamingVectorizer:
+    """
+    Converts a stream of audio chunks into a window of feature vectors,
+    only computing the frames completed by each new chunk
+
+    The partial frame at the end of each chunk is kept for the next
+    update and the latest n_features vectors are kept in a ring buffer
+    that is stored twice so the window is always a contiguous view
+    """
+
+    def __init__(self, params: ListenerParams = pr):
+        self.pr = params
+        self.window_samples = params.window_samples
+        self.hop_samples = params.hop_samples
+        self.n_features = params.n_features
+        self.num_coeffs = params.n_filt if params.vectorizer == Vectorizer.mels else params.n_mfcc
+        self.streaming = params.vectorizer in (Vectorizer.mels, Vectorizer.mfccs)
+
+        if self.streaming:
+            fft_len = params.n_fft // 2 + 1
+            self.filters = np.ascontiguousarray(filterbanks(params.sample_rate, params.n_filt, fft_len).T)
+            self.dct = dct_matrix(params.n_filt, params.n_mfcc)
+            self._allocate_work(2)
+
+        self.audio = np.zeros(self.window_samples + params.buffer_samples)
+        self.spare_audio = np.zeros_like(self.audio)  # Swapped with audio to drop used samples without copying
+        self.audio_len = 0
+        self.ring = np.zeros((2 * self.n_features, self.num_coeffs))
+        self.pos = 0
+
+    @property
+    def features(self) -> np.ndarray:
+        """Latest n_features vectors, oldest first"""
+        return self.ring[self.pos:self.pos + self.n_features]
+
+    def clear(self):
+        self.audio_len = 0
+        self.ring[:] = 0
+        self.pos = 0
+
+    def update(self, audio: np.ndarray) -> np.ndarray:
+        """
+        Adds new audio to the stream
+        Returns:
+            View of the latest n_features vectors, only valid until the next update
+        """
+        self._write(self.vectorize_new(audio, self.n_features))
+        return self.features
+
+    def vectorize_new(self, audio: np.ndarray, max_frames: int = None) -> np.ndarray:
+        """
+        Adds new audio to the stream without updating the feature window
+        Args:
+            audio: New audio samples
+            max_frames: Only compute up to this many of the most recent frames
+        Returns:
+            Feature vectors of the frames completed by the new audio
+        """
+        end = self.audio_len + len(audio)
+        if end > len(self.audio):
+            self.audio = np.concatenate([self.audio[:self.audio_len], np.zeros(end)])
+            self.spare_audio = np.zeros_like(self.audio)
+        self.audio[self.audio_len:end] = audio
+        self.audio_len = end
+
+        if end < self.window_samples:
+            return np.empty((0, self.num_coeffs))
+
+        num_frames = 1 + (end - self.window_samples) // self.hop_samples
+        if self.streaming:
+            first = max(0, num_frames - (max_frames or num_frames))
+            new_features = self._vectorize_frames(first, num_frames)
+        else:
+            new_features = vectorize_raw(self.audio[:end], self.pr)
+            num_frames = len(new_features)
+            new_features = new_features[-(max_frames or num_frames):]
+
+        consumed = num_frames * self.hop_samples
+        self.audio_len = end - consumed
+        self.spare_audio[:self.audio_len] = self.audio[consumed:end]
+        self.audio, self.spare_audio = self.spare_audio, self.audio
+        return new_features
+
+    def _vectorize_frames(self, first: int, last: int) -> np.ndarray:
+        """Computes the same features as sonopy for frames first..last in the audio buffer"""
+        num_frames = last - first
+        if len(self.frames) < num_frames:
+            self._allocate_work(num_frames)
+        frames = self.frames[:num_frames]
+        powers, squares, mels = self.powers[:num_frames], self.squares[:num_frames], self.mels[:num_frames]
+
+        stride = self.audio.strides[0]
+        frames[:, :self.window_samples] = np.lib.stride_tricks.as_strided(
+            self.audio[first * self.hop_samples:], shape=(num_frames, self.window_samples),
+            strides=(self.hop_samples * stride, stride)
+        )
+        fft = np.fft.rfft(frames[:, :self.pr.n_fft])
+        np.square(fft.real, out=powers)
+        np.square(fft.imag, out=squares)
+        powers += squares
+        powers /= self.pr.n_fft
+
+        np.dot(powers, self.filters, out=mels)
+        np.log(np.clip(mels, np.finfo(float).eps, None, out=mels), out=mels)
+        if self.pr.vectorizer == Vectorizer.mels:
+            return mels.copy()
+        mfccs = mels.dot(self.dct)
+        mfccs[:, 0] = np.log(np.clip(powers.sum(axis=1), np.finfo(float).eps, None))
+        return mfccs
+
+    def _allocate_work(self, num_frames: int):
+        """Buffers reused between updates so steady state updates don't allocate large arrays"""
+        fft_len = self.pr.n_fft // 2 + 1
+        self.frames = np.zeros((num_frames, max(self.pr.n_fft, self.window_samples)))
+        self.powers = np.empty((num_frames, fft_len))
+        self.squares = np.empty((num_frames, fft_len))
+        self.mels = np.empty((num_frames, self.pr.n_filt))
+
+    def _write(self, features: np.ndarray):
+        ids = (self.pos + np.arange(len(features))) % self.n_features
+        self.ring[ids] = features
+        self.ring[ids + self.n_features] = features
+        self.pos = (self.pos + len(features)) % self.n_features
@@ -0,0 +1,157 @@
+# Copyright 2019 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Single file bundle (.pwb) of the network weights, layer config and
+listener params that can be memory mapped and run without TensorFlow
+
+File layout:
+ - BUNDLE_MAGIC
+ - HEADER: Format version and length of the json header
+ - Json header with the params, activations, weight type and the
+   dtype, shape and offset of each tensor
+ - Tensor data, each tensor aligned to ALIGNMENT bytes
+"""
+import json
+import numpy as np
+from struct import Struct
+from typing import *
+
+BUNDLE_EXT = '.pwb'
+BUNDLE_MAGIC = b'PRECISEW'
+BUNDLE_VERSION = 1
+HEADER = Struct('<HI')
+ALIGNMENT = 64
+BUNDLE_DTYPES = ('float32', 'float16', 'int8')
+QUANTIZED_WEIGHTS = ('kernel', 'recurrent_kernel', 'dense_kernel')
+
+
+def align(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def quantize(name: str, weights: np.ndarray, dtype: str) -> Dict[str, np.ndarray]:
+    """
+    Converts a weight to the bundle's weight type. Biases are kept
+    as float32 and int8 kernels are scaled symmetrically per column
+    Returns:
+        Tensors to store, by name
+    """
+    weights = np.asarray(weights, dtype=np.float32)
+    if name not in QUANTIZED_WEIGHTS or dtype == 'float32':
+        return {name: weights}
+    if dtype == 'float16':
+        return {name: weights.astype(np.float16)}
+    scale = np.abs(weights).max(axis=0) / 127
+    scale[scale == 0] = 1.0
+    return {
+        name: np.clip(np.round(weights / scale), -127, 127).astype(np.int8),
+        name + '.scale': scale.astype(np.float32)
+    }
+
+
+def dequantize(tensors: Dict[str, np.ndarray], name: str) -> np.ndarray:
+    """Float32 weights of a tensor, which is a view of the file if stored as float32"""
+    weights = tensors[name]
+    if weights.dtype == np.int8:
+        return weights * tensors[name + '.scale']
+    return weights.astype(np.float32, copy=False)
+
+
+def save_bundle(filename: str, model: 'NumpyModel', params: 'ListenerParams', dtype: str = 'float32'):
+    """
+    Writes the weights, activations and params of a model to a single file
+    A QuantizedModel is always written as int8 along with its calibration
+    """
+    from precise.numpy_model import WEIGHT_NAMES
+
+    if dtype not in BUNDLE_DTYPES:
+        raise ValueError('Weight type must be one of: ' + str(list(BUNDLE_DTYPES)))
+    extra = {}
+    if hasattr(model, 'tensors'):
+        dtype = 'int8'
+        tensors = model.tensors
+        extra['calibration'] = {'input_scale': model.input_scale, 'state_scale': model.state_scale}
+    else:
+        tensors = {}
+        for name in WEIGHT_NAMES:
+            tensors.update(quantize(name, getattr(model, name), dtype))
+
+    offset = 0
+    tensor_info = {}
+    for name, tensor in tensors.items():
+        tensor_info[name] = {
+            'dtype': tensor.dtype.newbyteorder('<').str, 'shape': list(tensor.shape), 'offset': offset
+        }
+        offset = align(offset + tensor.nbytes)
+
+    header = json.dumps({
+        'dtype': dtype,
+        'activation': model.activation,
+        'recurrent_activation': model.recurrent_activation,
+        'params': params.__dict__,
+        'tensors': tensor_info,
+        **extra
+    }).encode()
+    data_start = align(len(BUNDLE_MAGIC) + HEADER.size + len(header))
+
+    with open(filename, 'wb') as f:
+        f.write(BUNDLE_MAGIC + HEADER.pack(BUNDLE_VERSION, len(header)) + header)
+        for name, tensor in tensors.items():
+            f.seek(data_start + tensor_info[name]['offset'])
+            f.write(tensor.astype(tensor_info[name]['dtype'], copy=False).tobytes())
+        f.truncate(data_start + offset)
+
+
+def read_header(filename: str) -> Tuple[dict, int]:
+    """
+    Reads the json header of a bundle
+    Returns:
+        The header and the file offset the tensor data starts at
+    """
+    with open(filename, 'rb') as f:
+        start = f.read(len(BUNDLE_MAGIC) + HEADER.size)
+        if len(start) < len(BUNDLE_MAGIC) + HEADER.size or not start.startswith(BUNDLE_MAGIC):
+            raise ValueError(filename + ' is not a precise weights bundle')
+        version, header_len = HEADER.unpack(start[len(BUNDLE_MAGIC):])
+        if version != BUNDLE_VERSION:
+            raise ValueError('Unsupported bundle version {} in {}'.format(version, filename))
+        header = json.loads(f.read(header_len).decode())
+    return header, align(len(start) + header_len)
+
+
+def load_tensors(filename: str, mmap: bool = True) -> Tuple[dict, Dict[str, np.ndarray]]:
+    """
+    Reads the header and tensors of a bundle
+    Args:
+        filename: Bundle to read
+        mmap: Whether to memory map the tensors instead of reading them into memory
+    Returns:
+        The header and read only tensors by name
+    """
+    header, data_start = read_header(filename)
+    if mmap:
+        data = np.memmap(filename, np.uint8, 'r', data_start)
+    else:
+        with open(filename, 'rb') as f:
+            f.seek(data_start)
+            data = np.frombuffer(f.read(), np.uint8)
+
+    tensors = {}
+    for name, info in header['tensors'].items():
+        dtype = np.dtype(info['dtype'])
+        count = int(np.prod(info['shape']))
+        tensors[name] = data[info['offset']:info['offset'] + count * dtype.itemsize].view(
+            dtype
+        ).reshape(info['shape'])
+    return header, tensors
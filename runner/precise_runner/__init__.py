@@ -1,3 +1,9 @@
+import sys
+
+from .latency import LatencyStats
 from .runner import PreciseRunner, PreciseEngine, ReadWriteStream
 
+if sys.version_info >= (3, 5):
+    from .async_runner import AsyncPreciseRunner, AsyncPreciseEngine, AsyncSocketEngine, AsyncListenerEngine
+
 __version__ = '0.3.1'
@@ -0,0 +1,301 @@
+# Python 3.5+
+# Copyright 2019 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Asyncio versions of the engines and runner so a single event
+loop can listen to many streams without a thread per stream
+"""
+import asyncio
+from collections import namedtuple
+from inspect import isawaitable
+
+from .runner import (
+    BINARY_MAGIC, BINARY_VERSION, HANDSHAKE, TriggerDetector, response_struct
+)
+
+Prediction = namedtuple('Prediction', 'probability activated')
+
+
+class AsyncEngine(object):
+    def __init__(self, chunk_size=2048):
+        self.chunk_size = chunk_size
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def get_prediction(self, chunk):
+        raise NotImplementedError
+
+
+class AsyncPreciseEngine(AsyncEngine):
+    """
+    Runs a precise engine executable through asyncio subprocess pipes
+
+    Args:
+        exe_file (Union[str, list]): Either filename or list of arguments
+        model_file (str): Location to .pb model file to use (with .pb.params)
+        chunk_size (int): Number of *bytes* per prediction
+        binary (bool): Try to use the binary protocol, falling back to text lines
+        timing (bool): Ask for the processing time of each chunk in binary mode
+    """
+
+    def __init__(self, exe_file, model_file, chunk_size=2048, binary=False, timing=False):
+        AsyncEngine.__init__(self, chunk_size)
+        self.exe_args = exe_file if isinstance(exe_file, list) else [exe_file]
+        self.exe_args += [model_file, str(self.chunk_size)]
+        self.binary = binary
+        self.timing = timing
+        self.proc = None
+        self.response = None
+        self.last_seq = None
+        self.last_timing = None
+
+    async def start(self):
+        if self.binary:
+            self.proc = await self._spawn(self.exe_args + ['--binary'] + ['--timing'] * self.timing)
+            if await self._negotiate():
+                return
+            await self.stop()
+        self.proc = await self._spawn(self.exe_args)
+
+    @staticmethod
+    async def _spawn(args):
+        return await asyncio.create_subprocess_exec(
+            *args, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE
+        )
+
+    async def stop(self):
+        if self.proc:
+            if self.proc.returncode is None:
+                try:
+                    self.proc.kill()
+                except ProcessLookupError:  # Already reaped by the child watcher
+                    pass
+            await self.proc.wait()
+            self.proc = None
+        self.response = None
+
+    async def _negotiate(self):
+        try:
+            data = await self.proc.stdout.readexactly(len(BINARY_MAGIC) + HANDSHAKE.size)
+        except asyncio.IncompleteReadError:
+            return False
+        if not data.startswith(BINARY_MAGIC):
+            return False
+        version, fields, response_size = HANDSHAKE.unpack(data[len(BINARY_MAGIC):])
+        response = response_struct(fields)
+        if version != BINARY_VERSION or response.size != response_size:
+            return False
+        self.response = response
+        return True
+
+    async def send_chunk(self, chunk):
+        """Writes a chunk without waiting for its prediction"""
+        if len(chunk) != self.chunk_size:
+            raise ValueError('Invalid chunk size: ' + str(len(chunk)))
+        self.proc.stdin.write(chunk)
+        await self.proc.stdin.drain()
+
+    async def read_prediction(self):
+        """Reads the prediction of the oldest chunk without one"""
+        if not self.response:
+            line = await self.proc.stdout.readline()
+            if not line:
+                raise EOFError('Engine closed its output')
+            return float(line)
+        try:
+            data = await self.proc.stdout.readexactly(self.response.size)
+        except asyncio.IncompleteReadError:
+            raise EOFError('Engine closed its output')
+        values = self.response.unpack(data)
+        self.last_seq = values[0]
+        self.last_timing = values[2] if len(values) > 2 else None
+        return values[1]
+
+    async def get_prediction(self, chunk):
+        await self.send_chunk(chunk)
+        return await self.read_prediction()
+
+
+class AsyncSocketEngine(AsyncEngine):
+    """
+    Streams audio to a precise-engine-server over its Unix socket so
+    many streams share one process and batched network
+
+    Args:
+        socket_file (str): Socket the server listens on
+        chunk_size (int): Number of *bytes* per prediction, must match the server
+        stream_id (str): Id to resume the state of, if the server uses --keep-state
+    """
+
+    def __init__(self, socket_file, chunk_size=2048, stream_id=None):
+        AsyncEngine.__init__(self, chunk_size)
+        self.socket_file = socket_file
+        self.stream_id = stream_id
+        self.reader = self.writer = None
+
+    async def start(self):
+        self.reader, self.writer = await asyncio.open_unix_connection(self.socket_file)
+        if self.stream_id is not None:
+            self.writer.write((self.stream_id + '\n').encode('utf8'))
+
+    async def stop(self):
+        if self.writer:
+            self.writer.close()
+            self.reader = self.writer = None
+
+    async def get_prediction(self, chunk):
+        if len(chunk) != self.chunk_size:
+            raise ValueError('Invalid chunk size: ' + str(len(chunk)))
+        self.writer.write(chunk)
+        await self.writer.drain()
+        line = await self.reader.readline()
+        if not line:
+            raise EOFError('Server closed the connection')
+        return float(line)
+
+
+class AsyncListenerEngine(AsyncEngine):
+    """
+    Runs an in-process Listener in an executor so the network
+    doesn't block the event loop
+
+    Args:
+        listener (Listener): Listener to update with each chunk
+        chunk_size (int): Number of *bytes* per prediction
+        executor (concurrent.futures.Executor): Executor to run the listener in,
+                                                the loop's default if not given
+    """
+
+    def __init__(self, listener, chunk_size=2048, executor=None):
+        AsyncEngine.__init__(self, chunk_size)
+        self.listener = listener
+        self.executor = executor
+
+    async def get_prediction(self, chunk):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, self.listener.update, chunk)
+
+
+class AsyncPreciseRunner(object):
+    """
+    Asyncio version of PreciseRunner. Example:
+    >>> async def listen(reader):
+    ...     engine = AsyncPreciseEngine('./precise-engine', 'hey-mycroft.pb')
+    ...     async with AsyncPreciseRunner(engine, reader) as runner:
+    ...         async for prediction in runner:
+    ...             if prediction.activated:
+    ...                 print('Activation!')
+
+    Args:
+        engine (AsyncEngine): Engine to get predictions from
+        stream: Source of 16000 Hz 1 channel int16 audio. Either an object
+                with a readexactly() or read() coroutine (ie. asyncio.StreamReader)
+                or an async iterable of byte strings
+        trigger_level (int): Number of chunk activations needed to trigger on_activation
+        sensitivity (float): From 0.0 to 1.0, how sensitive the network should be
+        on_prediction (Callable): callback or coroutine for every new prediction
+        on_activation (Callable): callback or coroutine for when the wake word is heard
+    """
+
+    def __init__(self, engine, stream, trigger_level=3, sensitivity=0.5,
+                 on_prediction=lambda x: None, on_activation=lambda: None):
+        self.engine = engine
+        self.stream = stream
+        self.on_prediction = on_prediction
+        self.on_activation = on_activation
+        self.chunk_size = engine.chunk_size
+        self.is_paused = False
+        self.detector = TriggerDetector(self.chunk_size, sensitivity, trigger_level)
+        self._pending = bytearray()
+        self._chunks = None
+
+    async def start(self):
+        await self.engine.start()
+
+    async def stop(self):
+        await self.engine.stop()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    def pause(self):
+        self.is_paused = True
+
+    def play(self):
+        self.is_paused = False
+
+    async def read_chunk(self):
+        """Reads the next chunk from the stream, returning b'' at the end"""
+        if hasattr(self.stream, 'readexactly'):
+            try:
+                return await self.stream.readexactly(self.chunk_size)
+            except asyncio.IncompleteReadError:
+                return b''
+        while len(self._pending) < self.chunk_size:
+            data = await self._read_more()
+            if not data:
+                return b''
+            self._pending += data
+        chunk = bytes(self._pending[:self.chunk_size])
+        del self._pending[:self.chunk_size]
+        return chunk
+
+    async def _read_more(self):
+        """Reads whatever the stream has next, returning b'' at the end"""
+        if hasattr(self.stream, 'read'):
+            return await self.stream.read(self.chunk_size - len(self._pending))
+        if self._chunks is None:
+            self._chunks = self.stream.__aiter__()
+        async for data in self._chunks:
+            if data:
+                return data
+        return b''
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        """Waits for the next prediction, skipping audio while paused"""
+        while True:
+            chunk = await self.read_chunk()
+            if not chunk:
+                raise StopAsyncIteration
+            if not self.is_paused:
+                break
+
+        prob = await self.engine.get_prediction(chunk)
+        await self._call(self.on_prediction, prob)
+        activated = self.detector.update(prob)
+        if activated:
+            await self._call(self.on_activation)
+        return Prediction(prob, activated)
+
+    async def run(self):
+        """Listens until the stream ends, only calling the callbacks"""
+        async for _ in self:
+            pass
+
+    @staticmethod
+    async def _call(callback, *args):
+        result = callback(*args)
+        if isawaitable(result):
+            await result
@@ -0,0 +1,172 @@
+# Python 2 + 3
+# Copyright 2019 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Per stage latency histograms used to find where the time of each
+prediction goes, ie. reading audio, computing features or inference
+"""
+import math
+import time
+from threading import Thread, Event
+
+clock = getattr(time, 'perf_counter', time.time)
+
+
+class LatencyHistogram(object):
+    """
+    Histogram of durations with logarithmic buckets like an HDR histogram.
+    Each power of two of microseconds is split into SUB_BUCKETS buckets,
+    so values are recorded with roughly 3% precision in constant memory
+    """
+    SUB_BUCKETS = 16
+    MAX_EXPONENT = 40
+
+    def __init__(self):
+        self.counts = [0] * (self.SUB_BUCKETS * (self.MAX_EXPONENT + 1))
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        us = seconds * 1e6
+        self.counts[self._index(us)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def _index(self, us):
+        if us < 1.0:
+            return 0
+        mantissa, exponent = math.frexp(us)
+        exponent = min(exponent, self.MAX_EXPONENT)
+        return exponent * self.SUB_BUCKETS + int((mantissa - 0.5) * 2 * self.SUB_BUCKETS)
+
+    def _value(self, index):
+        """Seconds in the middle of a bucket"""
+        exponent, sub_bucket = divmod(index, self.SUB_BUCKETS)
+        if exponent == 0:
+            return 0.0
+        return math.ldexp(0.5 + (sub_bucket + 0.5) / (2.0 * self.SUB_BUCKETS), exponent) / 1e6
+
+    def merge(self, other):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, percent):
+        """Approximate duration in seconds that percent of the values are below"""
+        if self.count == 0:
+            return 0.0
+        target = percent / 100.0 * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= target:
+                return min(self._value(index), self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean_ms': 1000 * self.total / self.count if self.count else 0.0,
+            'p50_ms': 1000 * self.percentile(50),
+            'p90_ms': 1000 * self.percentile(90),
+            'p99_ms': 1000 * self.percentile(99),
+            'max_ms': 1000 * self.max
+        }
+
+
+class StageTimer(object):
+    """Records the time since the previous lap under the name of each stage"""
+
+    def __init__(self, stats):
+        self.stats = stats
+        self.last = clock()
+
+    def lap(self, stage):
+        now = clock()
+        self.stats.record(stage, now - self.last)
+        self.last = now
+
+
+class NullTimer(object):
+    """Timer that ignores every lap, used when no latency is recorded"""
+
+    def lap(self, stage):
+        pass
+
+
+null_timer = NullTimer()
+
+
+class LatencyStats(object):
+    """
+    Rolling latency histograms of each stage. Values older than one to
+    two windows are forgotten by rotating between two histograms
+
+    Args:
+        window (float): Seconds between rotations
+    """
+
+    def __init__(self, window=60.0):
+        self.window = window
+        self.current = {}
+        self.previous = {}
+        self.rotate_at = clock() + window
+
+    def timer(self):
+        """Starts timing the stages of a single prediction"""
+        if clock() > self.rotate_at:
+            self.rotate()
+        return StageTimer(self)
+
+    def record(self, stage, seconds):
+        histogram = self.current.get(stage)
+        if histogram is None:
+            histogram = self.current[stage] = LatencyHistogram()
+        histogram.record(seconds)
+
+    def rotate(self):
+        self.previous, self.current = self.current, {}
+        self.rotate_at = clock() + self.window
+
+    def snapshot(self):
+        """Summary of each stage over the last one to two windows, by stage name"""
+        summaries = {}
+        for stage in list(self.previous) + [i for i in list(self.current) if i not in self.previous]:
+            histogram = LatencyHistogram()
+            for histograms in (self.previous, self.current):
+                if stage in histograms:
+                    histogram.merge(histograms[stage])
+            summaries[stage] = histogram.summary()
+        return summaries
+
+    def report_every(self, interval, callback):
+        """
+        Calls callback with a snapshot every interval seconds from a daemon thread
+        Returns:
+            Event: Set it to stop reporting
+        """
+        stop_event = Event()
+
+        def report():
+            while not stop_event.wait(interval):
+                callback(self.snapshot())
+
+        thread = Thread(target=report)
+        thread.daemon = True
+        thread.start()
+        return stop_event
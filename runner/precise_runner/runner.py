@@ -15,8 +15,26 @@
 import atexit
 
 import time
+from struct import Struct
 from subprocess import PIPE, Popen
-from threading import Thread, Event
+from threading import Thread, Condition, Lock
+
+from .latency import null_timer
+
+# Binary engine protocol, enabled by passing --binary to the engine
+# The engine starts by writing BINARY_MAGIC followed by a HANDSHAKE of
+# the protocol version, the enabled optional fields and the response size
+# Each response is a sequence number and float32 confidence, followed by
+# the seconds spent processing the chunk if FIELD_TIMING is enabled
+BINARY_MAGIC = b'PRECISE\0'
+BINARY_VERSION = 1
+HANDSHAKE = Struct('<BBH')
+FIELD_TIMING = 1
+
+
+def response_struct(fields):
+    """Layout of a single binary response with the given optional fields"""
+    return Struct('<If' + 'f' * bool(fields & FIELD_TIMING))
 
 
 class Engine(object):
@@ -43,28 +61,86 @@ class PreciseEngine(Engine):
         model_file (str): Location to .pb model file to use (with .pb.params)
         chunk_size (int): Number of *bytes* per prediction. Higher numbers
                           decrease CPU usage but increase latency
+        binary (bool): Try to use the binary protocol, falling back to
+                       text lines if the engine doesn't support it
+        timing (bool): Ask for the processing time of each chunk in binary mode
     """
 
-    def __init__(self, exe_file, model_file, chunk_size=2048):
+    def __init__(self, exe_file, model_file, chunk_size=2048, binary=False, timing=False):
         Engine.__init__(self, chunk_size)
         self.exe_args = exe_file if isinstance(exe_file, list) else [exe_file]
         self.exe_args += [model_file, str(self.chunk_size)]
+        self.binary = binary
+        self.timing = timing
         self.proc = None
+        self.response = None  # Struct of binary responses, None in text mode
+        self.next_seq = 0
+        self.last_seq = None
+        self.last_timing = None
 
     def start(self):
+        if self.binary:
+            self.proc = Popen(self.exe_args + ['--binary'] + ['--timing'] * self.timing,
+                              stdin=PIPE, stdout=PIPE)
+            if self._negotiate():
+                return
+            self.stop()
         self.proc = Popen(self.exe_args, stdin=PIPE, stdout=PIPE)
 
     def stop(self):
         if self.proc:
             self.proc.kill()
+            self.proc.wait()
             self.proc = None
+        self.response = None
+        self.next_seq = 0
+
+    def _negotiate(self):
+        """Reads the handshake of the binary protocol, returning whether it is in use"""
+        data = self.proc.stdout.read(len(BINARY_MAGIC) + HANDSHAKE.size)
+        if len(data) != len(BINARY_MAGIC) + HANDSHAKE.size or not data.startswith(BINARY_MAGIC):
+            return False
+        version, fields, response_size = HANDSHAKE.unpack(data[len(BINARY_MAGIC):])
+        response = response_struct(fields)
+        if version != BINARY_VERSION or response.size != response_size:
+            return False
+        self.response = response
+        return True
+
+    def send_chunk(self, chunk):
+        """
+        Writes a chunk to the engine without waiting for its prediction
+        Several chunks can be sent before reading their predictions
 
-    def get_prediction(self, chunk):
+        Returns:
+            int: Sequence number of the chunk
+        """
         if len(chunk) != self.chunk_size:
             raise ValueError('Invalid chunk size: ' + str(len(chunk)))
         self.proc.stdin.write(chunk)
         self.proc.stdin.flush()
-        return float(self.proc.stdout.readline())
+        seq = self.next_seq
+        self.next_seq = (seq + 1) & 0xFFFFFFFF
+        return seq
+
+    def read_prediction(self):
+        """
+        Reads the prediction of the oldest chunk without one. In binary mode,
+        its sequence number and timing are stored in last_seq and last_timing
+        """
+        if not self.response:
+            return float(self.proc.stdout.readline())
+        data = self.proc.stdout.read(self.response.size)
+        if len(data) != self.response.size:
+            raise EOFError('Engine closed its output')
+        values = self.response.unpack(data)
+        self.last_seq = values[0]
+        self.last_timing = values[2] if len(values) > 2 else None
+        return values[1]
+
+    def get_prediction(self, chunk):
+        self.send_chunk(chunk)
+        return self.read_prediction()
 
 
 class ListenerEngine(Engine):
@@ -77,40 +153,125 @@ class ReadWriteStream(object):
     """
     Class used to support writing binary audio data at any pace,
     optionally chopping when the buffer gets too large
+
+    Data is kept in a ring buffer so reads and writes only copy the
+    bytes they transfer
+
+    Args:
+        s (bytes): Initial data
+        chop_samples (int): If the unread data is longer than this, reads
+                            drop all but the last len % chop_samples bytes
+        max_size (int): Maximum number of unread bytes to hold. When a write
+                        would exceed this, the oldest bytes are dropped and
+                        counted in dropped_bytes. Unlimited if not given
     """
-    def __init__(self, s=b'', chop_samples=-1):
-        self.buffer = s
-        self.write_event = Event()
+    def __init__(self, s=b'', chop_samples=-1, max_size=None):
         self.chop_samples = chop_samples
+        self.max_size = max_size
+        self.dropped_bytes = 0
+        self.overflows = 0
+        self.write_condition = Condition(Lock())
+
+        self._data = bytearray(max_size or max(4096, len(s)))
+        self._start = 0
+        self._size = 0
+        if s:
+            self.write(s)
 
     def __len__(self):
-        return len(self.buffer)
+        return self._size
+
+    @property
+    def capacity(self):
+        return len(self._data)
+
+    @property
+    def buffer(self):
+        """Copy of the unread data"""
+        with self.write_condition:
+            return self._peek(self._size)
 
     def read(self, n=-1, timeout=None):
         if n == -1:
-            n = len(self.buffer)
-        if 0 < self.chop_samples < len(self.buffer):
-            samples_left = len(self.buffer) % self.chop_samples
-            self.buffer = self.buffer[-samples_left:]
+            n = self._size
+        chunk = bytearray(n)
+        num_read = self.readinto(chunk, timeout)
+        return bytes(chunk) if num_read else b''
+
+    def readinto(self, b, timeout=None):
+        """
+        Fills the writable buffer b, waiting until enough data is available
+        Returns:
+            int: len(b) or 0 if the timeout passed first
+        """
+        n = len(b)
         return_time = 1e10 if timeout is None else (
                 timeout + time.time()
         )
-        while len(self.buffer) < n:
-            self.write_event.clear()
-            if not self.write_event.wait(return_time - time.time()):
-                return b''
-        chunk = self.buffer[:n]
-        self.buffer = self.buffer[n:]
-        return chunk
+        with self.write_condition:
+            if 0 < self.chop_samples < self._size:
+                samples_left = self._size % self.chop_samples
+                if samples_left:
+                    self._drop(self._size - samples_left)
+            while self._size < n:
+                remaining = return_time - time.time()
+                if remaining <= 0:
+                    return 0
+                self.write_condition.wait(remaining)
+            self._copy_out(memoryview(b), n)
+            self._drop(n)
+        return n
 
     def write(self, s):
-        self.buffer += s
-        self.write_event.set()
+        with self.write_condition:
+            if self.max_size:
+                overflow = self._size + len(s) - self.max_size
+                if overflow > 0:
+                    self.overflows += 1
+                    self.dropped_bytes += overflow
+                    if len(s) > self.max_size:
+                        s = s[-self.max_size:]
+                    self._drop(min(overflow, self._size))
+            elif self._size + len(s) > len(self._data):
+                self._grow(self._size + len(s))
+            self._copy_in(s)
+            self.write_condition.notify_all()
 
     def flush(self):
         """Makes compatible with sys.stdout"""
         pass
 
+    def _grow(self, min_size):
+        data = bytearray(max(min_size, 2 * len(self._data)))
+        self._copy_out(memoryview(data), self._size)
+        self._data = data
+        self._start = 0
+
+    def _drop(self, n):
+        self._start = (self._start + n) % len(self._data)
+        self._size -= n
+
+    def _peek(self, n):
+        out = bytearray(n)
+        self._copy_out(memoryview(out), n)
+        return bytes(out)
+
+    def _copy_out(self, view, n):
+        """Copy the oldest n bytes into view"""
+        data = memoryview(self._data)
+        first = min(n, len(self._data) - self._start)
+        view[:first] = data[self._start:self._start + first]
+        view[first:n] = data[:n - first]
+
+    def _copy_in(self, s):
+        s = memoryview(s)
+        data = memoryview(self._data)
+        end = (self._start + self._size) % len(self._data)
+        first = min(len(s), len(self._data) - end)
+        data[end:end + first] = s[:first]
+        data[:len(s) - first] = s[first:]
+        self._size += len(s)
+
 
 class TriggerDetector:
     """
@@ -162,11 +323,14 @@ class PreciseRunner(object):
                            audio from. If not given, the microphone is used
         on_prediction (Callable): callback for every new prediction
         on_activation (Callable): callback for when the wake word is heard
+        latency_stats (LatencyStats): If given, records how long reading audio,
+                                      the engine and the callbacks take for each chunk
     """
 
     def __init__(self, engine, trigger_level=3, sensitivity=0.5, stream=None,
-                 on_prediction=lambda x: None, on_activation=lambda: None):
+                 on_prediction=lambda x: None, on_activation=lambda: None, latency_stats=None):
         self.engine = engine
+        self.latency_stats = latency_stats
         self.trigger_level = trigger_level
         self.stream = stream
         self.on_prediction = on_prediction
@@ -232,12 +396,17 @@ class PreciseRunner(object):
     def _handle_predictions(self):
         """Continuously check Precise process output"""
         while self.running:
+            timer = self.latency_stats.timer() if self.latency_stats else null_timer
             chunk = self.stream.read(self.chunk_size)
+            timer.lap('read')
 
             if self.is_paused:
                 continue
 
             prob = self.engine.get_prediction(chunk)
+            timer.lap('engine')
             self.on_prediction(prob)
+            timer.lap('on_prediction')
             if self.detector.update(prob):
                 self.on_activation()
+                timer.lap('on_activation')
@@ -0,0 +1,105 @@
+import asyncio
+import sys
+
+from precise_runner import AsyncPreciseRunner, AsyncPreciseEngine
+from precise_runner.async_runner import AsyncListenerEngine
+
+from test_runner import FAKE_ENGINE
+
+
+class FakeListener:
+    def update(self, chunk):
+        return chunk.count(b'x') / float(len(chunk))
+
+
+def run(coro):
+    """Runs a coroutine on a new event loop, like asyncio.run() on Python 3.7+"""
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+async def collect(runner):
+    predictions = []
+    async for prediction in runner:
+        predictions.append(prediction)
+    return predictions
+
+
+class ByteSource:
+    """Async iterable of the data in pieces of a fixed size"""
+
+    def __init__(self, data, piece_size):
+        self.data = data
+        self.piece_size = piece_size
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.data:
+            raise StopAsyncIteration
+        piece, self.data = self.data[:self.piece_size], self.data[self.piece_size:]
+        return piece
+
+
+class ShortReader:
+    """Stream with a read() coroutine that never returns more than a few bytes"""
+
+    def __init__(self, data, piece_size):
+        self.data = data
+        self.piece_size = piece_size
+
+    async def read(self, n):
+        piece = self.data[:min(n, self.piece_size)]
+        self.data = self.data[len(piece):]
+        return piece
+
+
+class TestAsyncPreciseRunner:
+    def test_async_iterable(self):
+        activations = []
+
+        async def listen():
+            engine = AsyncListenerEngine(FakeListener(), chunk_size=4)
+            source = ByteSource(b'....' * 3 + b'xxxx' * 6 + b'..', 3)
+            runner = AsyncPreciseRunner(engine, source, trigger_level=2,
+                                        on_activation=lambda: activations.append(True))
+            async with runner:
+                return await collect(runner)
+
+        predictions = run(listen())
+        assert [i.probability for i in predictions] == [0.0] * 3 + [1.0] * 6
+        assert [i.activated for i in predictions].count(True) == len(activations) == 1
+
+    def test_short_reads(self):
+        async def listen():
+            engine = AsyncListenerEngine(FakeListener(), chunk_size=8)
+            source = ShortReader(b'........' * 2 + b'xxxxxxxx' * 3 + b'...', 3)
+            async with AsyncPreciseRunner(engine, source) as runner:
+                return [i.probability for i in await collect(runner)]
+
+        assert run(listen()) == [0.0] * 2 + [1.0] * 3
+
+    def test_engine_many_streams(self):
+        async def listen(stream_data, binary):
+            reader = asyncio.StreamReader()
+            reader.feed_data(stream_data)
+            reader.feed_eof()
+            engine = AsyncPreciseEngine([sys.executable, '-c', FAKE_ENGINE.format(old=not binary)],
+                                        'model.pb', 4, binary=True)
+            async with AsyncPreciseRunner(engine, reader) as runner:
+                return [i.probability for i in await collect(runner)], engine.last_seq
+
+        async def main():
+            return await asyncio.gather(*[
+                listen(b'xxxx' * i + b'....', i % 2 == 0) for i in range(8)
+            ])
+
+        for i, (probs, last_seq) in enumerate(run(main())):
+            assert probs == [1.0] * i + [0.0]
+            assert last_seq == (i if i % 2 == 0 else None)
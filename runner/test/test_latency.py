@@ -0,0 +1,51 @@
+import random
+import time
+
+from precise_runner import LatencyStats
+from precise_runner.latency import LatencyHistogram
+
+
+class TestLatencyHistogram:
+    def test_percentiles(self):
+        histogram = LatencyHistogram()
+        values = [random.uniform(0.001, 0.1) for _ in range(10000)]
+        for value in values:
+            histogram.record(value)
+        values.sort()
+        for percent in (50, 90, 99):
+            exact = values[int(percent / 100.0 * len(values)) - 1]
+            assert abs(histogram.percentile(percent) - exact) < 0.04 * exact
+        assert histogram.max == values[-1]
+        assert histogram.count == len(values)
+
+    def test_merge(self):
+        a, b = LatencyHistogram(), LatencyHistogram()
+        a.record(0.001)
+        b.record(0.5)
+        a.merge(b)
+        assert a.count == 2 and a.max == 0.5
+        assert a.percentile(50) < 0.0011
+
+
+class TestLatencyStats:
+    def test_stages(self):
+        stats = LatencyStats()
+        for _ in range(3):
+            timer = stats.timer()
+            time.sleep(0.002)
+            timer.lap('read')
+            timer.lap('inference')
+        snapshot = stats.snapshot()
+        assert list(snapshot) == ['read', 'inference']
+        assert snapshot['read']['count'] == 3
+        assert snapshot['read']['p50_ms'] > snapshot['inference']['p50_ms']
+
+    def test_rolling(self):
+        stats = LatencyStats(window=0.01)
+        stats.timer().lap('old')
+        time.sleep(0.02)
+        stats.timer().lap('new')
+        assert set(stats.snapshot()) == {'old', 'new'}
+        time.sleep(0.02)
+        stats.timer()
+        assert set(stats.snapshot()) == {'new'}
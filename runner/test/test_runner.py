@@ -1,4 +1,6 @@
-from precise_runner import ReadWriteStream
+import sys
+
+from precise_runner import PreciseEngine, ReadWriteStream
 
 
 class TestReadWriteStream:
@@ -16,3 +18,81 @@ class TestReadWriteStream:
         s = ReadWriteStream(chop_samples=10)
         s.write(b'1234567890hello')
         assert s.read(5) == b'hello'
+
+    def test_wrap_around(self):
+        s = ReadWriteStream(max_size=8)
+        s.write(b'123456')
+        assert s.read(4) == b'1234'
+        s.write(b'abcdef')
+        assert s.read() == b'56abcdef'
+
+    def test_drop_oldest(self):
+        s = ReadWriteStream(max_size=8)
+        s.write(b'123456')
+        s.write(b'abcdef')
+        assert s.dropped_bytes == 4
+        assert s.read() == b'56abcdef'
+        s.write(b'0123456789')
+        assert s.dropped_bytes == 6
+        assert s.read() == b'23456789'
+
+    def test_readinto(self):
+        s = ReadWriteStream(b'1234567890')
+        buf = bytearray(4)
+        assert s.readinto(buf) == 4
+        assert buf == b'1234'
+        assert s.readinto(bytearray(10), timeout=0.1) == 0
+        assert len(s) == 6
+
+    def test_grow(self):
+        s = ReadWriteStream()
+        s.write(b'x' * 5000)
+        s.write(b'y' * 5000)
+        assert s.read() == b'x' * 5000 + b'y' * 5000
+
+
+FAKE_ENGINE = '''
+import sys
+from struct import Struct
+stdin = getattr(sys.stdin, 'buffer', sys.stdin)
+stdout = getattr(sys.stdout, 'buffer', sys.stdout)
+chunk_size = int(sys.argv[2])
+if '--binary' in sys.argv:
+    if {old}:
+        sys.exit(2)
+    stdout.write(b'PRECISE\\0' + Struct('<BBH').pack(1, 0, 8))
+    stdout.flush()
+seq = 0
+while True:
+    chunk = stdin.read(chunk_size)
+    if not chunk:
+        break
+    conf = chunk.count(b'x') / float(chunk_size)
+    if '--binary' in sys.argv:
+        stdout.write(Struct('<If').pack(seq, conf))
+    else:
+        stdout.write(('%s\\n' % conf).encode('ascii'))
+    stdout.flush()
+    seq += 1
+'''
+
+
+class TestPreciseEngine:
+    def run_engine(self, old, **kwargs):
+        engine = PreciseEngine([sys.executable, '-c', FAKE_ENGINE.format(old=old)], 'model.pb', 4, **kwargs)
+        engine.start()
+        try:
+            seqs = [engine.send_chunk(chunk) for chunk in (b'xxxx', b'xx..', b'....')]
+            return engine, seqs, [engine.read_prediction() for _ in seqs]
+        finally:
+            engine.stop()
+
+    def test_binary(self):
+        engine, seqs, predictions = self.run_engine(old=False, binary=True)
+        assert predictions == [1.0, 0.5, 0.0]
+        assert seqs == [0, 1, 2] and engine.last_seq == 2
+
+    def test_text_fallback(self):
+        engine, seqs, predictions = self.run_engine(old=True, binary=True)
+        assert predictions == [1.0, 0.5, 0.0]
+        assert engine.last_seq is None
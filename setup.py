@@ -51,12 +51,14 @@ setup(
     entry_points={
         'console_scripts': [
             'precise-add-noise=precise.scripts.add_noise:main',
+            'precise-benchmark=precise.scripts.benchmark:main',
             'precise-collect=precise.scripts.collect:main',
             'precise-convert=precise.scripts.convert:main',
             'precise-eval=precise.scripts.eval:main',
             'precise-listen=precise.scripts.listen:main',
             'precise-listen-pocketsphinx=precise.pocketsphinx.scripts.listen:main',
             'precise-engine=precise.scripts.engine:main',
+            'precise-engine-server=precise.scripts.engine_server:main',
             'precise-simulate=precise.scripts.simulate:main',
             'precise-test=precise.scripts.test:main',
             'precise-graph=precise.scripts.graph:main',
@@ -83,7 +85,6 @@ setup(
         'precise-runner',
         'attrs',
         'fitipy<1.0',
-        'speechpy-fast',
-        'pyache'
+        'speechpy-fast'
     ]
 )
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# Copyright 2019 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Benchmarks of the pipeline stages, run with:
+    pytest test/benchmarks --benchmark-json=out.json
+Compare runs across commits with:
+    pytest-benchmark compare
+"""
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+import numpy as np
+from itertools import cycle
+from precise_runner.runner import TriggerDetector
+
+from precise.network_runner import Listener, NumpyRunner
+from precise.params import pr
+from precise.numpy_model import random_model
+from precise.scripts.benchmark import synthetic_audio
+from precise.threshold_decoder import ThresholdDecoder
+from precise.util import audio_to_buffer, load_audio, read_wavio_int16, save_audio
+from precise.vectorization import vectorize_raw, vectorize, vectorize_delta
+
+CHUNK_SIZE = 2048
+
+
+@pytest.fixture(scope='module')
+def window():
+    return synthetic_audio(pr.buffer_samples)
+
+
+@pytest.fixture(scope='module')
+def chunks():
+    buffer = audio_to_buffer(synthetic_audio(200 * CHUNK_SIZE // 2))
+    return cycle([buffer[i:i + CHUNK_SIZE] for i in range(0, len(buffer), CHUNK_SIZE)])
+
+
+@pytest.mark.parametrize('func', [vectorize_raw, vectorize, vectorize_delta], ids=lambda f: f.__name__)
+def test_vectorize(benchmark, window, func):
+    benchmark(func, window)
+
+
+def test_listener_update_vectors(benchmark, chunks):
+    listener = Listener('', CHUNK_SIZE, runner_cls=lambda _: None)
+    benchmark(lambda: listener.update_vectors(next(chunks)))
+
+
+@pytest.mark.parametrize('streaming', [False, True], ids=['numpy', 'numpy_streaming'])
+def test_listener_update(benchmark, chunks, streaming):
+    model = random_model(pr.feature_size)
+    listener = Listener('', CHUNK_SIZE, runner_cls=lambda _: NumpyRunner.from_model(model, streaming))
+    benchmark(lambda: listener.update(next(chunks)))
+
+
+@pytest.fixture(scope='module')
+def wav_file(tmpdir_factory):
+    filename = str(tmpdir_factory.mktemp('audio').join('clip.wav'))
+    save_audio(filename, synthetic_audio(int(1.5 * pr.sample_rate)))
+    return filename
+
+
+def test_load_audio(benchmark, wav_file):
+    benchmark(load_audio, wav_file)
+
+
+def test_load_audio_wavio(benchmark, wav_file):
+    benchmark(lambda: read_wavio_int16(wav_file).astype(np.float32) / float(np.iinfo(np.int16).max))
+
+
+def test_threshold_decoder(benchmark):
+    decoder = ThresholdDecoder.from_params(pr)
+    benchmark(decoder.decode, 0.7)
+
+
+def test_threshold_decoder_batch(benchmark):
+    decoder = ThresholdDecoder.from_params(pr)
+    benchmark(decoder.decode_batch, np.random.uniform(0, 1, 2048))
+
+
+def test_trigger_detector(benchmark):
+    detector = TriggerDetector(CHUNK_SIZE)
+    outputs = cycle(np.random.uniform(0, 1, 1000))
+    benchmark(lambda: detector.update(next(outputs)))
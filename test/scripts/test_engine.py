@@ -20,6 +20,7 @@ from os.path import join
 
 from precise.scripts.engine import EngineScript
 from runner.precise_runner import ReadWriteStream
+from runner.precise_runner.runner import BINARY_MAGIC, HANDSHAKE, response_struct
 
 
 class FakeStdin:
@@ -51,3 +52,29 @@ def test_engine(train_folder, train_script):
     finally:
         sys.stdin = sys.__stdin__
         sys.stdout = sys.__stdout__
+
+
+def test_engine_binary(train_folder, train_script):
+    """
+    Test that the binary protocol starts with a handshake
+    followed by numbered responses in the range 0.0 - 1.0
+    """
+    train_script.run()
+    with open(glob.glob(join(train_folder.root, 'wake-word', '*.wav'))[0], 'rb') as f:
+        data = f.read()
+    try:
+        sys.stdin = FakeStdin(data)
+        sys.stdout = FakeStdout()
+        EngineScript.create(model_name=train_folder.model, binary=True).run()
+        output = sys.stdout.buffer.buffer
+    finally:
+        sys.stdin = sys.__stdin__
+        sys.stdout = sys.__stdout__
+
+    assert output.startswith(BINARY_MAGIC)
+    _, fields, response_size = HANDSHAKE.unpack_from(output, len(BINARY_MAGIC))
+    responses = output[len(BINARY_MAGIC) + HANDSHAKE.size:]
+    assert response_size == response_struct(fields).size
+    assert len(responses) == response_size
+    seq, conf = response_struct(fields).unpack(responses)
+    assert seq == 0 and 0.0 <= conf <= 1.0
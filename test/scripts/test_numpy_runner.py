@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+# Copyright 2019 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import numpy as np
+
+from precise.network_runner import KerasRunner, NumpyRunner
+from precise.params import pr
+
+
+def test_numpy_runner(train_folder, train_script):
+    """Ensure the NumPy GRU gives the same outputs as Keras"""
+    train_script.run()
+    inputs = np.random.random((8, pr.n_features, pr.feature_size))
+    expected = KerasRunner(train_folder.model).predict(inputs)
+    runner = NumpyRunner(train_folder.model)
+    assert np.allclose(runner.predict(inputs), expected, atol=1e-5)
+    assert np.isclose(runner.run(inputs[0]), expected[0][0], atol=1e-5)
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# Copyright 2019 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import numpy as np
+import os
+from os.path import join
+
+from precise.audio_cache import AudioCache
+from precise.util import load_audio, save_audio
+
+
+class TestAudioCache:
+    def test_lru(self, tmpdir):
+        files = []
+        for i in range(3):
+            files.append(join(str(tmpdir), '{}.wav'.format(i)))
+            save_audio(files[-1], np.random.uniform(-0.5, 0.5, 1000))
+
+        cache = AudioCache(2 * 1000 * 2)
+        audio = cache.load(files[0])
+        assert audio.dtype == np.float32 and np.array_equal(audio, load_audio(files[0]))
+        audio[:] = 0
+        assert np.array_equal(cache.load(files[0]), load_audio(files[0]))
+        cache.load(files[1])
+        cache.load(files[0])
+        cache.load(files[2])
+        assert list(cache.entries) == [files[0], files[2]]
+        assert cache.stats == {'hits': 2, 'misses': 3, 'evictions': 1, 'files': 2, 'bytes': 4000}
+
+        cache.resize(2000)
+        assert list(cache.entries) == [files[2]]
+
+    def test_reload_changed(self, tmpdir):
+        filename = join(str(tmpdir), 'a.wav')
+        save_audio(filename, np.zeros(100))
+        cache = AudioCache(10 ** 6)
+        assert len(cache.load(filename)) == 100
+        save_audio(filename, np.zeros(200))
+        os.utime(filename, ns=(0, 0))
+        assert len(cache.load(filename)) == 200
+        assert cache.misses == 2 and cache.num_bytes == 400
+
+    def test_disabled(self, tmpdir):
+        filename = join(str(tmpdir), 'a.wav')
+        save_audio(filename, np.zeros(100))
+        cache = AudioCache(0)
+        cache.load(filename)
+        assert not cache.entries and cache.hits == cache.misses == 0
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# Copyright 2019 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+from os.path import join
+
+from precise.dataset_index import DatasetIndex
+from precise.train_data import TrainData
+
+
+def touch(*parts: str) -> str:
+    filename = join(*parts)
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    with open(filename, 'wb') as f:
+        f.write(b'RIFF')
+    return filename
+
+
+def as_sets(data: TrainData) -> list:
+    return [set(i) for i in data.train_files + data.test_files]
+
+
+class TestDatasetIndex:
+    def test_matches_folder_walk(self, tmpdir):
+        folder = str(tmpdir.mkdir('data'))
+        for name in ('wake-word/a.wav', 'wake-word/sub/b.wav', 'not-wake-word/c.wav',
+                     'test/wake-word/d.wav', 'test/not-wake-word/e.wav', 'wake-word/f.txt'):
+            touch(folder, name)
+        index_file = join(str(tmpdir), 'index.json')
+
+        indexed = TrainData.from_folder(folder, DatasetIndex(index_file))
+        assert as_sets(indexed) == as_sets(TrainData.from_folder(folder))
+        info = DatasetIndex(index_file).info(join(folder, 'test', 'wake-word', 'd.wav'))
+        assert info['label'] == 'wake-word' and info['split'] == 'test' and info['size'] == 4
+
+    def test_only_lists_changed_folders(self, tmpdir, monkeypatch):
+        folder = str(tmpdir.mkdir('data'))
+        touch(folder, 'wake-word', 'a.wav')
+        touch(folder, 'not-wake-word', 'b.wav')
+        touch(folder, 'test', 'wake-word', 'c.wav')
+        for name in ('wake-word', 'not-wake-word', join('test', 'wake-word')):
+            past = os.stat(join(folder, name)).st_mtime - 60
+            os.utime(join(folder, name), (past, past))
+        index_file = join(str(tmpdir), 'index.json')
+        TrainData.from_folder(folder, DatasetIndex(index_file))
+
+        new_file = touch(folder, 'not-wake-word', 'd.wav')
+        os.remove(join(folder, 'test', 'wake-word', 'c.wav'))
+        scanned = []
+        scandir = os.scandir
+        monkeypatch.setattr(os, 'scandir', lambda path: scanned.append(path) or scandir(path))
+
+        index = DatasetIndex(index_file)
+        data = TrainData.from_folder(folder, index)
+        assert sorted(scanned) == sorted([join(folder, 'not-wake-word'), join(folder, 'test', 'wake-word')])
+        assert data.train_files[0] == [join(folder, 'wake-word', 'a.wav')]
+        assert sorted(data.train_files[1]) == sorted([join(folder, 'not-wake-word', 'b.wav'), new_file])
+        assert data.test_files == ([], [])
+        assert index.info(join(folder, 'test', 'wake-word', 'c.wav')) is None
+
+    def test_tags(self, tmpdir):
+        folder = str(tmpdir.mkdir('tags'))
+        names = ['ww-{}'.format(i) for i in range(20)]
+        for name in names[:-1]:
+            touch(folder, name + '.wav')
+        tags_file = join(folder, 'tags.txt')
+        with open(tags_file, 'w') as f:
+            f.write(''.join('{}\t{}\n'.format(i, 'wake-word' if n % 2 else 'not-wake-word')
+                            for n, i in enumerate(names)))
+
+        index = DatasetIndex(join(str(tmpdir), 'index.json'))
+        indexed = TrainData.from_tags(tags_file, folder, index)
+        assert as_sets(indexed) == as_sets(TrainData.from_tags(tags_file, folder))
+        assert sum(map(len, indexed.train_files + indexed.test_files)) == len(names) - 1
+        assert index.info(join(folder, 'ww-1.wav'))['label'] == 'wake-word'
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# Copyright 2019 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import numpy as np
+import socket
+import time
+from os.path import join, exists
+from threading import Thread
+from typing import *
+
+from precise.network_runner import Listener, NumpyRunner
+from precise.numpy_model import random_model
+from precise.params import pr, save_params
+from precise.scripts.engine_server import EngineServerScript
+
+CHUNK_SIZE = 2048
+
+
+def read_lines(conn: socket.socket, count: int) -> List[float]:
+    data = b''
+    while data.count(b'\n') < count:
+        new_data = conn.recv(4096)
+        assert new_data, 'Server closed the stream early'
+        data += new_data
+    return [float(i) for i in data.decode().split()]
+
+
+class TestEngineServer:
+    def test_batches_streams(self, tmpdir):
+        model_name = join(str(tmpdir), 'model.npz')
+        random_model(pr.feature_size, seed=1).save(model_name)
+        save_params(model_name)
+        socket_file = join(str(tmpdir), 'engine.sock')
+
+        script = EngineServerScript.create(model_name=model_name, socket_file=socket_file, max_wait=0.2)
+        thread = Thread(target=script.run, daemon=True)
+        thread.start()
+        while not exists(socket_file):
+            time.sleep(0.01)
+        batch_sizes = []
+        predict = script.runner.predict
+        script.runner.predict = lambda inputs: batch_sizes.append(len(inputs)) or predict(inputs)
+
+        num_chunks = 6
+        streams = [np.random.randint(-3000, 3000, num_chunks * CHUNK_SIZE // 2).astype('<i2').tobytes()
+                   for _ in range(3)]
+        try:
+            clients = []
+            for audio in streams:
+                conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                conn.connect(socket_file)
+                clients.append(conn)
+            for conn, audio in zip(clients, streams):
+                conn.sendall(audio)
+            replies = [read_lines(conn, num_chunks) for conn in clients]
+            for conn in clients:
+                conn.close()
+        finally:
+            script.stop()
+            thread.join()
+
+        for audio, reply in zip(streams, replies):
+            listener = Listener(model_name, CHUNK_SIZE, runner_cls=NumpyRunner)
+            expected = [listener.update(audio[i:i + CHUNK_SIZE]) for i in range(0, len(audio), CHUNK_SIZE)]
+            assert np.allclose(reply, expected)
+        assert sum(batch_sizes) == 3 * num_chunks
+        assert max(batch_sizes) > 1
+        assert not exists(socket_file)
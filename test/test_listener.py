@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# Copyright 2019 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import attr
+import numpy as np
+import pytest
+import tracemalloc
+from os.path import join
+
+from precise.network_runner import Listener, Runner
+from precise.params import pr, save_params
+from precise.util import audio_to_buffer
+from precise.vectorization import add_deltas, vectorize_raw
+
+
+class LastValueRunner(Runner):
+    def predict(self, inputs: np.ndarray) -> np.ndarray:
+        return 1 / (1 + np.exp(-inputs[:, -1, :1]))
+
+    def run(self, inp: np.ndarray) -> float:
+        return self.predict(inp[np.newaxis])[0][0]
+
+
+class TestListener:
+    def test_steady_state_allocations(self, tmpdir):
+        model = join(str(tmpdir), 'model.net')
+        save_params(model, attr.evolve(pr, use_delta=True))
+        listener = Listener(model, 2048, runner_cls=lambda _: LastValueRunner())
+        audio = audio_to_buffer(np.random.uniform(-0.5, 0.5, 200 * 1024))
+        chunks = [audio[i:i + 2048] for i in range(0, len(audio), 2048)]
+        for chunk in chunks[:50]:
+            listener.update(chunk)
+
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            for chunk in chunks[50:]:
+                listener.update(chunk)
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        # Only per frame temporaries, never anything the size of the audio buffer
+        assert peak - before < pr.buffer_samples * 8 // 4
+        assert current - before < 4096
+
+    def test_update_input(self):
+        listener = Listener('', 2048, runner_cls=lambda _: LastValueRunner())
+        buffer = audio_to_buffer(np.random.uniform(-0.5, 0.5, 30 * 1024))
+        for i in range(0, len(buffer), 2048):
+            inp = listener.update_input(buffer[i:i + 2048])
+        expected = vectorize_raw(np.frombuffer(buffer, '<i2') / 32768.0)[-pr.n_features:]
+        assert np.allclose(inp, expected)
+        assert np.allclose(add_deltas(inp)[1:, inp.shape[1]:], np.diff(inp, axis=0))
+
+    def test_latency_stats(self):
+        stats = pytest.importorskip('precise_runner.latency').LatencyStats()
+        listener = Listener('', 2048, runner_cls=lambda _: LastValueRunner(), latency_stats=stats)
+        untimed = Listener('', 2048, runner_cls=lambda _: LastValueRunner())
+        buffer = audio_to_buffer(np.random.uniform(-0.5, 0.5, 20 * 1024))
+        for i in range(0, len(buffer), 2048):
+            assert listener.update(buffer[i:i + 2048]) == untimed.update(buffer[i:i + 2048])
+        snapshot = stats.snapshot()
+        assert list(snapshot) == ['read', 'convert', 'features', 'inference', 'decode']
+        assert all(i['count'] == 20 for i in snapshot.values())
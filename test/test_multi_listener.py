@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# Copyright 2019 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import attr
+import numpy as np
+from os.path import join
+
+from precise.network_runner import Listener, MultiListener, NumpyRunner
+from precise.numpy_model import NumpyModel, random_model
+from precise.params import pr, save_params, Vectorizer
+
+
+class TestMultiListener:
+    def test_matches_separate_listeners(self, tmpdir, monkeypatch):
+        model_names = [join(str(tmpdir), name) for name in ('a.net', 'b.net', 'c.net')]
+        for name in model_names[:2]:
+            save_params(name, attr.evolve(pr, vectorizer=Vectorizer.mfccs))
+        save_params(model_names[2], attr.evolve(pr, vectorizer=Vectorizer.mels))
+        models = {
+            model_names[0]: random_model(pr.n_mfcc, 20), model_names[1]: random_model(pr.n_mfcc, 8),
+            model_names[2]: random_model(pr.n_filt, 12)
+        }
+        monkeypatch.setattr(NumpyModel, 'from_file', classmethod(lambda cls, name: models[name]))
+
+        multi = MultiListener(model_names, runner_cls=NumpyRunner)
+        singles = {name: Listener(name, runner_cls=NumpyRunner) for name in model_names}
+        assert len(multi.groups) == 2
+        assert sum(i is not None for i in multi.stacked_models.values()) == 1
+        assert multi.listeners[model_names[0]].vectorizer is multi.listeners[model_names[1]].vectorizer
+
+        audio = np.random.uniform(-0.5, 0.5, 4 * pr.sample_rate)
+        for i in range(0, len(audio), 4000):
+            confidences = multi.update(audio[i:i + 4000])
+            for name, listener in singles.items():
+                assert np.isclose(confidences[name], listener.update(audio[i:i + 4000]), atol=1e-4)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# Copyright 2019 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import attr
+import numpy as np
+import os
+import pytest
+import subprocess
+import sys
+from os.path import join, dirname, abspath
+
+from precise.network_runner import Listener, NumpyRunner
+from precise.numpy_model import NumpyModel, random_model
+from precise.params import pr, save_params
+
+ROOT = dirname(dirname(abspath(__file__)))
+
+
+class TestNpzWeights:
+    def test_round_trip(self, tmpdir):
+        model = random_model(pr.n_mfcc)
+        filename = join(str(tmpdir), 'model.npz')
+        model.save(filename)
+        loaded = NumpyModel.from_file(filename)
+
+        assert loaded.activation == 'tanh'
+        assert loaded.recurrent_activation == 'sigmoid'
+        assert loaded.reset_after
+        inputs = np.random.randn(4, pr.n_features, pr.n_mfcc).astype('f')
+        assert np.array_equal(model.predict(inputs), loaded.predict(inputs))
+
+    def test_listener_skips_tensorflow(self, tmpdir):
+        filename = join(str(tmpdir), 'model.npz')
+        random_model(pr.n_mfcc).save(filename)
+        save_params(filename)
+
+        listener = Listener(filename, 2048)
+        assert isinstance(listener.runner, NumpyRunner)
+        assert 0 <= listener.update(b'\0' * 2048) <= 1
+
+    def test_engine_imports_without_tensorflow(self):
+        code = 'import sys, precise.scripts.engine; print(*sorted({"tensorflow", "keras"} & set(sys.modules)))'
+        output = subprocess.check_output([sys.executable, '-c', code], env=dict(
+            os.environ, PYTHONPATH=os.pathsep.join([ROOT, join(ROOT, 'runner')])
+        ))
+        assert output.strip() == b''
+
+    def test_rejects_unknown_version(self, tmpdir):
+        filename = join(str(tmpdir), 'model.npz')
+        np.savez(filename, format_version=99)
+        with pytest.raises(ValueError):
+            NumpyModel.from_npz(filename)
+
+
+class TestStreamingRunner:
+    def test_delta_model_only_runs_new_frames(self, tmpdir):
+        filename = join(str(tmpdir), 'model.npz')
+        random_model(2 * pr.n_mfcc).save(filename)
+        save_params(filename, attr.evolve(pr, use_delta=True))
+
+        listener = Listener(filename, 2048, runner_cls=lambda name: NumpyRunner(name, streaming=True))
+        run_gru = listener.runner.model.run_gru
+        num_frames = []
+        listener.runner.model.run_gru = lambda inputs, state: num_frames.append(inputs.shape[1]) or run_gru(
+            inputs, state
+        )
+        audio = np.random.randint(-2000, 2000, 60 * 1024).astype('<i2').tobytes()
+        for i in range(0, len(audio), 2048):
+            listener.update(audio[i:i + 2048])
+        assert num_frames[0] == pr.n_features
+        assert max(num_frames[1:]) <= 2048 // 2 // pr.hop_samples + 1
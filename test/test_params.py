@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# Copyright 2019 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import attr
+import numpy as np
+from os.path import join
+
+from precise.network_runner import Listener
+from precise.params import pr, load_params, save_params, Vectorizer
+from precise.vectorization import vectorize
+
+
+class TestListenerParams:
+    def test_load_params_keeps_global(self, tmpdir):
+        model = join(str(tmpdir), 'model.net')
+        save_params(model, attr.evolve(pr, n_mfcc=20, threshold_center=0.4))
+        global_before = dict(pr.__dict__)
+
+        params = load_params(model)
+        assert params.n_mfcc == 20 and params.threshold_center == 0.4
+        assert pr.__dict__ == global_before
+        assert params.vectorization_md5_hash() != pr.vectorization_md5_hash()
+
+    def test_listeners_are_independent(self, tmpdir):
+        mfcc_model = join(str(tmpdir), 'mfcc.net')
+        mel_model = join(str(tmpdir), 'mel.net')
+        save_params(mfcc_model, attr.evolve(pr, vectorizer=Vectorizer.mfccs))
+        save_params(mel_model, attr.evolve(pr, vectorizer=Vectorizer.mels, n_filt=30))
+
+        mfcc_listener = Listener(mfcc_model, runner_cls=lambda _: None)
+        mel_listener = Listener(mel_model, runner_cls=lambda _: None)
+        audio = np.random.uniform(-0.5, 0.5, pr.buffer_samples)
+        assert mfcc_listener.update_input(audio).shape == (pr.n_features, pr.n_mfcc)
+        assert mel_listener.update_input(audio).shape == (pr.n_features, 30)
+        assert np.allclose(mel_listener.mfccs, vectorize(audio, mel_listener.pr))
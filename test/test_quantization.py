@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# Copyright 2019 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import numpy as np
+import pytest
+from os.path import join
+
+from precise.numpy_model import NumpyModel, random_model
+from precise.params import pr
+from precise.quantization import QuantizedModel, QMAX
+from precise.weights_bundle import save_bundle, QUANTIZED_WEIGHTS
+
+
+def random_inputs(count: int = 64) -> np.ndarray:
+    return np.random.randn(count, pr.n_features, pr.n_mfcc).astype('f')
+
+
+class TestQuantizedModel:
+    @pytest.mark.parametrize('reset_after', [True, False])
+    def test_close_to_float_model(self, reset_after):
+        model = random_model(pr.n_mfcc, reset_after=reset_after)
+        quantized = QuantizedModel.calibrate(model, random_inputs())
+        inputs = random_inputs()
+        assert np.abs(model.predict(inputs) - quantized.predict(inputs)).max() < 0.05
+
+    def test_calibrates_ranges(self):
+        inputs = random_inputs()
+        quantized = QuantizedModel.calibrate(random_model(pr.n_mfcc), inputs)
+        assert quantized.input_scale * QMAX <= np.abs(inputs).max()
+        assert quantized.state_scale * QMAX <= 1.0  # tanh activation
+        assert all(quantized.tensors[i].dtype == np.int8 for i in QUANTIZED_WEIGHTS)
+
+    def test_keeps_no_float_kernels(self):
+        model = random_model(pr.n_mfcc)
+        quantized = QuantizedModel.calibrate(model, random_inputs())
+        assert set(QUANTIZED_WEIGHTS).isdisjoint(vars(quantized))
+        assert quantized.feature_size == model.feature_size
+        for name in QUANTIZED_WEIGHTS:
+            error = np.abs(getattr(quantized, name) - getattr(model, name))
+            assert np.all(error <= quantized.tensors[name + '.scale'] / 2 + 1e-6)
+
+    def test_bundle_round_trip(self, tmpdir):
+        quantized = QuantizedModel.calibrate(random_model(pr.n_mfcc), random_inputs())
+        filename = join(str(tmpdir), 'model.pwb')
+        save_bundle(filename, quantized, pr)
+        loaded = NumpyModel.from_file(filename)
+
+        assert isinstance(loaded, QuantizedModel)
+        assert loaded.state_scale == quantized.state_scale
+        inputs = random_inputs(8)
+        assert np.array_equal(loaded.predict(inputs), quantized.predict(inputs))
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# Copyright 2019 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import numpy as np
+from itertools import islice
+from os.path import join
+
+from precise.params import pr
+from precise.sample_generator import SampleGenerator, ParallelSampleGenerator
+from precise.util import save_audio
+
+
+def make_generator(folder: str, batch_size: int = 8, seed: int = 0) -> SampleGenerator:
+    rand = np.random.RandomState(1234)
+
+    def save(name: str, seconds: float) -> str:
+        filename = join(folder, name + '.wav')
+        save_audio(filename, rand.uniform(-0.5, 0.5, int(seconds * pr.sample_rate)))
+        return filename
+
+    background = [save('bg-{}'.format(i), 6.0) for i in range(3)]
+    pos = [save('ww-{}'.format(i), 0.6) for i in range(2)]
+    neg = [save('nww-{}'.format(i), 0.6) for i in range(2)]
+    return SampleGenerator(background, pos, neg, chunk_size=2048, batch_size=batch_size, seed=seed)
+
+
+def assert_same_batches(a: list, b: list):
+    assert len(a) == len(b)
+    for (inputs_a, outputs_a), (inputs_b, outputs_b) in zip(a, b):
+        assert np.allclose(inputs_a, inputs_b)
+        assert np.array_equal(outputs_a, outputs_b)
+
+
+class TestSampleGenerator:
+    def test_deterministic_per_epoch(self, tmpdir):
+        generator = make_generator(str(tmpdir))
+        first = list(generator.epoch_batches(3, 2))
+        list(generator.epoch_batches(4, 2))
+        assert_same_batches(first, list(make_generator(str(tmpdir)).epoch_batches(3, 2)))
+        assert_same_batches(first, list(generator.epoch_batches(3, 2)))
+        assert not np.allclose(first[0][0], list(generator.epoch_batches(4, 1))[0][0])
+
+        inputs, outputs = first[0]
+        assert inputs.shape == (8,) + generator.sample_shape
+        assert set(outputs) <= {0, 1}
+
+    def test_parallel_matches_worker_slices(self, tmpdir):
+        generator = make_generator(str(tmpdir))
+        steps = 4
+        batches = list(islice(ParallelSampleGenerator(generator, 2).generate(5, steps), 2 * steps))
+
+        expected = []
+        for epoch in (5, 6):
+            slices = [list(generator.epoch_batches(epoch, steps // 2, worker, 2)) for worker in range(2)]
+            expected.extend(slices[step % 2][step // 2] for step in range(steps))
+        assert_same_batches(batches, expected)
+
+    def test_batch_vectors_match_streaming(self, tmpdir):
+        generator = make_generator(str(tmpdir))
+        results = []
+        for method in (generator.stream_vectors_from_fn, generator.batch_vectors_from_fn):
+            generator.rand = np.random.RandomState(5)
+            generator.audio_buffer[:] = 0
+            generator.vals_buffer[:] = 0
+            results.append([i for fn in generator.background_files for i in method(fn)])
+            results[-1].append((generator.audio_buffer.copy(), generator.rand.randint(1 << 30)))
+
+        streamed, batched = results
+        assert len(streamed) == len(batched)
+        for (mfccs_a, target_a), (mfccs_b, target_b) in zip(streamed, batched):
+            assert np.allclose(mfccs_a, mfccs_b)
+            assert target_a == target_b
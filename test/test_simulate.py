@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+# Copyright 2019 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import numpy as np
+import pytest
+from os.path import join
+
+from precise.numpy_model import random_model
+from precise.params import pr, save_params
+from precise.scripts.simulate import SimulateScript
+from precise.util import load_audio, save_audio
+
+
+class TestSimulate:
+    @pytest.mark.parametrize('chunk_size,block_size', [(4096, 12345), (2048, 7001), (4800, 100003)])
+    def test_streaming_matches_whole_file(self, tmpdir, chunk_size, block_size):
+        model = join(str(tmpdir), 'model.npz')
+        random_model(pr.feature_size, seed=2).save(model)
+        save_params(model)
+        filename = join(str(tmpdir), 'audio.wav')
+        save_audio(filename, np.random.uniform(-0.5, 0.5, 10 * pr.sample_rate))
+
+        script = SimulateScript.create(model=model, folder=str(tmpdir), chunk_size=chunk_size, block_size=block_size)
+        expected = script.evaluate(load_audio(filename))
+        blocks = list(script.evaluate_stream(filename))
+        assert len(blocks) > 1
+        assert sum(num_samples for _, num_samples in blocks) == 10 * pr.sample_rate
+        predictions = np.concatenate([i for i, _ in blocks])
+        assert predictions.shape == expected.shape
+        assert np.allclose(predictions, expected, rtol=0, atol=1e-5)
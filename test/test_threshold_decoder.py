@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+# Copyright 2019 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import numpy as np
+
+from precise.threshold_decoder import ThresholdDecoder
+
+
+class TestThresholdDecoder:
+    def test_batch_matches_scalar(self):
+        for center in (0.2, 0.5):
+            decoder = ThresholdDecoder(((6.0, 4.0), (-2.0, 1.5)), center)
+            raw_outputs = np.concatenate([[0.0, 1.0], np.random.uniform(0.0, 1.0, 500)])
+            expected = [decoder.decode(i) for i in raw_outputs]
+            assert np.allclose(decoder.decode_batch(raw_outputs), expected)
+
+            thresholds = np.linspace(0.0, 1.0, 50)[1:-1]
+            expected = [decoder.encode(i) for i in thresholds]
+            assert np.allclose(decoder.encode_batch(thresholds), expected)
+
+    def test_shares_distribution(self):
+        a = ThresholdDecoder(((6.0, 4.0),))
+        b = ThresholdDecoder([[6, 4]], 0.2)
+        assert a.cd is b.cd
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+# Copyright 2019 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import numpy as np
+from os import makedirs
+from os.path import join
+
+from precise.params import pr
+from precise.train_data import TrainData
+from precise.util import save_audio
+
+
+class TestTrainData:
+    def test_parallel_load_matches_serial(self, tmpdir, monkeypatch, capsys):
+        folder = join(str(tmpdir), 'data')
+        for label in ('wake-word', 'not-wake-word'):
+            makedirs(join(folder, label))
+            for i in range(5):
+                save_audio(join(folder, label, '{}.wav'.format(i)), np.random.uniform(-0.5, 0.5, pr.buffer_samples))
+
+        results = []
+        for jobs in (1, 2):
+            monkeypatch.chdir(str(tmpdir.mkdir('jobs-{}'.format(jobs))))  # Separate vector caches
+            inputs, outputs = TrainData.from_folder(folder).load(True, False, jobs=jobs)[0]
+            results.append((np.array(inputs), outputs))
+            assert '100.00%' in capsys.readouterr().out
+
+        (serial_inputs, serial_outputs), (parallel_inputs, parallel_outputs) = results
+        assert serial_inputs.shape == (10, pr.n_features, pr.feature_size)
+        assert np.array_equal(serial_inputs, parallel_inputs)
+        assert np.array_equal(serial_outputs, parallel_outputs)
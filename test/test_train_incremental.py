@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# Copyright 2019 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import numpy as np
+import pytest
+from argparse import Namespace
+from os.path import join
+
+from precise.network_runner import Listener
+from precise.numpy_model import random_model
+from precise.params import pr, save_params
+from precise.util import save_audio
+
+pytest.importorskip('keras')
+from precise.scripts import train_incremental
+
+
+class TestTrainIncremental:
+    def run_file(self, filename: str, model_file: str, batch_predict: bool, monkeypatch) -> dict:
+        saved, retrains = [], []
+        script = train_incremental.TrainIncrementalScript.__new__(train_incremental.TrainIncrementalScript)
+        script.args = Namespace(
+            chunk_size=1000, threshold=0.5, delay_samples=3, epochs=1, folder='data',
+            batch_predict=batch_predict, predict_batch_size=37
+        )
+        script.audio_buffer = np.zeros(pr.buffer_samples, dtype=float)
+        script.samples_since_train = 0
+        script.listener = Listener(model_file, script.args.chunk_size)
+
+        def retrain():
+            retrains.append(len(saved))
+            script.listener.runner.model.dense_bias -= 0.5  # Later predictions depend on retraining
+
+        script.retrain = retrain
+        monkeypatch.setattr(train_incremental, 'save_audio', lambda name, audio: saved.append((name, audio.copy())))
+        monkeypatch.setattr(train_incremental, 'random', lambda: 0.0)
+        script.train_on_audio(filename)
+        return dict(saved=saved, retrains=retrains, audio_buffer=script.audio_buffer)
+
+    def test_batch_predict_matches_streaming(self, tmpdir, monkeypatch):
+        model_file = join(str(tmpdir), 'model.npz')
+        model = random_model(pr.feature_size, seed=3)
+        model.dense_bias += 3.0
+        model.save(model_file)
+        save_params(model_file)
+        filename = join(str(tmpdir), 'random.wav')
+        save_audio(filename, np.random.uniform(-0.5, 0.5, 20 * pr.sample_rate))
+
+        streaming = self.run_file(filename, model_file, False, monkeypatch)
+        batched = self.run_file(filename, model_file, True, monkeypatch)
+
+        assert len(streaming['retrains']) > 1
+        assert [name for name, _ in batched['saved']] == [name for name, _ in streaming['saved']]
+        assert all(np.array_equal(a, b) for (_, a), (_, b) in zip(batched['saved'], streaming['saved']))
+        assert batched['retrains'] == streaming['retrains']
+        assert np.array_equal(batched['audio_buffer'], streaming['audio_buffer'])
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# Copyright 2019 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import numpy as np
+import wave
+from io import BytesIO
+from os.path import join
+
+from precise.util import load_audio, load_audio_int16, read_wavio_int16, save_audio
+
+
+def wav_bytes(filename: str) -> bytes:
+    with open(filename, 'rb') as f:
+        return f.read()
+
+
+class TestLoadAudio:
+    def test_matches_wavio(self, tmpdir):
+        filename = join(str(tmpdir), 'a.wav')
+        save_audio(filename, np.random.uniform(-1, 1, 5000))
+        samples = read_wavio_int16(filename)
+        audio = load_audio(filename)
+        assert audio.dtype == np.float32
+        assert np.array_equal(audio, samples.astype(np.float32) / float(np.iinfo(np.int16).max))
+        assert np.array_equal(load_audio_int16(BytesIO(wav_bytes(filename))), samples)
+        assert np.array_equal(load_audio_int16(filename, 1000, 1200), samples[1000:1200])
+        assert np.array_equal(load_audio_int16(filename, -300), samples[-300:])
+        assert len(load_audio_int16(filename, 6000)) == 0
+
+    def test_unusual_files(self, tmpdir):
+        filename = join(str(tmpdir), 'a.wav')
+        save_audio(filename, np.random.uniform(-1, 1, 1000))
+        samples = read_wavio_int16(filename)
+        data = wav_bytes(filename)
+        pos = data.index(b'data')
+        with_list_chunk = data[:pos] + b'LIST\x03\x00\x00\x00abc\x00' + data[pos:]
+        assert np.array_equal(load_audio_int16(BytesIO(with_list_chunk)), samples)
+        assert np.array_equal(load_audio_int16(BytesIO(data[:-100])), samples[:-50])
+
+        stereo_file = join(str(tmpdir), 'stereo.wav')
+        with wave.open(stereo_file, 'wb') as wav:
+            wav.setnchannels(2)
+            wav.setsampwidth(2)
+            wav.setframerate(16000)
+            wav.writeframes(np.arange(20, dtype='<i2').tobytes())
+        assert np.array_equal(load_audio_int16(stereo_file), np.arange(20).reshape((10, 2)))
+
+        empty_file = join(str(tmpdir), 'empty.wav')
+        open(empty_file, 'wb').close()
+        assert load_audio(empty_file).shape == (0,)
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# Copyright 2019 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import numpy as np
+from os.path import join
+
+from precise.vector_store import VectorStore, VectorRows
+
+
+class TestVectorStore:
+    def test_add_load(self, tmpdir):
+        store = VectorStore(str(tmpdir), (3, 2))
+        vectors = np.random.random((4, 3, 2)).astype(np.float32)
+        store.add(['a', 'b'], vectors[:2])
+        store.add(['c', 'd'], vectors[2:])
+
+        loaded = VectorStore(str(tmpdir), (3, 2))
+        assert len(loaded) == 4 and 'c' in loaded
+        view = loaded.load(['b', 'c', 'd'])
+        assert isinstance(view, np.memmap)
+        assert np.array_equal(view, vectors[1:])
+        assert np.array_equal(loaded.load(['d', 'a']), vectors[[3, 0]])
+        assert np.array_equal(np.load(join(str(tmpdir), 'vectors.npy')), vectors)
+
+    def test_float16(self, tmpdir):
+        store = VectorStore(str(tmpdir), (3, 2), np.float16)
+        store.add(['a'], np.ones((1, 3, 2)))
+        assert store.load(['a']).dtype == np.float16
+
+    def test_load_after_adding_is_lazy(self, tmpdir):
+        store = VectorStore(str(tmpdir), (3, 2))
+        vectors = np.random.random((4, 3, 2)).astype(np.float32)
+        store.add(['a', 'b', 'c'], vectors[:3])
+        store = VectorStore(str(tmpdir), (3, 2))
+        store.add(['new'], vectors[3:])
+
+        rows = store.load(['a', 'new', 'b', 'c'])
+        assert isinstance(rows, VectorRows) and not isinstance(rows, np.ndarray)
+        assert rows.shape == (4, 3, 2) and len(rows) == 4
+        assert np.array_equal(rows, vectors[[0, 3, 1, 2]])
+        assert np.array_equal(rows[[3, 1]], vectors[[2, 3]])
+        assert np.array_equal(rows[1], vectors[3])
+        assert np.shares_memory(rows[2:4], store.vectors)
+
+        merged = VectorRows.concatenate([rows, np.ones((2, 3, 2))])
+        assert len(merged) == 6 and merged.dtype == np.float64
+        assert np.array_equal(merged[[0, 5]], [vectors[0], np.ones((3, 2))])
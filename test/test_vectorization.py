@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# Copyright 2019 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import numpy as np
+
+from precise.params import pr
+from precise.vectorization import StreamingVectorizer, vectorize_raw, sliding_windows, stream_windows
+
+
+class TestStreamingVectorizer:
+    def test_matches_vectorize_raw(self):
+        audio = np.random.uniform(-0.5, 0.5, 5 * pr.sample_rate)
+        for chunk_size in (100, 2048, 30000):
+            vectorizer = StreamingVectorizer(pr)
+            end = 0
+            for end in range(chunk_size, len(audio), chunk_size):
+                features = vectorizer.update(audio[end - chunk_size:end])
+            expected = vectorize_raw(audio[:end])[-pr.n_features:]
+            assert np.allclose(features, expected)
+
+    def test_clear(self):
+        vectorizer = StreamingVectorizer(pr)
+        vectorizer.update(np.random.uniform(-0.5, 0.5, pr.sample_rate))
+        vectorizer.clear()
+        assert not vectorizer.features.any()
+
+
+def test_sliding_windows():
+    features = np.random.random((100, 13))
+    for step in (1, 3, 40, 200):
+        expected = np.array([features[i - 29:i] for i in range(29, len(features), step)])
+        windows = sliding_windows(features, 29, step)
+        assert windows.shape[1:] == (29, 13)
+        assert np.array_equal(windows, expected.reshape(windows.shape))
+
+
+def test_stream_windows():
+    audio = np.random.uniform(-0.5, 0.5, 3 * pr.sample_rate)
+    chunk_size = 1000
+    ends = np.arange(chunk_size, len(audio), chunk_size)
+    windows, window_ids = stream_windows(StreamingVectorizer(pr).vectorize_new(audio[:ends[-1]]), ends)
+
+    vectorizer = StreamingVectorizer(pr)
+    for end, window_id in zip(ends, window_ids):
+        assert np.allclose(windows[window_id], vectorizer.update(audio[end - chunk_size:end]))
+
+    block_vectorizer = StreamingVectorizer(pr)
+    previous, first_frame = None, 0
+    for block_ends in np.array_split(ends, 7):
+        features = block_vectorizer.vectorize_new(audio[block_ends[0] - chunk_size:block_ends[-1]])
+        block_windows, block_ids = stream_windows(features, block_ends, pr, previous, first_frame)
+        assert np.allclose(block_windows[block_ids], windows[window_ids[ends.searchsorted(block_ends)]])
+        previous, first_frame = block_windows[len(features)], first_frame + len(features)
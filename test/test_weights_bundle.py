@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# Copyright 2019 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import attr
+import numpy as np
+import pytest
+from os.path import join
+
+from precise.network_runner import Listener, NumpyRunner
+from precise.numpy_model import NumpyModel, random_model
+from precise.params import pr, load_params, Vectorizer
+from precise.weights_bundle import save_bundle, load_tensors, ALIGNMENT
+
+
+class TestWeightsBundle:
+    @pytest.mark.parametrize('dtype,tolerance', [('float32', 0), ('float16', 1e-2), ('int8', 5e-2)])
+    def test_round_trip(self, tmpdir, dtype, tolerance):
+        model = random_model(pr.n_mfcc)
+        filename = join(str(tmpdir), 'model.pwb')
+        save_bundle(filename, model, pr, dtype)
+        loaded = NumpyModel.from_file(filename)
+
+        assert loaded.activation == 'tanh'
+        assert loaded.reset_after
+        inputs = np.random.randn(4, pr.n_features, pr.n_mfcc).astype('f')
+        assert np.abs(model.predict(inputs) - loaded.predict(inputs)).max() <= tolerance
+
+    def test_memory_mapped(self, tmpdir):
+        filename = join(str(tmpdir), 'model.pwb')
+        save_bundle(filename, random_model(pr.n_mfcc), pr)
+        header, tensors = load_tensors(filename)
+        assert all(isinstance(i.base, np.memmap) or isinstance(i, np.memmap) for i in tensors.values())
+        assert all(i['offset'] % ALIGNMENT == 0 for i in header['tensors'].values())
+        assert not NumpyModel.from_bundle(filename).kernel.flags.writeable
+
+    def test_listener_uses_bundled_params(self, tmpdir):
+        params = attr.evolve(pr, vectorizer=Vectorizer.mels, threshold_center=0.3)
+        filename = join(str(tmpdir), 'model.pwb')
+        save_bundle(filename, random_model(params.n_filt), params)
+
+        assert load_params(filename).vectorization_md5_hash() == params.vectorization_md5_hash()
+        listener = Listener(filename, 2048)
+        assert isinstance(listener.runner, NumpyRunner)
+        assert listener.pr.vectorizer == Vectorizer.mels
+        assert 0 <= listener.update(b'\0' * 2048) <= 1
+
+    def test_rejects_other_files(self, tmpdir):
+        filename = join(str(tmpdir), 'model.pwb')
+        with open(filename, 'wb') as f:
+            f.write(b'not a bundle')
+        with pytest.raises(ValueError):
+            NumpyModel.from_bundle(filename)